@@ -1,59 +1,250 @@
 import os
 import asyncpg
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, Tuple
 
 from dotenv import load_dotenv
 load_dotenv()
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Prepared statements asyncpg keeps per connection, least recently used dropped first
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
 
 class Database:
     def __init__(self):
         self.pool = None
-    
+        # Named statements: name -> sql, prepared by the statement cache of each connection
+        self.statements: Dict[str, str] = {}
+        # Generated UPDATE statements: (table, key_column, fields) -> statement name
+        self._update_statements: Dict[Tuple[str, str, Tuple[str, ...]], str] = {}
+        self.statement_counts: Counter = Counter()
+
     async def connect(self):
         """Create database connection pool"""
         if not DATABASE_URL:
             raise ValueError("DATABASE_URL environment variable is not set")
-        
+
         print(f"Connecting to database... {DATABASE_URL}")
         try:
-            self.pool = await asyncpg.create_pool(DATABASE_URL)
+            self.pool = await asyncpg.create_pool(DATABASE_URL, statement_cache_size=DB_STATEMENT_CACHE_SIZE)
             print("✅ Database connection pool created successfully")
         except Exception as e:
             print(f"❌ Failed to create database connection pool: {e}")
             raise
-    
+
     async def disconnect(self):
         """Close database connection pool"""
         if self.pool:
             await self.pool.close()
             print("✅ Database connection pool closed")
-    
-    async def fetch_all(self, query: str, *args):
-        """Fetch all rows from query"""
+
+    def register(self, name: str, query: str):
+        """Register a named statement, it is prepared on the first use on each pooled connection"""
+        self.statements[name] = query
+
+    def update_statement(self, table: str, key_column: str, fields: Iterable[str]) -> Tuple[str, Tuple[str, ...]]:
+        """
+        Get the named UPDATE statement for a set of fields, generating it once per field-set
+
+        Returns:
+            The statement name and the field order its parameters ($2, $3, ...) expect
+        """
+        fields = tuple(sorted(fields))
+        signature = (table, key_column, fields)
+        name = self._update_statements.get(signature)
+        if name is None:
+            set_clause = ", ".join([f"{field} = ${i+2}" for i, field in enumerate(fields)])
+            name = f"{table}.update.{','.join(fields)}"
+            self.register(name, f"UPDATE {table} SET {set_clause} WHERE {key_column} = $1 RETURNING *")
+            self._update_statements[signature] = name
+        return name, fields
+
+    @staticmethod
+    def select_query(table: str, key_column: str, columns: Iterable[str]) -> str:
+        """
+        SQL selecting some columns of one row
+
+        Column sets are not registered as named statements, a client can ask for any
+        of them. The columns must be whitelisted by the caller, see
+        app.utils.serialization.parse_fields()
+        """
+        return f"SELECT {', '.join(columns)} FROM {table} WHERE {key_column} = $1"
+
+    def statement_stats(self) -> dict:
+        """Per-statement execution counts"""
+        return {
+            "registered": len(self.statements),
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "executions": dict(self.statement_counts.most_common()),
+        }
+
+    def _statement(self, name: str) -> str:
+        """
+        SQL of a named statement
+
+        It runs through the connection's own statement cache, which prepares it on the
+        first use on each pooled connection. A PreparedStatement kept outside the pool
+        checkout is unusable once the connection is released.
+        """
+        query = self.statements.get(name)
+        if query is None:
+            raise KeyError(f"Statement '{name}' is not registered")
+        self.statement_counts[name] += 1
+        return query
+
+    def _acquire(self):
         if not self.pool:
             raise RuntimeError("Database pool not initialized. Make sure to call connect() first.")
-        async with self.pool.acquire() as connection:
-            rows = await connection.fetch(query, *args)
-            return [dict(row) for row in rows]
-    
+        return self.pool.acquire()
+
+    async def fetch_all(self, query: str, *args):
+        """Fetch all rows from query"""
+        async with self._acquire() as connection:
+            return await self._fetch_all(connection, query, *args)
+
     async def fetch_one(self, query: str, *args):
         """Fetch one row from query"""
-        if not self.pool:
-            raise RuntimeError("Database pool not initialized. Make sure to call connect() first.")
-        async with self.pool.acquire() as connection:
-            row = await connection.fetchrow(query, *args)
-            return dict(row) if row else None
-    
+        async with self._acquire() as connection:
+            return await self._fetch_one(connection, query, *args)
+
     async def execute(self, query: str, *args):
         """Execute a query (INSERT, UPDATE, DELETE)"""
-        if not self.pool:
-            raise RuntimeError("Database pool not initialized. Make sure to call connect() first.")
-        async with self.pool.acquire() as connection:
-            result = await connection.execute(query, *args)
-            # Extract the number of affected rows from result string like "INSERT 0 1"
-            return int(result.split()[-1]) if result else 0
-   
+        async with self._acquire() as connection:
+            return await self._execute(connection, query, *args)
+
+    async def fetch_records(self, query: str, *args):
+        """Fetch all rows from query as asyncpg Records, without the dict copies"""
+        async with self._acquire() as connection:
+            return await connection.fetch(query, *args)
+
+    async def fetch_all_prepared(self, name: str, *args):
+        """Fetch all rows from a named statement"""
+        async with self._acquire() as connection:
+            return await self._fetch_all_prepared(connection, name, *args)
+
+    async def fetch_records_prepared(self, name: str, *args):
+        """Fetch all rows from a named statement as asyncpg Records, without the dict copies"""
+        async with self._acquire() as connection:
+            return await connection.fetch(self._statement(name), *args)
+
+    async def fetch_one_prepared(self, name: str, *args):
+        """Fetch one row from a named statement"""
+        async with self._acquire() as connection:
+            return await self._fetch_one_prepared(connection, name, *args)
+
+    async def fetch_one_columns(self, name: str, table: str, key_column: str, key_value, columns=None):
+        """Fetch one row through a named statement, or only some of its columns with ad-hoc SQL"""
+        if not columns:
+            return await self.fetch_one_prepared(name, key_value)
+        return await self.fetch_one(self.select_query(table, key_column, columns), key_value)
+
+    async def execute_prepared(self, name: str, *args):
+        """Execute a named statement (INSERT, UPDATE, DELETE) and return the affected rows"""
+        async with self._acquire() as connection:
+            return await self._execute_prepared(connection, name, *args)
+
+    async def update_row(self, table: str, key_column: str, key_value, data: dict):
+        """Update the given fields of one row through its cached UPDATE statement and return it"""
+        async with self._acquire() as connection:
+            return await self._update_row(connection, table, key_column, key_value, data)
+
+    async def stream(self, query: str, *args, prefetch: int = 1000):
+        """
+        Iterate over the rows of a query through a server-side cursor
+
+        Only `prefetch` rows are held in memory at a time. The connection stays
+        checked out until the iteration finishes or the generator is closed.
+        """
+        async with self._acquire() as connection:
+            # Cursors only exist inside a transaction
+            async with connection.transaction():
+                async for row in connection.cursor(query, *args, prefetch=prefetch):
+                    yield row
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Pin one pooled connection for a unit of work and run it in a transaction
+
+        Commits when the block exits and rolls back if it raises:
+
+            async with baseDB.transaction() as tx:
+                row = await tx.fetch_one_prepared("extensions.get_for_update", uuid)
+                await tx.update_row("v_extensions", "extension_uuid", uuid, data)
+        """
+        async with self._acquire() as connection:
+            async with connection.transaction():
+                yield UnitOfWork(self, connection)
+
+    # Connection level helpers, shared by the pool methods and UnitOfWork
+
+    async def _fetch_all(self, connection, query: str, *args):
+        rows = await connection.fetch(query, *args)
+        return [dict(row) for row in rows]
+
+    async def _fetch_one(self, connection, query: str, *args):
+        row = await connection.fetchrow(query, *args)
+        return dict(row) if row else None
+
+    async def _execute(self, connection, query: str, *args):
+        result = await connection.execute(query, *args)
+        # Extract the number of affected rows from result string like "INSERT 0 1"
+        return int(result.split()[-1]) if result else 0
+
+    async def _fetch_all_prepared(self, connection, name: str, *args):
+        return await self._fetch_all(connection, self._statement(name), *args)
+
+    async def _fetch_one_prepared(self, connection, name: str, *args):
+        return await self._fetch_one(connection, self._statement(name), *args)
+
+    async def _execute_prepared(self, connection, name: str, *args):
+        return await self._execute(connection, self._statement(name), *args)
+
+    async def _update_row(self, connection, table: str, key_column: str, key_value, data: dict):
+        name, fields = self.update_statement(table, key_column, data.keys())
+        return await self._fetch_one_prepared(connection, name, key_value, *[data[field] for field in fields])
+
+    async def _copy_records(self, connection, table: str, records, columns):
+        if not records:
+            return 0
+        result = await connection.copy_records_to_table(table, records=records, columns=list(columns))
+        # Extract the number of copied rows from result string like "COPY 5000"
+        return int(result.split()[-1]) if result else 0
+
+
+class UnitOfWork:
+    """Database calls pinned to the connection of one transaction, see Database.transaction()"""
+
+    def __init__(self, db: Database, connection):
+        self.db = db
+        self.connection = connection
+
+    async def fetch_all(self, query: str, *args):
+        return await self.db._fetch_all(self.connection, query, *args)
+
+    async def fetch_one(self, query: str, *args):
+        return await self.db._fetch_one(self.connection, query, *args)
+
+    async def execute(self, query: str, *args):
+        return await self.db._execute(self.connection, query, *args)
+
+    async def fetch_all_prepared(self, name: str, *args):
+        return await self.db._fetch_all_prepared(self.connection, name, *args)
+
+    async def fetch_one_prepared(self, name: str, *args):
+        return await self.db._fetch_one_prepared(self.connection, name, *args)
+
+    async def execute_prepared(self, name: str, *args):
+        return await self.db._execute_prepared(self.connection, name, *args)
+
+    async def update_row(self, table: str, key_column: str, key_value, data: dict):
+        return await self.db._update_row(self.connection, table, key_column, key_value, data)
+
+    async def copy_records(self, table: str, records, columns):
+        """Load records (tuples in column order) with COPY and return the number of rows"""
+        return await self.db._copy_records(self.connection, table, records, columns)
+
 # Global database instance
-baseDB = Database()
\ No newline at end of file
+baseDB = Database()
@@ -0,0 +1,133 @@
+from typing import Any, AsyncIterator, Dict, Optional
+from app.database import baseDB
+
+# One statement for the whole directory entries of a domain: the extensions, their user and
+# contact, the domain dial_string setting, their voicemail and one row per enabled setting.
+# Keep in sync with the query in scripts/xml_handler/directory.lua
+RESOLVE_DOMAIN_QUERY = """
+    SELECT e.*, random() AS random,
+        eu.user_uuid, u.contact_uuid, ds.value AS domain_dial_string,
+        v.voicemail_uuid, v.voicemail_enabled, v.voicemail_password, v.voicemail_attach_file,
+        v.voicemail_local_after_email, v.voicemail_mail_to,
+        s.extension_setting_type, s.extension_setting_name, s.extension_setting_value
+    FROM v_domains AS d
+    JOIN v_extensions AS e ON e.domain_uuid = d.domain_uuid
+    LEFT JOIN LATERAL (
+        SELECT user_uuid FROM v_extension_users
+        WHERE domain_uuid = e.domain_uuid AND extension_uuid = e.extension_uuid
+        LIMIT 1
+    ) AS eu ON true
+    LEFT JOIN v_users AS u ON u.domain_uuid = e.domain_uuid AND u.user_uuid = eu.user_uuid
+    LEFT JOIN LATERAL (
+        SELECT value FROM (
+            SELECT 1 AS layer, domain_setting_value AS value FROM v_domain_settings
+            WHERE domain_uuid = d.domain_uuid AND domain_setting_enabled = 'true'
+            AND domain_setting_category = 'domain' AND domain_setting_subcategory = 'dial_string'
+            AND domain_setting_name = 'text' AND domain_setting_value IS NOT NULL
+            UNION ALL
+            SELECT 2 AS layer, default_setting_value AS value FROM v_default_settings
+            WHERE default_setting_enabled = 'true'
+            AND default_setting_category = 'domain' AND default_setting_subcategory = 'dial_string'
+            AND default_setting_name = 'text' AND default_setting_value IS NOT NULL
+        ) AS layers ORDER BY layer LIMIT 1
+    ) AS ds ON true
+    LEFT JOIN LATERAL (
+        SELECT * FROM v_voicemails
+        WHERE domain_uuid = e.domain_uuid
+        AND voicemail_id = COALESCE(NULLIF(e.number_alias, ''), e.extension)
+        LIMIT 1
+    ) AS v ON true
+    LEFT JOIN v_extension_settings AS s
+    ON s.extension_uuid = e.extension_uuid AND s.extension_setting_enabled = 'true'
+    WHERE d.domain_name = $1
+    AND d.domain_enabled = 'true'
+    AND e.enabled = 'true'
+"""
+
+# The entry of one user, resolved by extension or number alias
+RESOLVE_USER_QUERY = RESOLVE_DOMAIN_QUERY + """
+    AND (e.extension = $2 OR e.number_alias = $2)
+"""
+
+VOICEMAIL_COLUMNS = (
+    'voicemail_uuid', 'voicemail_enabled', 'voicemail_password', 'voicemail_attach_file',
+    'voicemail_local_after_email', 'voicemail_mail_to',
+)
+SETTING_COLUMNS = ('extension_setting_type', 'extension_setting_name', 'extension_setting_value')
+
+REGISTRATION_HOSTNAME_QUERY = """
+    SELECT hostname FROM registrations
+    WHERE reg_user = $1
+    AND realm = $2
+    AND expires > extract(epoch FROM now())::integer
+"""
+
+baseDB.register("directory.resolve_user", RESOLVE_USER_QUERY)
+baseDB.register("directory.registration_hostname", REGISTRATION_HOSTNAME_QUERY)
+
+
+class DirectoryDB:
+    """Queries used to build the FreeSWITCH directory, mirroring xml_handler/directory.lua"""
+
+    async def resolve_user(self, domain_name: str, user: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolve a user by extension or number alias in a single round trip
+
+        Returns:
+            dict with the extension row, user_uuid, contact_uuid, settings, voicemail
+            and the domain dial_string setting, or None if the user does not exist
+        """
+        rows = await baseDB.fetch_all_prepared("directory.resolve_user", domain_name, user)
+        if not rows:
+            return None
+
+        first = rows[0]
+        extension_uuid = first['extension_uuid']
+        return self._directory_entry([row for row in rows if row['extension_uuid'] == extension_uuid])
+
+    async def resolve_domain(self, domain_name: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Iterate over the directory entries of every enabled extension of a domain
+
+        The rows are streamed in extension order, so only one entry is held at a time.
+        """
+        rows = []
+        query = RESOLVE_DOMAIN_QUERY + " ORDER BY e.extension_uuid"
+        async for row in baseDB.stream(query, domain_name):
+            if rows and row['extension_uuid'] != rows[0]['extension_uuid']:
+                yield self._directory_entry(rows)
+                rows = []
+            rows.append(dict(row))
+        if rows:
+            yield self._directory_entry(rows)
+
+    def _directory_entry(self, rows) -> Dict[str, Any]:
+        """Fold the rows of one extension (one per enabled setting) into its directory entry"""
+        first = rows[0]
+        settings = [
+            {column: row[column] for column in SETTING_COLUMNS}
+            for row in rows
+            if row['extension_setting_type']
+        ]
+        voicemail = None
+        if first['voicemail_uuid']:
+            voicemail = {column: first[column] for column in VOICEMAIL_COLUMNS}
+
+        return {
+            "domain_uuid": first['domain_uuid'],
+            "extension": first,
+            "user_uuid": first['user_uuid'],
+            "contact_uuid": first['contact_uuid'],
+            "settings": settings,
+            "voicemail": voicemail,
+            "dial_string": first['domain_dial_string'],
+        }
+
+    async def get_registration_hostname(self, reg_user: str, realm: str) -> Optional[str]:
+        """Get the hostname of the switch an unexpired registration belongs to"""
+        row = await baseDB.fetch_one_prepared("directory.registration_hostname", reg_user, realm)
+        return row['hostname'] if row else None
+
+
+# Global directory database instance
+directory_db = DirectoryDB()
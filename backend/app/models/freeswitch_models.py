@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID, uuid4
 
@@ -253,12 +253,38 @@ class Voicemail(VoicemailBase):
     class Config:
         from_attributes = True
 
+# Bulk Import Models
+class ExtensionImportSetting(ExtensionSettingBase):
+    pass
+
+class ExtensionImportVoicemail(BaseModel):
+    # Defaults to the number alias or extension, the id directory.lua looks up
+    voicemail_id: Optional[str] = None
+    voicemail_enabled: str = "true"
+    voicemail_password: Optional[str] = None
+    voicemail_attach_file: Optional[str] = None
+    voicemail_local_after_email: Optional[str] = None
+    voicemail_mail_to: Optional[str] = None
+
+class ExtensionImport(ExtensionCreate):
+    settings: List[ExtensionImportSetting] = []
+    voicemail: Optional[ExtensionImportVoicemail] = None
+
+class ExtensionBulkImport(BaseModel):
+    extensions: List[ExtensionImport]
+
+class ExtensionBulkImportResult(BaseModel):
+    extensions: int
+    settings: int
+    voicemails: int
+
 # Default Settings Models
 class DefaultSettingBase(BaseModel):
     default_setting_category: str
     default_setting_subcategory: str
     default_setting_name: Optional[str] = None
     default_setting_value: Optional[str] = None
+    default_setting_enabled: str = "true"
 
 class DefaultSettingCreate(DefaultSettingBase):
     pass
@@ -268,6 +294,7 @@ class DefaultSettingUpdate(BaseModel):
     default_setting_subcategory: Optional[str] = None
     default_setting_name: Optional[str] = None
     default_setting_value: Optional[str] = None
+    default_setting_enabled: Optional[str] = None
 
 class DefaultSetting(DefaultSettingBase):
     default_setting_uuid: UUID
@@ -302,6 +329,34 @@ class Dialplan(DialplanBase):
     class Config:
         from_attributes = True
 
+# Destination Models
+class DestinationBase(BaseModel):
+    destination_prefix: Optional[str] = None
+    destination_trunk_prefix: Optional[str] = None
+    destination_area_code: Optional[str] = None
+    destination_number: str
+    dialplan_uuid: Optional[UUID] = None
+
+class DestinationCreate(DestinationBase):
+    domain_uuid: Optional[UUID] = None
+
+class DestinationUpdate(BaseModel):
+    domain_uuid: Optional[UUID] = None
+    destination_prefix: Optional[str] = None
+    destination_trunk_prefix: Optional[str] = None
+    destination_area_code: Optional[str] = None
+    destination_number: Optional[str] = None
+    dialplan_uuid: Optional[UUID] = None
+
+class Destination(DestinationBase):
+    destination_uuid: UUID
+    domain_uuid: Optional[UUID] = None
+    destination_number: Optional[str] = None
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 # Registration Models (read-only, managed by FreeSWITCH)
 class Registration(BaseModel):
     reg_uuid: UUID
@@ -312,4 +367,10 @@ class Registration(BaseModel):
     created_at: Optional[datetime] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Search Models
+class SearchResults(BaseModel):
+    extensions: List[Extension] = []
+    users: List[User] = []
+    contacts: List[Contact] = []
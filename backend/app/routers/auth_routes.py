@@ -2,7 +2,11 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import datetime, timedelta
 import uuid
 from app.models.queue_model import UserLogin,ChangePasswordRequest, Token, UserDetails, UserCreate
-from app.utils.auth_utils import hash_password, verify_password, create_access_token, verify_token, generate_api_key
+from app.utils.auth_utils import (
+    hash_password_async, verify_password_async, create_access_token, verify_token, generate_api_key,
+    get_token_payload, get_current_principal,
+)
+from app.utils.auth_cache import get_principal_cache, token_revocations
 from app.db.auth_db import db
 ACCESS_TOKEN_EXPIRE_MINUTES = 60*24*30
 
@@ -24,7 +28,7 @@ async def login(user_credentials: UserLogin):
         )
     
     # Verify password
-    if not verify_password(user_credentials.password, user_record['password'], user_record['salt']):
+    if not await verify_password_async(user_credentials.password, user_record['password'], user_record['salt']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -66,32 +70,26 @@ async def login(user_credentials: UserLogin):
     )
 
 @router.get("/user-details", response_model=UserDetails)
-async def get_current_user(user_uuid: str = Depends(verify_token)):
+async def get_current_user(principal: dict = Depends(get_current_principal)):
     """
     Get current user information
     """
-    user_record = await db.get_user_by_uuid(uuid.UUID(user_uuid))
-    
-    if not user_record:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
     return UserDetails(
-        username=user_record['username'],
-        user_email=user_record['user_email'],
-        user_status=user_record['user_status'],
-        user_type=user_record['user_type'],
-        user_enabled=user_record['user_enabled'],
-        extension=user_record['extension']
+        username=principal['username'],
+        user_email=principal['user_email'],
+        user_status=principal['user_status'],
+        user_type=principal['user_type'],
+        user_enabled=principal['user_enabled'],
+        extension=principal['extension']
     )
 
 @router.post("/logout")
-async def logout(user_uuid: str = Depends(verify_token)):
+async def logout(payload: dict = Depends(get_token_payload)):
     """
-    Logout endpoint (token invalidation would be handled client-side or with a token blacklist)
+    Logout endpoint, revokes the token until it expires
     """
+    await token_revocations.revoke(payload['jti'], payload['sub'], int(payload['exp']))
+    get_principal_cache().invalidate_token(payload['sub'], payload['jti'])
     return {"message": "Successfully logged out"}
 
 @router.post("/refresh")
@@ -129,16 +127,17 @@ async def change_password(
         )
 
     # Verify current password
-    if not verify_password(payload.current_password, user_record['password'], user_record['salt']):
+    if not await verify_password_async(payload.current_password, user_record['password'], user_record['salt']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Current password is incorrect"
         )
 
     # Hash new password
-    new_password_hash, new_salt = hash_password(payload.new_password)
+    new_password_hash, new_salt = await hash_password_async(payload.new_password)
 
     # Update password in DB
     await db.change_user_password(user_record['user_uuid'], new_password_hash, new_salt)
+    get_principal_cache().invalidate_user(user_uuid)
 
     return {"message": "Password changed successfully"}
\ No newline at end of file
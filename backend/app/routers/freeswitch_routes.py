@@ -1,427 +1,758 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Request, Response, Query
+from pydantic import ValidationError
+from typing import List, Literal, Optional, Tuple
 from uuid import UUID
 import uuid
+import time
+import csv
+import io
 from app.database import baseDB
-from app.utils.cache import invalidate_extension_cache, invalidate_domain_cache, invalidate_user_cache
+from app.utils.cache import (
+    get_cache, invalidate_extension_cache, invalidate_extensions_cache, invalidate_domain_cache, invalidate_user_cache,
+    invalidate_dialplan_cache,
+)
+from app.utils.cache_publisher import get_publisher
+from app.utils.directory_warmer import warm_directory_users, warm_directory_domain
+from app.utils.call_groups import call_group_index, refresh_call_groups
+from app.utils.dialplan_xml import dialplan_cache_keys, destination_cache_keys, warm_dialplan_contexts
+from app.utils.settings import settings_engine, refresh_default_settings
+from app.utils.registration_locator import get_locator
+from app.utils.auth_cache import get_principal_cache
+from app.utils.export import export_response
+from app.utils.pagination import Keyset, PageParams, page_params, fetch_page
+from app.utils.serialization import rows_response, row_response, parse_fields, projected_model, project_rows, dumps
+from app.utils.search import SEARCH_TARGETS, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, MAX_QUERY_LENGTH, search
+from app.utils.table_versions import conditional_get, validator_headers
 from app.models.freeswitch_models import (
     Domain, DomainCreate, DomainUpdate,
     Contact, ContactCreate, ContactUpdate,
     User, UserCreate, UserUpdate,
     Extension, ExtensionCreate, ExtensionUpdate,
+    ExtensionImport, ExtensionBulkImport, ExtensionBulkImportResult,
     ExtensionUser, ExtensionUserCreate,
     ExtensionSetting, ExtensionSettingCreate, ExtensionSettingUpdate,
     Voicemail, VoicemailCreate, VoicemailUpdate,
     DefaultSetting, DefaultSettingCreate, DefaultSettingUpdate,
     Dialplan, DialplanCreate, DialplanUpdate,
-    Registration
+    Destination, DestinationCreate, DestinationUpdate,
+    Registration, SearchResults
 )
 
 router = APIRouter(prefix="/api/freeswitch", tags=["FreeSWITCH Management"])
 
+# Extension columns written by create_extension, in insert order
+EXTENSION_INSERT_FIELDS = ["extension_uuid", "domain_uuid"] + [
+    k for k in ExtensionCreate.model_fields.keys() if k != "domain_uuid"
+]
+
+# Columns loaded with COPY by the bulk extension import
+EXTENSION_SETTING_COPY_COLUMNS = [
+    "extension_setting_uuid", "extension_uuid", "extension_setting_type",
+    "extension_setting_name", "extension_setting_value", "extension_setting_enabled",
+]
+VOICEMAIL_COPY_COLUMNS = [
+    "voicemail_uuid", "domain_uuid", "voicemail_id", "voicemail_enabled", "voicemail_password",
+    "voicemail_attach_file", "voicemail_local_after_email", "voicemail_mail_to",
+]
+
+# Fill v_destination_numbers with every number the single mode query of dialplan.lua
+# matched with CONCAT() alternatives, so a DID is resolved with one index lookup
+DESTINATION_NUMBERS_INSERT = """
+    INSERT INTO v_destination_numbers (destination_number, destination_uuid, dialplan_uuid, domain_uuid)
+    SELECT DISTINCT n.destination_number, d.destination_uuid, d.dialplan_uuid, d.domain_uuid
+    FROM v_destinations AS d
+    CROSS JOIN LATERAL (VALUES
+        (CONCAT(d.destination_prefix, d.destination_area_code, d.destination_number)),
+        (CONCAT(d.destination_trunk_prefix, d.destination_area_code, d.destination_number)),
+        (CONCAT(d.destination_prefix, d.destination_number)),
+        (CONCAT('+', d.destination_prefix, d.destination_number)),
+        (CONCAT('+', d.destination_prefix, d.destination_area_code, d.destination_number)),
+        (CONCAT(d.destination_area_code, d.destination_number)),
+        (d.destination_number)
+    ) AS n(destination_number)
+    WHERE d.destination_number IS NOT NULL
+    AND n.destination_number NOT IN ('', '+')
+"""
+
+# Hot statements, prepared on first use on every pooled connection
+STATEMENTS = {
+    "domains.list": "SELECT * FROM v_domains ORDER BY domain_name",
+    "domains.get": "SELECT * FROM v_domains WHERE domain_uuid = $1",
+    "domains.insert": """
+        INSERT INTO v_domains (domain_uuid, domain_name, domain_enabled)
+        VALUES ($1, $2, $3)
+        RETURNING *
+    """,
+    "domains.get_for_update": "SELECT * FROM v_domains WHERE domain_uuid = $1 FOR UPDATE",
+    "domains.names": "SELECT domain_uuid, domain_name FROM v_domains WHERE domain_uuid = ANY($1::uuid[])",
+    "domains.cache_subjects": """
+        SELECT 'directory:' || extension AS subject FROM v_extensions WHERE domain_uuid = $1
+        UNION ALL
+        SELECT 'directory:' || number_alias FROM v_extensions WHERE domain_uuid = $1 AND number_alias <> ''
+        UNION ALL
+        SELECT 'user:' || username FROM v_users WHERE domain_uuid = $1 AND username IS NOT NULL
+        UNION ALL
+        SELECT 'auth:' || username FROM v_users WHERE domain_uuid = $1 AND username IS NOT NULL
+    """,
+    "domains.delete": "DELETE FROM v_domains WHERE domain_uuid = $1 RETURNING *",
+    "contacts.get": "SELECT * FROM v_contacts WHERE contact_uuid = $1",
+    "contacts.insert": """
+        INSERT INTO v_contacts (contact_uuid, contact_name, contact_email, contact_description)
+        VALUES ($1, $2, $3, $4)
+        RETURNING *
+    """,
+    "contacts.delete": "DELETE FROM v_contacts WHERE contact_uuid = $1",
+    "users.get": "SELECT * FROM v_users WHERE user_uuid = $1",
+    "users.insert": """
+        INSERT INTO v_users (user_uuid, domain_uuid, contact_uuid, username)
+        VALUES ($1, $2, $3, $4)
+        RETURNING *
+    """,
+    "users.get_for_update": """
+        SELECT u.*, d.domain_name FROM v_users AS u
+        JOIN v_domains AS d ON d.domain_uuid = u.domain_uuid
+        WHERE u.user_uuid = $1
+        FOR UPDATE OF u
+    """,
+    "users.delete": """
+        DELETE FROM v_users AS u USING v_domains AS d
+        WHERE u.user_uuid = $1 AND d.domain_uuid = u.domain_uuid
+        RETURNING u.*, d.domain_name
+    """,
+    "extensions.get": "SELECT * FROM v_extensions WHERE extension_uuid = $1",
+    "extensions.insert": f"""
+        WITH e AS (
+            INSERT INTO v_extensions ({", ".join(EXTENSION_INSERT_FIELDS)})
+            VALUES ({", ".join([f"${i+1}" for i in range(len(EXTENSION_INSERT_FIELDS))])})
+            RETURNING *
+        )
+        SELECT e.*, d.domain_name FROM e JOIN v_domains AS d ON d.domain_uuid = e.domain_uuid
+    """,
+    "extensions.get_for_update": """
+        SELECT e.*, d.domain_name FROM v_extensions AS e
+        JOIN v_domains AS d ON d.domain_uuid = e.domain_uuid
+        WHERE e.extension_uuid = $1
+        FOR UPDATE OF e
+    """,
+    "extensions.delete": """
+        DELETE FROM v_extensions AS e USING v_domains AS d
+        WHERE e.extension_uuid = $1 AND d.domain_uuid = e.domain_uuid
+        RETURNING e.*, d.domain_name
+    """,
+    "extension_settings.by_extension": """
+        SELECT * FROM v_extension_settings WHERE extension_uuid = $1 ORDER BY extension_setting_name
+    """,
+    "extension_settings.get": "SELECT * FROM v_extension_settings WHERE extension_setting_uuid = $1",
+    "extension_settings.insert": """
+        INSERT INTO v_extension_settings (
+            extension_setting_uuid, extension_uuid, extension_setting_type,
+            extension_setting_name, extension_setting_value, extension_setting_enabled
+        )
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING *
+    """,
+    "extension_settings.delete": "DELETE FROM v_extension_settings WHERE extension_setting_uuid = $1",
+    "voicemails.get": "SELECT * FROM v_voicemails WHERE voicemail_uuid = $1",
+    "voicemails.insert": """
+        INSERT INTO v_voicemails (
+            voicemail_uuid, domain_uuid, voicemail_id, voicemail_enabled,
+            voicemail_password, voicemail_attach_file, voicemail_local_after_email,
+            voicemail_mail_to
+        )
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        RETURNING *
+    """,
+    "voicemails.delete": "DELETE FROM v_voicemails WHERE voicemail_uuid = $1",
+    "default_settings.get": "SELECT * FROM v_default_settings WHERE default_setting_uuid = $1",
+    "default_settings.get_for_update": "SELECT * FROM v_default_settings WHERE default_setting_uuid = $1 FOR UPDATE",
+    "default_settings.insert": """
+        INSERT INTO v_default_settings (
+            default_setting_uuid, default_setting_category, default_setting_subcategory,
+            default_setting_name, default_setting_value, default_setting_enabled
+        )
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING *
+    """,
+    "default_settings.delete": "DELETE FROM v_default_settings WHERE default_setting_uuid = $1 RETURNING *",
+    "dialplans.list": "SELECT * FROM v_dialplans ORDER BY dialplan_order, dialplan_name",
+    "dialplans.get": "SELECT * FROM v_dialplans WHERE dialplan_uuid = $1",
+    "dialplans.get_for_update": "SELECT * FROM v_dialplans WHERE dialplan_uuid = $1 FOR UPDATE",
+    "dialplans.insert": """
+        INSERT INTO v_dialplans (
+            dialplan_uuid, domain_uuid, dialplan_name, dialplan_context,
+            dialplan_xml, dialplan_enabled, dialplan_order
+        )
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING *
+    """,
+    "dialplans.delete": "DELETE FROM v_dialplans WHERE dialplan_uuid = $1",
+    "destinations.get": "SELECT * FROM v_destinations WHERE destination_uuid = $1",
+    "destinations.get_for_update": "SELECT * FROM v_destinations WHERE destination_uuid = $1 FOR UPDATE",
+    "destinations.insert": """
+        INSERT INTO v_destinations (
+            destination_uuid, domain_uuid, destination_prefix, destination_trunk_prefix,
+            destination_area_code, destination_number, dialplan_uuid
+        )
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING *
+    """,
+    "destinations.delete": "DELETE FROM v_destinations WHERE destination_uuid = $1",
+    "destinations.lookup": """
+        SELECT d.* FROM v_destination_numbers AS n
+        JOIN v_destinations AS d ON d.destination_uuid = n.destination_uuid
+        WHERE n.destination_number = $1
+    """,
+    "destination_numbers.delete": "DELETE FROM v_destination_numbers WHERE destination_uuid = $1",
+    "destination_numbers.sync": DESTINATION_NUMBERS_INSERT + " AND d.destination_uuid = $1",
+    "registrations.get": "SELECT * FROM registrations WHERE reg_uuid = $1",
+}
+for name, statement in STATEMENTS.items():
+    baseDB.register(name, statement)
+
+# Keyset orderings of the paginated list endpoints, backed by the indexes in database_setup.sql
+CONTACT_KEYSET = Keyset("contacts", "v_contacts", (
+    ("COALESCE(contact_name, '')", "contact_name"), ("contact_uuid", "contact_uuid"),
+))
+USER_KEYSET = Keyset("users", "v_users", (
+    ("domain_uuid", "domain_uuid"), ("COALESCE(username, '')", "username"), ("user_uuid", "user_uuid"),
+), filters=("domain_uuid",))
+EXTENSION_KEYSET = Keyset("extensions", "v_extensions", (
+    ("domain_uuid", "domain_uuid"), ("extension", "extension"), ("extension_uuid", "extension_uuid"),
+), filters=("domain_uuid",))
+EXTENSION_SETTING_KEYSET = Keyset("extension_settings", "v_extension_settings", (
+    ("extension_uuid", "extension_uuid"), ("extension_setting_name", "extension_setting_name"),
+    ("extension_setting_uuid", "extension_setting_uuid"),
+), filters=("extension_uuid",))
+VOICEMAIL_KEYSET = Keyset("voicemails", "v_voicemails", (
+    ("domain_uuid", "domain_uuid"), ("voicemail_id", "voicemail_id"), ("voicemail_uuid", "voicemail_uuid"),
+), filters=("domain_uuid",))
+DEFAULT_SETTING_KEYSET = Keyset("default_settings", "v_default_settings", (
+    ("default_setting_category", "default_setting_category"),
+    ("default_setting_subcategory", "default_setting_subcategory"),
+    ("default_setting_uuid", "default_setting_uuid"),
+), filters=("default_setting_category",))
+DESTINATION_KEYSET = Keyset("destinations", "v_destinations", (
+    ("COALESCE(destination_number, '')", "destination_number"), ("destination_uuid", "destination_uuid"),
+), filters=("domain_uuid",))
+REGISTRATION_KEYSET = Keyset("registrations", "registrations", (
+    ("reg_user", "reg_user"), ("realm", "realm"), ("reg_uuid", "reg_uuid"),
+), filters=("realm",))
+
+async def domain_cache_keys(db, domain_uuid: str, domain_name: str) -> List[str]:
+    """
+    Keys the Lua handlers may have cached for a domain. The index of the file cache
+    only knows the writes of this process, and the switch nodes only get exact keys
+    from the cache publisher, so they are enumerated from the database.
+    """
+    if get_cache().index_complete and get_publisher() is None:
+        return []
+    rows = await db.fetch_all_prepared("domains.cache_subjects", domain_uuid)
+    return [f"{row['subject']}@{domain_name}" for row in rows]
+
 # Domain endpoints
 @router.get("/domains", response_model=List[Domain])
-async def get_domains():
-    query = "SELECT * FROM v_domains ORDER BY domain_name"
-    return await baseDB.fetch_all(query)
+async def get_domains(request: Request, response: Response):
+    etag, not_modified = await conditional_get(request, "v_domains")
+    if not_modified:
+        return not_modified
+    if etag:
+        response.headers.update(validator_headers(etag))
+    return await baseDB.fetch_all_prepared("domains.list")
 
 @router.get("/domains/{domain_uuid}", response_model=Domain)
-async def get_domain(domain_uuid: UUID):
-    query = "SELECT * FROM v_domains WHERE domain_uuid = $1"
-    domain = await baseDB.fetch_one(query, str(domain_uuid))
+async def get_domain(domain_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Domain)
+    domain = await baseDB.fetch_one_columns("domains.get", "v_domains", "domain_uuid", str(domain_uuid), columns)
     if not domain:
         raise HTTPException(status_code=404, detail="Domain not found")
-    return domain
+    return row_response(domain, projected_model(Domain, columns)) if columns else domain
 
 @router.post("/domains", response_model=Domain)
 async def create_domain(domain: DomainCreate):
     domain_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_domains (domain_uuid, domain_name, domain_enabled)
-        VALUES ($1, $2, $3)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(query, domain_uuid, domain.domain_name, domain.domain_enabled)
+    result = await baseDB.fetch_one_prepared("domains.insert", domain_uuid, domain.domain_name, domain.domain_enabled)
     return result
 
 @router.put("/domains/{domain_uuid}", response_model=Domain)
 async def update_domain(domain_uuid: UUID, domain: DomainUpdate):
-    # Check if domain exists
-    existing = await baseDB.fetch_one("SELECT * FROM v_domains WHERE domain_uuid = $1", str(domain_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Domain not found")
-    
-    update_data = domain.dict(exclude_unset=True)
-    if not update_data:
-        return existing
-    
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_domains SET {set_clause} WHERE domain_uuid = $1 RETURNING *"
-    values = [str(domain_uuid)] + list(update_data.values())
-    
-    result = await baseDB.fetch_one(query, *values)
+    # Lock the domain for the read-modify-write, the cache is invalidated after commit
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("domains.get_for_update", str(domain_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Domain not found")
+        
+        update_data = domain.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        result = await tx.update_row("v_domains", "domain_uuid", str(domain_uuid), update_data)
+        
+        renamed = 'domain_name' in update_data and update_data['domain_name'] != existing['domain_name']
+        known_keys = await domain_cache_keys(tx, str(domain_uuid), existing['domain_name'])
+        if renamed:
+            new_known_keys = await domain_cache_keys(tx, str(domain_uuid), update_data['domain_name'])
     
     # Invalidate domain cache after update
-    await invalidate_domain_cache(existing['domain_name'])
-    if 'domain_name' in update_data and update_data['domain_name'] != existing['domain_name']:
-        await invalidate_domain_cache(update_data['domain_name'])
+    await invalidate_domain_cache(existing['domain_name'], known_keys)
+    if renamed:
+        await invalidate_domain_cache(update_data['domain_name'], new_known_keys)
+    warm_directory_domain(result['domain_name'])
+    call_group_index.reset(str(domain_uuid))
+    if renamed:
+        await refresh_call_groups(str(domain_uuid), existing['domain_name'], store=False)
+    await refresh_call_groups(str(domain_uuid), result['domain_name'])
     
     return result
 
 @router.delete("/domains/{domain_uuid}")
 async def delete_domain(domain_uuid: UUID):
-    # Get domain info before deletion for cache invalidation
-    existing = await baseDB.fetch_one("SELECT * FROM v_domains WHERE domain_uuid = $1", str(domain_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Domain not found")
-    
-    query = "DELETE FROM v_domains WHERE domain_uuid = $1"
-    result = await baseDB.execute(query, str(domain_uuid))
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("domains.get_for_update", str(domain_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Domain not found")
+        
+        # Enumerate the keys before the delete cascades to the extensions and users
+        known_keys = await domain_cache_keys(tx, str(domain_uuid), existing['domain_name'])
+        await tx.execute_prepared("domains.delete", str(domain_uuid))
     
     # Invalidate domain cache after deletion
-    await invalidate_domain_cache(existing['domain_name'])
+    await invalidate_domain_cache(existing['domain_name'], known_keys)
+    call_group_index.reset(str(domain_uuid))
+    await refresh_call_groups(str(domain_uuid), existing['domain_name'], store=False)
     
     return {"message": "Domain deleted successfully"}
 
+@router.get("/domains/{domain_uuid}/call-groups")
+async def get_domain_call_groups(domain_uuid: UUID):
+    """Call groups of a domain and the extensions in each"""
+    domain = await baseDB.fetch_one_prepared("domains.get", str(domain_uuid))
+    if not domain:
+        raise HTTPException(status_code=404, detail="Domain not found")
+    groups = await call_group_index.get(str(domain_uuid), domain['domain_name'])
+    return groups.as_dict()
+
 # Contact endpoints
 @router.get("/contacts", response_model=List[Contact])
-async def get_contacts():
-    query = "SELECT * FROM v_contacts ORDER BY contact_name"
-    return await baseDB.fetch_all(query)
+async def get_contacts(request: Request, page: PageParams = Depends(page_params), fields: Optional[str] = None):
+    etag, not_modified = await conditional_get(request, "v_contacts")
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, Contact)
+    rows, next_cursor = await fetch_page(CONTACT_KEYSET, page, records=True, columns=columns)
+    return rows_response(rows, projected_model(Contact, columns), next_cursor, etag)
 
 @router.get("/contacts/{contact_uuid}", response_model=Contact)
-async def get_contact(contact_uuid: UUID):
-    query = "SELECT * FROM v_contacts WHERE contact_uuid = $1"
-    contact = await baseDB.fetch_one(query, str(contact_uuid))
+async def get_contact(contact_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Contact)
+    contact = await baseDB.fetch_one_columns("contacts.get", "v_contacts", "contact_uuid", str(contact_uuid), columns)
     if not contact:
         raise HTTPException(status_code=404, detail="Contact not found")
-    return contact
+    return row_response(contact, projected_model(Contact, columns)) if columns else contact
 
 @router.post("/contacts", response_model=Contact)
 async def create_contact(contact: ContactCreate):
     contact_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_contacts (contact_uuid, contact_name, contact_email, contact_description)
-        VALUES ($1, $2, $3, $4)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(
-        query, contact_uuid, contact.contact_name, 
+    result = await baseDB.fetch_one_prepared(
+        "contacts.insert", contact_uuid, contact.contact_name, 
         contact.contact_email, contact.contact_description
     )
     return result
 
 @router.put("/contacts/{contact_uuid}", response_model=Contact)
 async def update_contact(contact_uuid: UUID, contact: ContactUpdate):
-    existing = await baseDB.fetch_one("SELECT * FROM v_contacts WHERE contact_uuid = $1", str(contact_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
     update_data = contact.dict(exclude_unset=True)
-    if not update_data:
-        return existing
-    
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_contacts SET {set_clause} WHERE contact_uuid = $1 RETURNING *"
-    values = [str(contact_uuid)] + list(update_data.values())
-    
-    result = await baseDB.fetch_one(query, *values)
+    if update_data:
+        result = await baseDB.update_row("v_contacts", "contact_uuid", str(contact_uuid), update_data)
+    else:
+        result = await baseDB.fetch_one_prepared("contacts.get", str(contact_uuid))
+    if not result:
+        raise HTTPException(status_code=404, detail="Contact not found")
     return result
 
 @router.delete("/contacts/{contact_uuid}")
 async def delete_contact(contact_uuid: UUID):
-    query = "DELETE FROM v_contacts WHERE contact_uuid = $1"
-    result = await baseDB.execute(query, str(contact_uuid))
+    result = await baseDB.execute_prepared("contacts.delete", str(contact_uuid))
     if result == 0:
         raise HTTPException(status_code=404, detail="Contact not found")
     return {"message": "Contact deleted successfully"}
 
 # User endpoints
 @router.get("/users", response_model=List[User])
-async def get_users():
-    query = "SELECT * FROM v_users ORDER BY username"
-    return await baseDB.fetch_all(query)
+async def get_users(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    domain_uuid: Optional[UUID] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_users", domain_uuid)
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, User)
+    rows, next_cursor = await fetch_page(
+        USER_KEYSET, page, {"domain_uuid": domain_uuid}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(User, columns), next_cursor, etag)
 
 @router.get("/users/{user_uuid}", response_model=User)
-async def get_user(user_uuid: UUID):
-    query = "SELECT * FROM v_users WHERE user_uuid = $1"
-    user = await baseDB.fetch_one(query, str(user_uuid))
+async def get_user(user_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, User)
+    user = await baseDB.fetch_one_columns("users.get", "v_users", "user_uuid", str(user_uuid), columns)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return row_response(user, projected_model(User, columns)) if columns else user
 
 @router.post("/users", response_model=User)
 async def create_user(user: UserCreate):
     user_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_users (user_uuid, domain_uuid, contact_uuid, username)
-        VALUES ($1, $2, $3, $4)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(
-        query, user_uuid, str(user.domain_uuid), 
+    result = await baseDB.fetch_one_prepared(
+        "users.insert", user_uuid, str(user.domain_uuid), 
         str(user.contact_uuid) if user.contact_uuid else None, user.username
     )
     return result
 
 @router.put("/users/{user_uuid}", response_model=User)
 async def update_user(user_uuid: UUID, user: UserUpdate):
-    existing = await baseDB.fetch_one("SELECT * FROM v_users WHERE user_uuid = $1", str(user_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    update_data = user.dict(exclude_unset=True)
-    if not update_data:
-        return existing
-    
-    # Handle UUID fields
-    if 'contact_uuid' in update_data and update_data['contact_uuid']:
-        update_data['contact_uuid'] = str(update_data['contact_uuid'])
-    
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_users SET {set_clause} WHERE user_uuid = $1 RETURNING *"
-    values = [str(user_uuid)] + list(update_data.values())
-    
-    result = await baseDB.fetch_one(query, *values)
+    # Lock the user for the read-modify-write, the cache is invalidated after commit
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("users.get_for_update", str(user_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        update_data = user.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        # Handle UUID fields
+        if 'contact_uuid' in update_data and update_data['contact_uuid']:
+            update_data['contact_uuid'] = str(update_data['contact_uuid'])
+        
+        result = await tx.update_row("v_users", "user_uuid", str(user_uuid), update_data)
     
     # Invalidate user cache after update
     if result:
-        domain_query = "SELECT domain_name FROM v_domains WHERE domain_uuid = $1"
-        domain_info = await baseDB.fetch_one(domain_query, result['domain_uuid'])
-        
-        if domain_info:
-            # Clear cache for both old and new username if changed
-            await invalidate_user_cache(existing['username'], domain_info['domain_name'])
-            if update_data.get('username') and update_data['username'] != existing['username']:
-                await invalidate_user_cache(result['username'], domain_info['domain_name'])
+        get_principal_cache().invalidate_user(str(user_uuid))
+        # Clear cache for both old and new username if changed
+        await invalidate_user_cache(existing['username'], existing['domain_name'])
+        if update_data.get('username') and update_data['username'] != existing['username']:
+            await invalidate_user_cache(result['username'], existing['domain_name'])
     
     return result
 
 @router.delete("/users/{user_uuid}")
 async def delete_user(user_uuid: UUID):
-    # Get user info before deletion for cache invalidation
-    existing = await baseDB.fetch_one("SELECT * FROM v_users WHERE user_uuid = $1", str(user_uuid))
+    # The deleted row and its domain name are returned for cache invalidation
+    existing = await baseDB.fetch_one_prepared("users.delete", str(user_uuid))
     if not existing:
         raise HTTPException(status_code=404, detail="User not found")
     
-    query = "DELETE FROM v_users WHERE user_uuid = $1"
-    result = await baseDB.execute(query, str(user_uuid))
-    
     # Invalidate user cache after deletion
-    domain_query = "SELECT domain_name FROM v_domains WHERE domain_uuid = $1"
-    domain_info = await baseDB.fetch_one(domain_query, existing['domain_uuid'])
-    
-    if domain_info:
-        await invalidate_user_cache(existing['username'], domain_info['domain_name'])
+    get_principal_cache().invalidate_user(str(user_uuid))
+    await invalidate_user_cache(existing['username'], existing['domain_name'])
     
     return {"message": "User deleted successfully"}
 
 # Extension endpoints
 @router.get("/extensions", response_model=List[Extension])
-async def get_extensions():
-    query = "SELECT * FROM v_extensions ORDER BY extension"
-    return await baseDB.fetch_all(query)
+async def get_extensions(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    domain_uuid: Optional[UUID] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_extensions", domain_uuid)
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, Extension)
+    rows, next_cursor = await fetch_page(
+        EXTENSION_KEYSET, page, {"domain_uuid": domain_uuid}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(Extension, columns), next_cursor, etag)
+
+@router.get("/extensions/export")
+async def export_extensions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    domain_uuid: Optional[UUID] = None,
+):
+    columns = list(Extension.model_fields.keys())
+    query = f"SELECT {', '.join(columns)} FROM v_extensions"
+    args = []
+    if domain_uuid:
+        query += " WHERE domain_uuid = $1"
+        args.append(str(domain_uuid))
+    query += " ORDER BY domain_uuid, extension, extension_uuid"
+    return export_response(baseDB.stream(query, *args), columns, format, "extensions")
 
 @router.get("/extensions/{extension_uuid}", response_model=Extension)
-async def get_extension(extension_uuid: UUID):
-    query = "SELECT * FROM v_extensions WHERE extension_uuid = $1"
-    extension = await baseDB.fetch_one(query, str(extension_uuid))
+async def get_extension(extension_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Extension)
+    extension = await baseDB.fetch_one_columns("extensions.get", "v_extensions", "extension_uuid", str(extension_uuid), columns)
     if not extension:
         raise HTTPException(status_code=404, detail="Extension not found")
-    return extension
+    return row_response(extension, projected_model(Extension, columns)) if columns else extension
 
 @router.post("/extensions", response_model=Extension)
 async def create_extension(extension: ExtensionCreate):
     extension_uuid = str(uuid.uuid4())
     
-    # Build the insert query dynamically
-    fields = ["extension_uuid", "domain_uuid"] + [k for k in extension.dict().keys() if k != "domain_uuid"]
-    placeholders = ", ".join([f"${i+1}" for i in range(len(fields))])
-    field_names = ", ".join(fields)
-    
-    query = f"""
-        INSERT INTO v_extensions ({field_names})
-        VALUES ({placeholders})
-        RETURNING *
-    """
-    
     values = [extension_uuid, str(extension.domain_uuid)] + [
         str(v) if isinstance(v, uuid.UUID) and v else v 
         for k, v in extension.dict().items() if k != "domain_uuid"
     ]
     
-    result = await baseDB.fetch_one(query, *values)
-    
-    # Get domain name for cache invalidation
-    domain_query = "SELECT domain_name FROM v_domains WHERE domain_uuid = $1"
-    domain_info = await baseDB.fetch_one(domain_query, str(extension.domain_uuid))
+    # The inserted row is returned joined with its domain name for cache invalidation
+    result = await baseDB.fetch_one_prepared("extensions.insert", *values)
     
-    if domain_info and result:
-        user_context = result.get('user_context', domain_info['domain_name'])
+    if result:
+        user_context = result.get('user_context', result['domain_name'])
         await invalidate_extension_cache(
             extension=result['extension'],
             user_context=user_context,
             number_alias=result.get('number_alias')
         )
+        warm_directory_users(result['domain_name'], [result['extension']])
+        if result.get('call_group'):
+            call_group_index.set_extension(
+                str(result['domain_uuid']), extension_uuid, result['extension'], result['call_group']
+            )
+            await refresh_call_groups(str(result['domain_uuid']), result['domain_name'])
     
     return result
 
-@router.put("/extensions/{extension_uuid}", response_model=Extension)
-async def update_extension(extension_uuid: UUID, extension: ExtensionUpdate):
-    existing = await baseDB.fetch_one("SELECT * FROM v_extensions WHERE extension_uuid = $1", str(extension_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Extension not found")
+async def import_extensions(extensions: List[ExtensionImport]) -> ExtensionBulkImportResult:
+    """Load extensions with their settings and voicemail boxes using COPY in one transaction"""
+    extension_records, setting_records, voicemail_records = [], [], []
+    for extension in extensions:
+        extension_uuid = uuid.uuid4()
+        data = extension.dict(exclude={"settings", "voicemail"})
+        extension_records.append(
+            (extension_uuid, extension.domain_uuid) + tuple(data[k] for k in EXTENSION_INSERT_FIELDS[2:])
+        )
+        for setting in extension.settings:
+            setting_records.append((
+                uuid.uuid4(), extension_uuid, setting.extension_setting_type,
+                setting.extension_setting_name, setting.extension_setting_value, setting.extension_setting_enabled,
+            ))
+        if extension.voicemail:
+            voicemail = extension.voicemail
+            voicemail_records.append((
+                uuid.uuid4(), extension.domain_uuid,
+                voicemail.voicemail_id or extension.number_alias or extension.extension,
+                voicemail.voicemail_enabled, voicemail.voicemail_password, voicemail.voicemail_attach_file,
+                voicemail.voicemail_local_after_email, voicemail.voicemail_mail_to,
+            ))
     
-    update_data = extension.dict(exclude_unset=True)
-    if not update_data:
-        return existing
+    domain_uuids = list({str(extension.domain_uuid) for extension in extensions})
+    async with baseDB.transaction() as tx:
+        domains = await tx.fetch_all_prepared("domains.names", domain_uuids)
+        domain_names = {str(row['domain_uuid']): row['domain_name'] for row in domains}
+        missing = [domain_uuid for domain_uuid in domain_uuids if domain_uuid not in domain_names]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Domain not found: {', '.join(missing)}")
+        
+        result = ExtensionBulkImportResult(
+            extensions=await tx.copy_records("v_extensions", extension_records, EXTENSION_INSERT_FIELDS),
+            settings=await tx.copy_records("v_extension_settings", setting_records, EXTENSION_SETTING_COPY_COLUMNS),
+            voicemails=await tx.copy_records("v_voicemails", voicemail_records, VOICEMAIL_COPY_COLUMNS),
+        )
     
-    # Handle UUID fields
-    for key in update_data:
-        if 'uuid' in key and update_data[key]:
-            update_data[key] = str(update_data[key])
+    # Invalidate the cache of every imported extension in one batch after commit
+    await invalidate_extensions_cache(
+        (
+            extension.extension,
+            extension.user_context or domain_names[str(extension.domain_uuid)],
+            extension.number_alias,
+        )
+        for extension in extensions
+    )
+    # Re-render whole domains, one streamed query each instead of one per extension
+    for domain_uuid, domain_name in domain_names.items():
+        warm_directory_domain(domain_name)
+        call_group_index.reset(domain_uuid)
+        await refresh_call_groups(domain_uuid, domain_name)
     
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_extensions SET {set_clause} WHERE extension_uuid = $1 RETURNING *"
-    values = [str(extension_uuid)] + list(update_data.values())
+    return result
+
+@router.post("/extensions/bulk", response_model=ExtensionBulkImportResult)
+async def bulk_import_extensions(payload: ExtensionBulkImport):
+    return await import_extensions(payload.extensions)
+
+@router.post("/extensions/bulk/csv", response_model=ExtensionBulkImportResult)
+async def bulk_import_extensions_csv(
+    file: UploadFile = File(...),
+    domain_uuid: Optional[UUID] = None,
+):
+    """
+    Import extensions from a CSV file with a header line of extension columns
+
+    Rows without a domain_uuid column use the domain_uuid query parameter. Columns
+    prefixed with voicemail_ create a voicemail box for the extension.
+    """
+    content = (await file.read()).decode("utf-8-sig")
+    extensions = []
+    # Line 1 is the header
+    for line, row in enumerate(csv.DictReader(io.StringIO(content)), start=2):
+        data = {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+        if domain_uuid and "domain_uuid" not in data:
+            data["domain_uuid"] = domain_uuid
+        voicemail = {key: data.pop(key) for key in list(data) if key.startswith("voicemail_")}
+        if voicemail:
+            data["voicemail"] = voicemail
+        try:
+            extensions.append(ExtensionImport(**data))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Line {line}: {e}")
     
-    result = await baseDB.fetch_one(query, *values)
+    return await import_extensions(extensions)
+
+@router.put("/extensions/{extension_uuid}", response_model=Extension)
+async def update_extension(extension_uuid: UUID, extension: ExtensionUpdate):
+    # Lock the extension for the read-modify-write, the cache is invalidated after commit
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("extensions.get_for_update", str(extension_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Extension not found")
+        
+        update_data = extension.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        # Handle UUID fields
+        for key in update_data:
+            if 'uuid' in key and update_data[key]:
+                update_data[key] = str(update_data[key])
+        
+        result = await tx.update_row("v_extensions", "extension_uuid", str(extension_uuid), update_data)
     
     # Invalidate extension cache after update
     if result:
-        # Get domain name for user_context
-        domain_query = "SELECT domain_name FROM v_domains WHERE domain_uuid = $1"
-        domain_info = await baseDB.fetch_one(domain_query, result['domain_uuid'])
+        user_context = existing['domain_name']
         
-        if domain_info:
-            user_context = domain_info['domain_name']
-            
-            # Clear cache for both old and new extension/alias if changed
+        # Clear cache for both old and new extension/alias if changed
+        await invalidate_extension_cache(
+            extension=existing['extension'],
+            user_context=user_context,
+            number_alias=existing.get('number_alias')
+        )
+        
+        # If extension number or alias changed, also clear new cache
+        if (update_data.get('extension') and update_data['extension'] != existing['extension']) or \
+           (update_data.get('number_alias') and update_data['number_alias'] != existing.get('number_alias')):
             await invalidate_extension_cache(
-                extension=existing['extension'],
+                extension=result['extension'],
                 user_context=user_context,
-                number_alias=existing.get('number_alias')
+                number_alias=result.get('number_alias')
+            )
+        
+        warm_directory_users(existing['domain_name'], [result['extension']])
+        
+        if (result.get('call_group'), result['extension']) != (existing.get('call_group'), existing['extension']):
+            call_group_index.set_extension(
+                str(result['domain_uuid']), str(extension_uuid), result['extension'], result.get('call_group')
             )
-            
-            # If extension number or alias changed, also clear new cache
-            if (update_data.get('extension') and update_data['extension'] != existing['extension']) or \
-               (update_data.get('number_alias') and update_data['number_alias'] != existing.get('number_alias')):
-                await invalidate_extension_cache(
-                    extension=result['extension'],
-                    user_context=user_context,
-                    number_alias=result.get('number_alias')
-                )
+            await refresh_call_groups(str(result['domain_uuid']), existing['domain_name'])
     
     return result
 
 @router.delete("/extensions/{extension_uuid}")
 async def delete_extension(extension_uuid: UUID):
-    # Get extension info before deletion for cache invalidation
-    existing = await baseDB.fetch_one("SELECT * FROM v_extensions WHERE extension_uuid = $1", str(extension_uuid))
+    # The deleted row and its domain name are returned for cache invalidation
+    existing = await baseDB.fetch_one_prepared("extensions.delete", str(extension_uuid))
     if not existing:
         raise HTTPException(status_code=404, detail="Extension not found")
     
-    query = "DELETE FROM v_extensions WHERE extension_uuid = $1"
-    result = await baseDB.execute(query, str(extension_uuid))
-    
     # Invalidate extension cache after deletion
-    domain_query = "SELECT domain_name FROM v_domains WHERE domain_uuid = $1"
-    domain_info = await baseDB.fetch_one(domain_query, existing['domain_uuid'])
-    
-    if domain_info:
-        user_context = existing.get('user_context', domain_info['domain_name'])
-        await invalidate_extension_cache(
-            extension=existing['extension'],
-            user_context=user_context,
-            number_alias=existing.get('number_alias')
-        )
+    user_context = existing.get('user_context', existing['domain_name'])
+    await invalidate_extension_cache(
+        extension=existing['extension'],
+        user_context=user_context,
+        number_alias=existing.get('number_alias')
+    )
+    if existing.get('call_group'):
+        call_group_index.remove_extension(str(existing['domain_uuid']), str(extension_uuid))
+        await refresh_call_groups(str(existing['domain_uuid']), existing['domain_name'])
     
     return {"message": "Extension deleted successfully"}
 
 # Extension Settings endpoints
 @router.get("/extension-settings", response_model=List[ExtensionSetting])
-async def get_extension_settings():
-    query = "SELECT * FROM v_extension_settings ORDER BY extension_setting_name"
-    return await baseDB.fetch_all(query)
+async def get_extension_settings(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    extension_uuid: Optional[UUID] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_extension_settings")
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, ExtensionSetting)
+    rows, next_cursor = await fetch_page(
+        EXTENSION_SETTING_KEYSET, page, {"extension_uuid": extension_uuid}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(ExtensionSetting, columns), next_cursor, etag)
 
 @router.get("/extension-settings/extension/{extension_uuid}", response_model=List[ExtensionSetting])
 async def get_extension_settings_by_extension(extension_uuid: UUID):
-    query = "SELECT * FROM v_extension_settings WHERE extension_uuid = $1 ORDER BY extension_setting_name"
-    return await baseDB.fetch_all(query, str(extension_uuid))
+    return await baseDB.fetch_all_prepared("extension_settings.by_extension", str(extension_uuid))
 
 @router.post("/extension-settings", response_model=ExtensionSetting)
 async def create_extension_setting(setting: ExtensionSettingCreate):
     setting_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_extension_settings (
-            extension_setting_uuid, extension_uuid, extension_setting_type,
-            extension_setting_name, extension_setting_value, extension_setting_enabled
-        )
-        VALUES ($1, $2, $3, $4, $5, $6)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(
-        query, setting_uuid, str(setting.extension_uuid), setting.extension_setting_type,
+    result = await baseDB.fetch_one_prepared(
+        "extension_settings.insert", setting_uuid, str(setting.extension_uuid), setting.extension_setting_type,
         setting.extension_setting_name, setting.extension_setting_value, setting.extension_setting_enabled
     )
     return result
 
 @router.put("/extension-settings/{setting_uuid}", response_model=ExtensionSetting)
 async def update_extension_setting(setting_uuid: UUID, setting: ExtensionSettingUpdate):
-    existing = await baseDB.fetch_one(
-        "SELECT * FROM v_extension_settings WHERE extension_setting_uuid = $1", 
-        str(setting_uuid)
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Extension setting not found")
-    
     update_data = setting.dict(exclude_unset=True)
-    if not update_data:
-        return existing
-    
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_extension_settings SET {set_clause} WHERE extension_setting_uuid = $1 RETURNING *"
-    values = [str(setting_uuid)] + list(update_data.values())
-    
-    result = await baseDB.fetch_one(query, *values)
+    if update_data:
+        result = await baseDB.update_row(
+            "v_extension_settings", "extension_setting_uuid", str(setting_uuid), update_data
+        )
+    else:
+        result = await baseDB.fetch_one_prepared("extension_settings.get", str(setting_uuid))
+    if not result:
+        raise HTTPException(status_code=404, detail="Extension setting not found")
     return result
 
 @router.delete("/extension-settings/{setting_uuid}")
 async def delete_extension_setting(setting_uuid: UUID):
-    query = "DELETE FROM v_extension_settings WHERE extension_setting_uuid = $1"
-    result = await baseDB.execute(query, str(setting_uuid))
+    result = await baseDB.execute_prepared("extension_settings.delete", str(setting_uuid))
     if result == 0:
         raise HTTPException(status_code=404, detail="Extension setting not found")
     return {"message": "Extension setting deleted successfully"}
 
 # Voicemail endpoints
 @router.get("/voicemails", response_model=List[Voicemail])
-async def get_voicemails():
-    query = "SELECT * FROM v_voicemails ORDER BY voicemail_id"
-    return await baseDB.fetch_all(query)
+async def get_voicemails(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    domain_uuid: Optional[UUID] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_voicemails", domain_uuid)
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, Voicemail)
+    rows, next_cursor = await fetch_page(
+        VOICEMAIL_KEYSET, page, {"domain_uuid": domain_uuid}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(Voicemail, columns), next_cursor, etag)
 
 @router.get("/voicemails/{voicemail_uuid}", response_model=Voicemail)
-async def get_voicemail(voicemail_uuid: UUID):
-    query = "SELECT * FROM v_voicemails WHERE voicemail_uuid = $1"
-    voicemail = await baseDB.fetch_one(query, str(voicemail_uuid))
+async def get_voicemail(voicemail_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Voicemail)
+    voicemail = await baseDB.fetch_one_columns("voicemails.get", "v_voicemails", "voicemail_uuid", str(voicemail_uuid), columns)
     if not voicemail:
         raise HTTPException(status_code=404, detail="Voicemail not found")
-    return voicemail
+    return row_response(voicemail, projected_model(Voicemail, columns)) if columns else voicemail
 
 @router.post("/voicemails", response_model=Voicemail)
 async def create_voicemail(voicemail: VoicemailCreate):
     voicemail_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_voicemails (
-            voicemail_uuid, domain_uuid, voicemail_id, voicemail_enabled,
-            voicemail_password, voicemail_attach_file, voicemail_local_after_email,
-            voicemail_mail_to
-        )
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(
-        query, voicemail_uuid, str(voicemail.domain_uuid), voicemail.voicemail_id,
+    result = await baseDB.fetch_one_prepared(
+        "voicemails.insert", voicemail_uuid, str(voicemail.domain_uuid), voicemail.voicemail_id,
         voicemail.voicemail_enabled, voicemail.voicemail_password,
         voicemail.voicemail_attach_file, voicemail.voicemail_local_after_email,
         voicemail.voicemail_mail_to
@@ -430,97 +761,366 @@ async def create_voicemail(voicemail: VoicemailCreate):
 
 @router.put("/voicemails/{voicemail_uuid}", response_model=Voicemail)
 async def update_voicemail(voicemail_uuid: UUID, voicemail: VoicemailUpdate):
-    existing = await baseDB.fetch_one("SELECT * FROM v_voicemails WHERE voicemail_uuid = $1", str(voicemail_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Voicemail not found")
-    
     update_data = voicemail.dict(exclude_unset=True)
-    if not update_data:
-        return existing
-    
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_voicemails SET {set_clause} WHERE voicemail_uuid = $1 RETURNING *"
-    values = [str(voicemail_uuid)] + list(update_data.values())
-    
-    result = await baseDB.fetch_one(query, *values)
+    if update_data:
+        result = await baseDB.update_row("v_voicemails", "voicemail_uuid", str(voicemail_uuid), update_data)
+    else:
+        result = await baseDB.fetch_one_prepared("voicemails.get", str(voicemail_uuid))
+    if not result:
+        raise HTTPException(status_code=404, detail="Voicemail not found")
     return result
 
 @router.delete("/voicemails/{voicemail_uuid}")
 async def delete_voicemail(voicemail_uuid: UUID):
-    query = "DELETE FROM v_voicemails WHERE voicemail_uuid = $1"
-    result = await baseDB.execute(query, str(voicemail_uuid))
+    result = await baseDB.execute_prepared("voicemails.delete", str(voicemail_uuid))
     if result == 0:
         raise HTTPException(status_code=404, detail="Voicemail not found")
     return {"message": "Voicemail deleted successfully"}
 
+# Default Settings endpoints
+def default_setting_key(setting) -> Tuple[str, str, str]:
+    """(category, subcategory, name) key a default setting row is resolved by"""
+    return (
+        setting["default_setting_category"], setting["default_setting_subcategory"], setting["default_setting_name"]
+    )
+
+@router.get("/default-settings", response_model=List[DefaultSetting])
+async def get_default_settings(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    default_setting_category: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_default_settings")
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, DefaultSetting)
+    rows, next_cursor = await fetch_page(
+        DEFAULT_SETTING_KEYSET, page, {"default_setting_category": default_setting_category}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(DefaultSetting, columns), next_cursor, etag)
+
+@router.get("/default-settings/{setting_uuid}", response_model=DefaultSetting)
+async def get_default_setting(setting_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, DefaultSetting)
+    setting = await baseDB.fetch_one_columns("default_settings.get", "v_default_settings", "default_setting_uuid", str(setting_uuid), columns)
+    if not setting:
+        raise HTTPException(status_code=404, detail="Default setting not found")
+    return row_response(setting, projected_model(DefaultSetting, columns)) if columns else setting
+
+@router.post("/default-settings", response_model=DefaultSetting)
+async def create_default_setting(setting: DefaultSettingCreate):
+    setting_uuid = str(uuid.uuid4())
+    result = await baseDB.fetch_one_prepared(
+        "default_settings.insert", setting_uuid, setting.default_setting_category,
+        setting.default_setting_subcategory, setting.default_setting_name,
+        setting.default_setting_value, setting.default_setting_enabled
+    )
+    
+    await refresh_default_settings([default_setting_key(result)])
+    
+    return result
+
+@router.put("/default-settings/{setting_uuid}", response_model=DefaultSetting)
+async def update_default_setting(setting_uuid: UUID, setting: DefaultSettingUpdate):
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("default_settings.get_for_update", str(setting_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Default setting not found")
+        
+        update_data = setting.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        result = await tx.update_row("v_default_settings", "default_setting_uuid", str(setting_uuid), update_data)
+    
+    # The key of the old and new version, in case the setting was renamed
+    await refresh_default_settings([default_setting_key(existing), default_setting_key(result)])
+    
+    return result
+
+@router.delete("/default-settings/{setting_uuid}")
+async def delete_default_setting(setting_uuid: UUID):
+    result = await baseDB.fetch_one_prepared("default_settings.delete", str(setting_uuid))
+    if not result:
+        raise HTTPException(status_code=404, detail="Default setting not found")
+    
+    await refresh_default_settings([default_setting_key(result)])
+    
+    return {"message": "Default setting deleted successfully"}
+
+@router.get("/settings/resolve")
+async def resolve_setting(
+    category: str,
+    subcategory: str,
+    name: str,
+    domain_uuid: Optional[UUID] = None,
+    user_uuid: Optional[UUID] = None,
+):
+    """Resolve a setting with user > domain > default precedence like lazy_settings.lua"""
+    value, version = await settings_engine.resolve(
+        (category, subcategory, name),
+        str(domain_uuid) if domain_uuid else None,
+        str(user_uuid) if user_uuid else None,
+    )
+    return {"category": category, "subcategory": subcategory, "name": name, "value": value, "version": version}
+
 # Dialplan endpoints
 @router.get("/dialplans", response_model=List[Dialplan])
-async def get_dialplans():
-    query = "SELECT * FROM v_dialplans ORDER BY dialplan_order, dialplan_name"
-    return await baseDB.fetch_all(query)
+async def get_dialplans(request: Request, response: Response):
+    etag, not_modified = await conditional_get(request, "v_dialplans")
+    if not_modified:
+        return not_modified
+    if etag:
+        response.headers.update(validator_headers(etag))
+    return await baseDB.fetch_all_prepared("dialplans.list")
 
 @router.get("/dialplans/{dialplan_uuid}", response_model=Dialplan)
-async def get_dialplan(dialplan_uuid: UUID):
-    query = "SELECT * FROM v_dialplans WHERE dialplan_uuid = $1"
-    dialplan = await baseDB.fetch_one(query, str(dialplan_uuid))
+async def get_dialplan(dialplan_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Dialplan)
+    dialplan = await baseDB.fetch_one_columns("dialplans.get", "v_dialplans", "dialplan_uuid", str(dialplan_uuid), columns)
     if not dialplan:
         raise HTTPException(status_code=404, detail="Dialplan not found")
-    return dialplan
+    return row_response(dialplan, projected_model(Dialplan, columns)) if columns else dialplan
+
+async def collect_dialplan_cache_keys(db, dialplans) -> Tuple[List[str], List[str]]:
+    """Cache keys and patterns of the versions of a dialplan, before and after a write"""
+    keys, patterns = {}, {}
+    for dialplan in dialplans:
+        if dialplan:
+            dialplan_keys, dialplan_patterns = await dialplan_cache_keys(db, dialplan)
+            keys.update(dict.fromkeys(dialplan_keys))
+            patterns.update(dict.fromkeys(dialplan_patterns))
+    return list(keys), list(patterns)
+
+async def invalidate_dialplans(keys: List[str], patterns: List[str]):
+    """Invalidate the keys of a dialplan write, then re-render its contexts when enabled"""
+    await invalidate_dialplan_cache(keys, patterns)
+    warm_dialplan_contexts(keys)
 
 @router.post("/dialplans", response_model=Dialplan)
 async def create_dialplan(dialplan: DialplanCreate):
     dialplan_uuid = str(uuid.uuid4())
-    query = """
-        INSERT INTO v_dialplans (
-            dialplan_uuid, domain_uuid, dialplan_name, dialplan_context,
-            dialplan_xml, dialplan_enabled, dialplan_order
-        )
-        VALUES ($1, $2, $3, $4, $5, $6, $7)
-        RETURNING *
-    """
-    result = await baseDB.fetch_one(
-        query, dialplan_uuid, 
+    result = await baseDB.fetch_one_prepared(
+        "dialplans.insert", dialplan_uuid, 
         str(dialplan.domain_uuid) if dialplan.domain_uuid else None,
         dialplan.dialplan_name, dialplan.dialplan_context, dialplan.dialplan_xml,
         dialplan.dialplan_enabled, dialplan.dialplan_order
     )
+    
+    await invalidate_dialplans(*await collect_dialplan_cache_keys(baseDB, [result]))
+    
     return result
 
 @router.put("/dialplans/{dialplan_uuid}", response_model=Dialplan)
 async def update_dialplan(dialplan_uuid: UUID, dialplan: DialplanUpdate):
-    existing = await baseDB.fetch_one("SELECT * FROM v_dialplans WHERE dialplan_uuid = $1", str(dialplan_uuid))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Dialplan not found")
-    
-    update_data = dialplan.dict(exclude_unset=True)
-    if not update_data:
-        return existing
+    # Lock the dialplan for the read-modify-write, the cache is invalidated after commit
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("dialplans.get_for_update", str(dialplan_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Dialplan not found")
+        
+        update_data = dialplan.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        result = await tx.update_row("v_dialplans", "dialplan_uuid", str(dialplan_uuid), update_data)
+        # The contexts of the old and new version, in case the context moved
+        keys, patterns = await collect_dialplan_cache_keys(tx, [existing, result])
     
-    set_clause = ", ".join([f"{key} = ${i+2}" for i, key in enumerate(update_data.keys())])
-    query = f"UPDATE v_dialplans SET {set_clause} WHERE dialplan_uuid = $1 RETURNING *"
-    values = [str(dialplan_uuid)] + list(update_data.values())
+    await invalidate_dialplans(keys, patterns)
     
-    result = await baseDB.fetch_one(query, *values)
     return result
 
 @router.delete("/dialplans/{dialplan_uuid}")
 async def delete_dialplan(dialplan_uuid: UUID):
-    query = "DELETE FROM v_dialplans WHERE dialplan_uuid = $1"
-    result = await baseDB.execute(query, str(dialplan_uuid))
-    if result == 0:
-        raise HTTPException(status_code=404, detail="Dialplan not found")
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("dialplans.get_for_update", str(dialplan_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Dialplan not found")
+        
+        # Enumerate the destination keys before the row is gone
+        keys, patterns = await collect_dialplan_cache_keys(tx, [existing])
+        await tx.execute_prepared("dialplans.delete", str(dialplan_uuid))
+    
+    await invalidate_dialplans(keys, patterns)
+    
     return {"message": "Dialplan deleted successfully"}
 
+# Destination endpoints
+@router.get("/destinations", response_model=List[Destination])
+async def get_destinations(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    domain_uuid: Optional[UUID] = None,
+    fields: Optional[str] = None,
+):
+    etag, not_modified = await conditional_get(request, "v_destinations", domain_uuid)
+    if not_modified:
+        return not_modified
+    columns = parse_fields(fields, Destination)
+    rows, next_cursor = await fetch_page(
+        DESTINATION_KEYSET, page, {"domain_uuid": domain_uuid}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(Destination, columns), next_cursor, etag)
+
+@router.get("/destinations/lookup", response_model=List[Destination])
+async def lookup_destination(destination_number: str):
+    """Resolve a dialed number to its destinations like the single mode public dialplan"""
+    return await baseDB.fetch_all_prepared("destinations.lookup", destination_number)
+
+@router.post("/destinations/numbers/rebuild")
+async def rebuild_destination_numbers():
+    """Rebuild v_destination_numbers from every destination, for rows written outside the API"""
+    async with baseDB.transaction() as tx:
+        await tx.execute("DELETE FROM v_destination_numbers")
+        numbers = await tx.execute(DESTINATION_NUMBERS_INSERT)
+    
+    # Every single mode key may have changed
+    await invalidate_dialplan_cache([], ["dialplan:*public*:*"])
+    
+    return {"numbers": numbers}
+
+@router.get("/destinations/{destination_uuid}", response_model=Destination)
+async def get_destination(destination_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Destination)
+    destination = await baseDB.fetch_one_columns("destinations.get", "v_destinations", "destination_uuid", str(destination_uuid), columns)
+    if not destination:
+        raise HTTPException(status_code=404, detail="Destination not found")
+    return row_response(destination, projected_model(Destination, columns)) if columns else destination
+
+@router.post("/destinations", response_model=Destination)
+async def create_destination(destination: DestinationCreate):
+    destination_uuid = str(uuid.uuid4())
+    async with baseDB.transaction() as tx:
+        result = await tx.fetch_one_prepared(
+            "destinations.insert", destination_uuid,
+            str(destination.domain_uuid) if destination.domain_uuid else None,
+            destination.destination_prefix, destination.destination_trunk_prefix,
+            destination.destination_area_code, destination.destination_number,
+            str(destination.dialplan_uuid) if destination.dialplan_uuid else None,
+        )
+        await tx.execute_prepared("destination_numbers.sync", destination_uuid)
+        keys = await destination_cache_keys(tx, destination_uuid)
+    
+    # A number may have been cached as not found
+    await invalidate_dialplan_cache(keys)
+    
+    return result
+
+@router.put("/destinations/{destination_uuid}", response_model=Destination)
+async def update_destination(destination_uuid: UUID, destination: DestinationUpdate):
+    # Lock the destination while its numbers are rebuilt, the cache is invalidated after commit
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("destinations.get_for_update", str(destination_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Destination not found")
+        
+        update_data = destination.dict(exclude_unset=True)
+        if not update_data:
+            return existing
+        
+        for key in update_data:
+            if 'uuid' in key and update_data[key]:
+                update_data[key] = str(update_data[key])
+        
+        # The keys of the old and the new numbers
+        keys = await destination_cache_keys(tx, str(destination_uuid))
+        result = await tx.update_row("v_destinations", "destination_uuid", str(destination_uuid), update_data)
+        await tx.execute_prepared("destination_numbers.delete", str(destination_uuid))
+        await tx.execute_prepared("destination_numbers.sync", str(destination_uuid))
+        keys += await destination_cache_keys(tx, str(destination_uuid))
+    
+    await invalidate_dialplan_cache(keys)
+    
+    return result
+
+@router.delete("/destinations/{destination_uuid}")
+async def delete_destination(destination_uuid: UUID):
+    async with baseDB.transaction() as tx:
+        existing = await tx.fetch_one_prepared("destinations.get_for_update", str(destination_uuid))
+        if not existing:
+            raise HTTPException(status_code=404, detail="Destination not found")
+        
+        # Enumerate the keys before the delete cascades to the numbers
+        keys = await destination_cache_keys(tx, str(destination_uuid))
+        await tx.execute_prepared("destinations.delete", str(destination_uuid))
+    
+    await invalidate_dialplan_cache(keys)
+    
+    return {"message": "Destination deleted successfully"}
+
+# Search endpoint
+# Response model of each search target
+SEARCH_MODELS = {"extensions": Extension, "users": User, "contacts": Contact}
+
+@router.get("/search", response_model=SearchResults)
+async def search_directory(
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_LENGTH),
+    domain_uuid: Optional[UUID] = None,
+    types: Optional[str] = None,
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """
+    Typeahead search of extensions (number, alias, directory name, caller ID), users
+    and contacts, exact matches first, then word prefix matches, then substrings.
+    types is a comma separated subset of extensions, users and contacts.
+    """
+    names = [name.strip() for name in types.split(",") if name.strip()] if types else list(SEARCH_TARGETS)
+    unknown = [name for name in names if name not in SEARCH_TARGETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {', '.join(unknown)}")
+    targets = [SEARCH_TARGETS[name] for name in dict.fromkeys(names)]
+    results = await search(q, targets, str(domain_uuid) if domain_uuid else None, limit)
+    content = {name: project_rows(rows, SEARCH_MODELS[name]) for name, rows in results.items()}
+    return Response(content=dumps(content), media_type="application/json")
+
 # Registrations (read-only)
+# Written by the switches at registration rate, so they carry no change version and no ETag
 @router.get("/registrations", response_model=List[Registration])
-async def get_registrations():
-    query = "SELECT * FROM registrations ORDER BY reg_user, realm"
-    return await baseDB.fetch_all(query)
+async def get_registrations(
+    page: PageParams = Depends(page_params),
+    realm: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    columns = parse_fields(fields, Registration)
+    rows, next_cursor = await fetch_page(
+        REGISTRATION_KEYSET, page, {"realm": realm}, records=True, columns=columns
+    )
+    return rows_response(rows, projected_model(Registration, columns), next_cursor)
+
+@router.get("/registrations/export")
+async def export_registrations(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    realm: Optional[str] = None,
+):
+    columns = list(Registration.model_fields.keys())
+    query = f"SELECT {', '.join(columns)} FROM registrations"
+    args = []
+    if realm:
+        query += " WHERE realm = $1"
+        args.append(realm)
+    query += " ORDER BY reg_user, realm, reg_uuid"
+    return export_response(baseDB.stream(query, *args), columns, format, "registrations")
+
+@router.get("/registrations/locate")
+async def locate_registration(reg_user: str, realm: str):
+    """Switch hostname a user is registered on, for fs_path load balancing"""
+    locator = get_locator()
+    if locator is not None:
+        registration = await locator.locate(reg_user, realm)
+        if registration is not None:
+            return {"reg_user": reg_user, "realm": realm, "hostname": registration.hostname, "expires": registration.expires}
+    else:
+        row = await baseDB.fetch_one_prepared("registrations.locate", reg_user, realm, int(time.time()))
+        if row:
+            return {"reg_user": reg_user, "realm": realm, "hostname": row["hostname"], "expires": row["expires"]}
+    raise HTTPException(status_code=404, detail="Registration not found")
 
 @router.get("/registrations/{reg_uuid}", response_model=Registration)
-async def get_registration(reg_uuid: UUID):
-    query = "SELECT * FROM registrations WHERE reg_uuid = $1"
-    registration = await baseDB.fetch_one(query, str(reg_uuid))
+async def get_registration(reg_uuid: UUID, fields: Optional[str] = None):
+    columns = parse_fields(fields, Registration)
+    registration = await baseDB.fetch_one_columns("registrations.get", "registrations", "reg_uuid", str(reg_uuid), columns)
     if not registration:
         raise HTTPException(status_code=404, detail="Registration not found")
-    return registration
\ No newline at end of file
+    return row_response(registration, projected_model(Registration, columns)) if columns else registration
\ No newline at end of file
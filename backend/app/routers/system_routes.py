@@ -0,0 +1,102 @@
+from fastapi import APIRouter, HTTPException
+from app.database import baseDB
+from app.utils.auth_cache import get_principal_cache, token_revocations
+from app.utils.cache import get_cache
+from app.utils.cache_publisher import get_publisher
+from app.utils.call_groups import call_group_index
+from app.utils.directory_warmer import get_warmer
+from app.utils.invalidation_queue import get_invalidation_queue
+from app.utils.password_pool import get_password_pool
+from app.utils.registration_locator import get_locator
+from app.utils.settings import settings_engine, schedule_populate
+from app.utils.table_versions import get_table_versions
+
+router = APIRouter(prefix="/api/system", tags=["System"])
+
+
+@router.get("/statements")
+async def get_statement_stats():
+    """Named statement registry and per-statement execution counts"""
+    return baseDB.statement_stats()
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Cache method and, for the memory method, size and eviction counters"""
+    return await get_cache().stats()
+
+
+@router.get("/cache/publisher")
+async def get_cache_publisher_stats():
+    """Cache invalidation fan-out counters, null when no publisher is configured"""
+    publisher = get_publisher()
+    return publisher.stats() if publisher is not None else None
+
+
+@router.post("/cache/warm")
+async def warm_directory_cache(domain_name: str):
+    """Queue the directory XML of every extension of a domain for rendering into the cache"""
+    warmer = get_warmer()
+    if warmer is None:
+        raise HTTPException(status_code=409, detail="Directory warm-up is disabled")
+    return {"domain_name": domain_name, "queued": warmer.warm_domain(domain_name)}
+
+
+@router.get("/cache/warm")
+async def get_warmer_stats():
+    """Directory warm-up queue and counters, null when warm-up is disabled"""
+    warmer = get_warmer()
+    return warmer.stats() if warmer is not None else None
+
+
+@router.get("/cache/invalidations")
+async def get_invalidation_queue_stats():
+    """Invalidation queue depth and counters, null when invalidations are synchronous"""
+    queue = get_invalidation_queue()
+    return queue.stats() if queue is not None else None
+
+
+@router.get("/call-groups")
+async def get_call_group_stats():
+    """Call group index size and load/update counters"""
+    return call_group_index.stats()
+
+
+@router.get("/settings")
+async def get_settings_stats():
+    """Settings snapshot version, layer sizes and counters"""
+    return settings_engine.stats()
+
+
+@router.post("/settings/reload")
+async def reload_settings():
+    """Reload every settings layer, for settings written outside the API, and re-populate the cache when enabled"""
+    snapshot = await settings_engine.load()
+    schedule_populate()
+    return {"version": snapshot.version}
+
+
+@router.get("/registrations")
+async def get_registration_locator_stats():
+    """Registration locator size and hit/miss counters, null when it is disabled"""
+    locator = get_locator()
+    return locator.stats() if locator is not None else None
+
+
+@router.get("/password-hashing")
+async def get_password_pool_stats():
+    """Password hashing pool occupancy, queue times and run times in seconds"""
+    return get_password_pool().stats()
+
+
+@router.get("/auth")
+async def get_auth_cache_stats():
+    """Principal cache size and hit counters, and the number of revoked tokens"""
+    return {"principals": get_principal_cache().stats(), **token_revocations.stats()}
+
+
+@router.get("/versions")
+async def get_table_version_stats():
+    """Table change versions behind the list ETags and the 304 counters, null when conditional GETs are disabled"""
+    versions = get_table_versions()
+    return await versions.stats() if versions is not None else None
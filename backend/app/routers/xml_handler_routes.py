@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Request, Response
+from app.utils.auth_utils import verify_xml_curl_client
+from app.utils.call_groups import get_call_groups_xml
+from app.utils.directory_xml import get_directory_user_xml
+from app.utils.xml import NOT_FOUND_XML
+
+router = APIRouter(
+    prefix="/api/xml_handler", tags=["XML Handler"], dependencies=[Depends(verify_xml_curl_client)]
+)
+
+# Directory actions answered by scripts/action/*.lua, left to the Lua handler
+LUA_ONLY_ACTIONS = {"message-count", "reverse-auth-lookup"}
+LUA_ONLY_FUNCTIONS = {"switch_xml_locate_domain", "switch_load_network_lists"}
+
+
+def xml_response(xml_string: str) -> Response:
+    return Response(content=xml_string, media_type="text/xml")
+
+
+def get_domain_name(params) -> str:
+    """Resolve the domain name from the request params like xml_handler/index.lua"""
+    return (
+        params.get("domain")
+        or params.get("domain_name")
+        or params.get("variable_domain_name")
+        or params.get("variable_sip_from_host")
+    )
+
+
+@router.post("/directory")
+async def directory(request: Request):
+    """
+    mod_xml_curl binding for the directory section
+
+    Answers the sip_auth, user_call and group_call lookups. Every other directory request
+    gets a "not found" result so FreeSWITCH falls through to the next binding (the Lua handler).
+    """
+    params = await request.form()
+
+    if params.get("section", "directory") != "directory":
+        return xml_response(NOT_FOUND_XML)
+
+    action = params.get("action")
+    purpose = params.get("purpose")
+    event_calling_function = params.get("Event-Calling-Function")
+    if (
+        purpose == "gateways"
+        or action in LUA_ONLY_ACTIONS
+        or event_calling_function in LUA_ONLY_FUNCTIONS
+        or (event_calling_function == "populate_database" and params.get("Event-Calling-File") == "mod_directory.c")
+    ):
+        return xml_response(NOT_FOUND_XML)
+
+    domain_name = get_domain_name(params)
+    if action == "group_call":
+        xml_string = await get_call_groups_xml(domain_name) if domain_name else None
+        return xml_response(xml_string or NOT_FOUND_XML)
+
+    user = params.get("user") or ""
+    if not domain_name or user in ("", "*97"):
+        return xml_response(NOT_FOUND_XML)
+
+    xml_string = await get_directory_user_xml(
+        domain_name=domain_name,
+        user=user,
+        from_user=params.get("sip_from_user") or None,
+        sip_auth_method=params.get("sip_auth_method"),
+        dialed_extension=params.get("dialed_extension"),
+        local_hostname=params.get("FreeSWITCH-Switchname") or params.get("hostname"),
+    )
+    return xml_response(xml_string or NOT_FOUND_XML)
@@ -0,0 +1,141 @@
+"""
+Authentication caches
+The principal cache keeps the user row a token resolves to for a short time, so the
+routes guarded by verify_token do not join v_users, v_domains, v_extension_users and
+v_extensions on every request. Token revocations make /auth/logout effective on
+every worker.
+"""
+import time
+import heapq
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.database import baseDB
+from app.utils.cache import MemoryStore
+
+logger = logging.getLogger(__name__)
+
+# Columns of the auth query never kept in memory
+SECRET_COLUMNS = ("password", "salt")
+
+baseDB.register("token_revocations.insert", """
+    INSERT INTO v_revoked_tokens (jti, user_uuid, expires) VALUES ($1, $2, $3)
+    ON CONFLICT (jti) DO NOTHING
+""")
+baseDB.register("token_revocations.get", "SELECT 1 FROM v_revoked_tokens WHERE jti = $1 AND expires > $2")
+baseDB.register("token_revocations.purge", "DELETE FROM v_revoked_tokens WHERE expires <= $1")
+
+
+class PrincipalCache:
+    """
+    User rows by (user_uuid, token jti), dropped after ttl seconds
+
+    Entries of a user are dropped at once by invalidate_user() when the user or its
+    password changes. Other workers only see that change once their entry expires.
+    """
+
+    def __init__(self, ttl: float = 30, max_entries: int = 10000):
+        self.ttl = ttl
+        self.store = MemoryStore(max_entries=max_entries, max_bytes=16 * 1024 * 1024, on_remove=self._forget)
+        # user_uuid -> keys of its cached tokens
+        self._users: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def _key(user_uuid: str, jti: str) -> str:
+        return f"{user_uuid}:{jti}"
+
+    def _forget(self, key: str):
+        user_uuid = key.split(":", 1)[0]
+        keys = self._users.get(user_uuid)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._users[user_uuid]
+
+    def get(self, user_uuid: str, jti: str) -> Optional[Dict[str, Any]]:
+        if self.ttl <= 0:
+            return None
+        return self.store.get(self._key(user_uuid, jti))
+
+    def set(self, user_uuid: str, jti: str, record) -> Dict[str, Any]:
+        """Cache a user row without its password columns and return it"""
+        principal = {column: value for column, value in dict(record).items() if column not in SECRET_COLUMNS}
+        if self.ttl > 0:
+            key = self._key(user_uuid, jti)
+            if self.store.set(key, principal, self.ttl):
+                self._users.setdefault(user_uuid, set()).add(key)
+        return principal
+
+    def invalidate_user(self, user_uuid: str):
+        """Drop every cached token of a user"""
+        for key in self._users.pop(user_uuid, set()):
+            self.store.delete(key)
+
+    def invalidate_token(self, user_uuid: str, jti: str):
+        self.store.delete(self._key(user_uuid, jti))
+
+    def stats(self) -> dict:
+        return {"ttl": self.ttl, "users": len(self._users), **self.store.stats()}
+
+
+class TokenRevocations:
+    """
+    jti of the tokens logged out before they expire
+
+    Revocations are stored in v_revoked_tokens, so every worker and restart sees them,
+    and checked on every authenticated request, cached principal or not. Revocations
+    made by this worker are also kept in memory and rejected without the lookup.
+    Rows are kept until their token expires, after which the exp claim rejects it.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+        self.stats_counters = {"revoked": 0, "checks": 0, "rejected": 0}
+
+    def _expire(self, now: int):
+        while self._heap and self._heap[0][0] <= now:
+            _, jti = heapq.heappop(self._heap)
+            self._revoked.pop(jti, None)
+
+    async def revoke(self, jti: str, user_uuid: str, expires: int):
+        now = int(time.time())
+        if not jti or expires <= now:
+            return
+        await baseDB.execute_prepared("token_revocations.insert", jti, user_uuid, expires)
+        await baseDB.execute_prepared("token_revocations.purge", now)
+        self._revoked[jti] = expires
+        heapq.heappush(self._heap, (expires, jti))
+        self.stats_counters["revoked"] += 1
+
+    async def is_revoked(self, jti: str) -> bool:
+        """Revoked by any worker, tokens without a jti cannot be revoked"""
+        if not jti:
+            return False
+        now = int(time.time())
+        self._expire(now)
+        self.stats_counters["checks"] += 1
+        if jti in self._revoked or await baseDB.fetch_one_prepared("token_revocations.get", jti, now):
+            self.stats_counters["rejected"] += 1
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {"revoked_here": len(self._revoked), **self.stats_counters}
+
+
+# Global authentication caches
+principal_cache = PrincipalCache()
+token_revocations = TokenRevocations()
+
+
+def init_auth_cache(ttl: float = 30, max_entries: int = 10000) -> PrincipalCache:
+    """Initialize the principal cache, a ttl of 0 disables it"""
+    global principal_cache
+    principal_cache = PrincipalCache(ttl, max_entries)
+    return principal_cache
+
+
+def get_principal_cache() -> PrincipalCache:
+    """Get global principal cache instance"""
+    return principal_cache
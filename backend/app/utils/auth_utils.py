@@ -1,17 +1,24 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
+import ipaddress
 import jwt
 import bcrypt
 import secrets
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import uuid
+from fastapi import HTTPException, Request, status, Depends
+from fastapi.security import HTTPBasic, HTTPBasicCredentials, HTTPBearer, HTTPAuthorizationCredentials
 import os
+from app.db.auth_db import db
+from app.utils.auth_cache import get_principal_cache, token_revocations
+from app.utils.password_pool import get_password_pool
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 
 security = HTTPBearer()
+xml_curl_security = HTTPBasic(auto_error=False)
 
 def hash_password(password: str) -> tuple[str, str]:
     """Hash a password with a salt and return both hash and salt"""
@@ -28,37 +35,110 @@ def verify_password(plain_password: str, hashed_password: str, salt: str = None)
         # If salt is included in the hash (bcrypt format)
         return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+async def hash_password_async(password: str) -> tuple[str, str]:
+    """hash_password on the password pool, off the event loop"""
+    return await get_password_pool().run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str, salt: str = None) -> bool:
+    """verify_password on the password pool, off the event loop"""
+    return await get_password_pool().run(verify_password, plain_password, hashed_password, salt)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create a JWT access token"""
+    """Create a JWT access token, with a jti claim identifying it for revocation"""
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
+        expire = now + timedelta(minutes=15)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify JWT token"""
+def credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Decode a JWT and reject it when it was revoked"""
     token = credentials.credentials
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_uuid: str = payload.get("sub")
-        if user_uuid is None:
+    except jwt.PyJWTError:
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    # Tokens issued before the jti claim cannot be revoked
+    payload.setdefault("jti", "")
+    # Checked before the principal cache, which would accept the token until its ttl
+    if await token_revocations.is_revoked(payload["jti"]):
+        raise credentials_exception("Token has been revoked")
+    return payload
+
+async def get_current_principal(payload: dict = Depends(get_token_payload)) -> dict:
+    """
+    Resolve a token to its enabled user, from the principal cache when possible
+
+    Revoked tokens are rejected by get_token_payload() before the cache is consulted.
+    """
+    user_uuid, jti = payload["sub"], payload["jti"]
+    principal_cache = get_principal_cache()
+    principal = principal_cache.get(user_uuid, jti)
+    if principal is not None:
+        return principal
+    
+    try:
+        user_record = await db.get_user_by_uuid(uuid.UUID(user_uuid))
+    except ValueError:
+        raise credentials_exception()
+    if not user_record:
+        raise credentials_exception()
+    return principal_cache.set(user_uuid, jti, user_record)
+
+async def verify_token(principal: dict = Depends(get_current_principal)) -> str:
+    """Verify JWT token and return the uuid of its user"""
+    return str(principal["user_uuid"])
+
+@lru_cache(maxsize=8)
+def parse_networks(value: str) -> tuple:
+    """Networks of a comma-separated list of addresses and CIDR ranges"""
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip())
+
+async def verify_xml_curl_client(
+    request: Request, credentials: Optional[HTTPBasicCredentials] = Depends(xml_curl_security)
+) -> None:
+    """
+    Admit only mod_xml_curl to the XML handler, whose answers carry SIP passwords
+
+    The client address must be in XML_HANDLER_ALLOWED_IPS (localhost by default, empty
+    allows any address). When XML_HANDLER_USERNAME is set, the binding must also send
+    XML_HANDLER_USERNAME:XML_HANDLER_PASSWORD as its gateway-credentials.
+    """
+    networks = parse_networks(os.getenv("XML_HANDLER_ALLOWED_IPS", "127.0.0.1,::1"))
+    if networks:
+        try:
+            address = ipaddress.ip_address(request.client.host if request.client else "")
+        except ValueError:
+            address = None
+        if address is None or not any(address in network for network in networks):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Client not allowed")
+    username = os.getenv("XML_HANDLER_USERNAME", "")
+    if username:
+        password = os.getenv("XML_HANDLER_PASSWORD", "")
+        if not (
+            credentials
+            and secrets.compare_digest(credentials.username.encode(), username.encode())
+            and secrets.compare_digest(credentials.password.encode(), password.encode())
+        ):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
+                detail="Invalid credentials",
+                headers={"WWW-Authenticate": "Basic"},
             )
-        return user_uuid
-    except jwt.PyJWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
 
 def generate_api_key() -> str:
     """Generate a random API key"""
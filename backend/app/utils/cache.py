@@ -5,32 +5,283 @@ Provides abstracted cache functionality with file and memory methods
 import os
 import json
 import glob
+import time
+import uuid
+import fnmatch
 import asyncio
-from typing import Any, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 import logging
 
+from app.utils.cache_publisher import get_publisher
+from app.utils.invalidation_queue import get_invalidation_queue
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed for the redis method
+    aioredis = None
+
 logger = logging.getLogger(__name__)
 
+# Keys per DEL command and per SCAN page for the redis method
+REDIS_BATCH_SIZE = 500
+
+# Expire times in seconds per cache area, defaults mirror expire[] in scripts/functions/config.lua
+EXPIRE_DEFAULTS = {
+    "default": 3600,
+    "directory": 3600,
+    "dialplan": 3600,
+    "settings": 3600,
+}
+
+
+def get_expire(area: str = "default") -> int:
+    """Expire time of a cache area, overridable with CACHE_EXPIRE_<AREA>"""
+    default = EXPIRE_DEFAULTS.get(area, EXPIRE_DEFAULTS["default"])
+    return int(os.getenv(f"CACHE_EXPIRE_{area.upper()}", default))
+
+
+# Redis set of the keys cached for a domain, see Cache.delete_domain()
+REDIS_DOMAIN_INDEX = "cache-index:domain:"
+
+
+def key_domain(key: str) -> Optional[str]:
+    """
+    Domain a cache key belongs to: the part after the last @ of keys like
+    directory:1001@example.com, the second part of keys like domain:example.com:...
+    and setting:example.com:... or the domain of the directory:groups:example.com call groups
+    """
+    if "@" in key:
+        return key.rsplit("@", 1)[1] or None
+    if key.startswith("directory:groups:"):
+        return key.split(":", 2)[2] or None
+    if key.startswith("domain:") or key.startswith("setting:"):
+        return key.split(":")[1] or None
+    return None
+
+
+class KeyIndex:
+    """In-process index from domain to the (normalized) cache keys cached for it"""
+
+    def __init__(self):
+        self._domains: Dict[str, set] = {}
+        self._keys: Dict[str, str] = {}
+
+    def add(self, normalized_key: str, domain: str):
+        self.discard(normalized_key)
+        self._domains.setdefault(domain, set()).add(normalized_key)
+        self._keys[normalized_key] = domain
+
+    def discard(self, normalized_key: str):
+        domain = self._keys.pop(normalized_key, None)
+        if domain is not None:
+            keys = self._domains.get(domain)
+            if keys is not None:
+                keys.discard(normalized_key)
+                if not keys:
+                    del self._domains[domain]
+
+    def domain_keys(self, domain: str) -> set:
+        return set(self._domains.get(domain, ()))
+
+    def clear(self):
+        self._domains.clear()
+        self._keys.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"indexed_domains": len(self._domains), "indexed_keys": len(self._keys)}
+
+
+class MemoryStore:
+    """
+    Bounded in-process store for the memory cache method
+
+    Entries are evicted least recently used first once max_entries or max_bytes is
+    exceeded. Entries with an expire are dropped lazily when read and by sweep(),
+    which Cache runs periodically.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024, on_remove=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Called with the key of every entry that leaves the store (delete, eviction, expiry)
+        self.on_remove = on_remove
+        # key -> (value, expires_at or None, size in bytes), ordered least recently used first
+        self._entries: "OrderedDict[str, Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    @staticmethod
+    def _size(key: str, value: Any) -> int:
+        if isinstance(value, (bytes, bytearray)):
+            size = len(value)
+        elif isinstance(value, str):
+            size = len(value.encode())
+        else:
+            size = len(json.dumps(value, default=str).encode())
+        return size + len(key.encode())
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+        if self.on_remove is not None:
+            self.on_remove(key)
+
+    def _expired(self, expires_at: Optional[float], now: float) -> bool:
+        return expires_at is not None and expires_at <= now
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if self._expired(expires_at, time.monotonic()):
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, expire: Optional[float] = None) -> bool:
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            # Never serve the previous value of a key that could not be replaced
+            self.delete(key)
+            self.rejections += 1
+            return False
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + expire if expire else None
+        self._entries[key] = (value, expires_at, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def delete(self, key: str) -> bool:
+        if key in self._entries:
+            self._remove(key)
+            return True
+        return False
+
+    def delete_pattern(self, pattern: str) -> int:
+        keys = [key for key in self._entries if fnmatch.fnmatch(key, pattern)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def keys(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+    def sweep(self) -> int:
+        """Drop every expired entry and return how many were dropped"""
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at, _) in self._entries.items() if self._expired(expires_at, now)]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejections": self.rejections,
+        }
+
 
 class Cache:
-    def __init__(self, method: str = "file", location: str = "/var/cache/freeswitch", syslog: bool = False):
+    def __init__(
+        self,
+        method: str = "file",
+        location: str = "/var/cache/freeswitch",
+        syslog: bool = False,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        sweep_interval: float = 60,
+        redis_host: str = "localhost",
+        redis_port: int = 6379,
+        redis_db: int = 0,
+        redis_password: Optional[str] = None,
+        redis_client: Any = None,
+        file_workers: int = 4,
+    ):
         """
         Initialize cache with specified method
         
         Args:
-            method: Cache method ('file' or 'memory')
+            method: Cache method ('file', 'memory' or 'redis')
             location: Cache directory location for file method
             syslog: Enable debug logging
+            max_entries: Maximum number of entries for memory method
+            max_bytes: Maximum size of the values for memory method
+            sweep_interval: Seconds between expired entry sweeps for memory method, 0 disables
+            redis_host, redis_port, redis_db, redis_password: Server for redis method
+            redis_client: Ready made redis.asyncio compatible client for redis method,
+                used instead of connecting to the server (e.g. an in-process stand-in)
+            file_workers: Threads doing the blocking file I/O of file method
         """
         self.method = method
         self.location = Path(location)
         self.syslog = syslog
-        self.memory_cache = {} if method == "memory" else None
+        # Domain -> keys index for the in-process methods, redis keeps it in redis sets
+        self.index = KeyIndex()
+        self.memory_cache = (
+            MemoryStore(max_entries, max_bytes, on_remove=self.index.discard) if method == "memory" else None
+        )
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+        
+        self.redis = None
+        if self.method == "redis":
+            if redis_client is not None:
+                self.redis = redis_client
+            elif aioredis is None:
+                raise RuntimeError("CACHE_METHOD=redis requires the redis package")
+            else:
+                self.redis = aioredis.Redis(
+                    host=redis_host,
+                    port=redis_port,
+                    db=redis_db,
+                    password=redis_password or None,
+                    decode_responses=True,
+                )
+        
+        # The file cache directory is shared with the Lua handlers, whose writes this
+        # process never sees, so a domain's index there is not complete
+        self.index_complete = self.method != "file"
+        
+        # File I/O runs on a bounded thread pool so it never blocks the event loop
+        self._file_executor: Optional[ThreadPoolExecutor] = None
         
         # Ensure cache directory exists for file method
         if self.method == "file":
             self.location.mkdir(parents=True, exist_ok=True)
+            self._file_executor = ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix="cache-file")
     
     def _log_debug(self, message: str):
         """Debug logging similar to FusionPBX syslog"""
@@ -41,13 +292,161 @@ class Cache:
         """Convert colon delimiters to dots like FusionPBX"""
         return key.replace(":", ".")
     
-    async def set(self, key: str, value: Any) -> bool:
+    def _index(self, key: str, normalized_key: str):
+        """Record a stored key under its domain"""
+        domain = key_domain(key)
+        if domain:
+            self.index.add(normalized_key, domain)
+    
+    async def start(self):
+        """Start the periodic sweep of expired memory entries"""
+        if self.memory_cache is not None and self.sweep_interval and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+    
+    async def close(self):
+        """Stop background work and close the redis connections"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self._file_executor is not None:
+            self._file_executor.shutdown(wait=True)
+            self._file_executor = None
+    
+    async def _run_file(self, func, *args):
+        """Run a blocking file operation on the file I/O thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._file_executor, func, *args)
+    
+    # Blocking file method operations, only called through _run_file
+    
+    def _file_set(self, normalized_key: str, cache_value: str):
+        """
+        Write a cache file atomically like cache.lua: write a uniquely named temp file
+        and rename it over the key, so readers never see a half written file
+        """
+        cache_file = self.location / normalized_key
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_name(f"{cache_file.name}.{uuid.uuid4()}.tmp")
+        try:
+            with open(tmp_file, 'w') as f:
+                f.write(cache_value)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_file)
+            except FileNotFoundError:
+                pass
+            raise
+    
+    def _file_get(self, normalized_key: str) -> Optional[str]:
+        try:
+            with open(self.location / normalized_key, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def _file_delete_glob(self, normalized_pattern: str, with_tmp: bool) -> List[str]:
+        deleted_files = []
+        for file_path in glob.glob(str(self.location / normalized_pattern)):
+            candidates = [file_path]
+            # Also try to remove .tmp files
+            if with_tmp:
+                candidates.append(file_path + ".tmp")
+            for candidate in candidates:
+                try:
+                    os.unlink(candidate)
+                    deleted_files.append(candidate)
+                except FileNotFoundError:
+                    pass
+        return deleted_files
+    
+    def _file_delete_many(self, normalized_keys: Iterable[str]) -> int:
+        deleted_count = 0
+        for normalized_key in normalized_keys:
+            cache_file = self.location / normalized_key
+            for file_path in (cache_file, cache_file.with_name(cache_file.name + ".tmp")):
+                try:
+                    os.unlink(file_path)
+                    deleted_count += 1
+                except FileNotFoundError:
+                    pass
+        return deleted_count
+    
+    def _file_flush(self):
+        # Remove all files in cache directory
+        for file_path in self.location.rglob("*"):
+            if file_path.is_file():
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass
+    
+    @staticmethod
+    def _decode(content: Optional[str]) -> Optional[Any]:
+        """Parse a stored value as JSON, fallback to string"""
+        if content is None:
+            return None
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return content
+    
+    async def _redis_delete(self, keys: List[str]) -> int:
+        """Delete redis keys with one pipelined round trip of batched DEL commands"""
+        if not keys:
+            return 0
+        pipe = self.redis.pipeline(transaction=False)
+        for i in range(0, len(keys), REDIS_BATCH_SIZE):
+            pipe.delete(*keys[i:i + REDIS_BATCH_SIZE])
+        return sum(await pipe.execute())
+    
+    async def _redis_delete_pattern(self, pattern: str) -> int:
+        """Delete redis keys matching a glob pattern, walking the keyspace with SCAN"""
+        deleted_count = 0
+        batch = []
+        async for key in self.redis.scan_iter(match=pattern, count=REDIS_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= REDIS_BATCH_SIZE:
+                deleted_count += await self._redis_delete(batch)
+                batch = []
+        deleted_count += await self._redis_delete(batch)
+        return deleted_count
+    
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            expired = self.memory_cache.sweep()
+            if expired:
+                self._log_debug(f"swept {expired} expired memory entries")
+    
+    async def stats(self) -> dict:
+        """Cache statistics, including eviction counters for memory method"""
+        stats = {"method": self.method}
+        if self.method != "redis":
+            stats.update(self.index.stats())
+        if self.method == "file":
+            stats["location"] = str(self.location)
+        elif self.method == "memory":
+            stats.update(self.memory_cache.stats())
+        elif self.method == "redis":
+            stats["keys"] = await self.redis.dbsize()
+        return stats
+    
+    async def set(self, key: str, value: Any, expire: Optional[float] = None) -> bool:
         """
         Set cache value
         
         Args:
             key: Cache key
             value: Value to cache
+            expire: Seconds until the entry expires, ignored by file method like cache.lua,
+                a native key TTL for redis method
             
         Returns:
             bool: Success status
@@ -56,21 +455,31 @@ class Cache:
             normalized_key = self._normalize_key(key)
             
             if self.method == "file":
-                cache_file = self.location / normalized_key
-                cache_file.parent.mkdir(parents=True, exist_ok=True)
-                
                 # Convert value to string if not already
                 cache_value = json.dumps(value) if not isinstance(value, str) else value
                 
-                with open(cache_file, 'w') as f:
-                    f.write(cache_value)
+                await self._run_file(self._file_set, normalized_key, cache_value)
+                self._index(key, normalized_key)
                 
                 self._log_debug(f"set file cache: {normalized_key}")
                 return True
                 
             elif self.method == "memory":
-                self.memory_cache[normalized_key] = value
+                stored = self.memory_cache.set(normalized_key, value, expire)
+                if stored:
+                    self._index(key, normalized_key)
                 self._log_debug(f"set memory cache: {normalized_key}")
+                return stored
+                
+            elif self.method == "redis":
+                cache_value = json.dumps(value) if not isinstance(value, str) else value
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.set(normalized_key, cache_value, ex=int(expire) if expire else None)
+                domain = key_domain(key)
+                if domain:
+                    pipe.sadd(REDIS_DOMAIN_INDEX + domain, normalized_key)
+                await pipe.execute()
+                self._log_debug(f"set redis cache: {normalized_key}")
                 return True
                 
         except Exception as e:
@@ -91,23 +500,14 @@ class Cache:
             normalized_key = self._normalize_key(key)
             
             if self.method == "file":
-                cache_file = self.location / normalized_key
-                
-                if cache_file.exists():
-                    with open(cache_file, 'r') as f:
-                        content = f.read()
-                    
-                    # Try to parse as JSON, fallback to string
-                    try:
-                        return json.loads(content)
-                    except json.JSONDecodeError:
-                        return content
-                        
-                return None
+                return self._decode(await self._run_file(self._file_get, normalized_key))
                 
             elif self.method == "memory":
                 return self.memory_cache.get(normalized_key)
                 
+            elif self.method == "redis":
+                return self._decode(await self.redis.get(normalized_key))
+                
         except Exception as e:
             logger.error(f"Cache get error: {e}")
             return None
@@ -129,33 +529,110 @@ class Cache:
             
             if self.method == "file":
                 # Support wildcard deletion like FusionPBX
-                cache_pattern = str(self.location / normalized_key)
-                deleted_files = []
-                
-                for file_path in glob.glob(cache_pattern):
-                    if os.path.exists(file_path):
-                        os.unlink(file_path)
-                        deleted_files.append(file_path)
-                    
-                    # Also try to remove .tmp files
-                    tmp_file = file_path + ".tmp"
-                    if os.path.exists(tmp_file):
-                        os.unlink(tmp_file)
-                        deleted_files.append(tmp_file)
+                deleted_files = await self._run_file(self._file_delete_glob, normalized_key, True)
+                self.index.discard(normalized_key)
                 
                 self._log_debug(f"deleted files: {deleted_files}")
                 return len(deleted_files) > 0
                 
             elif self.method == "memory":
-                if normalized_key in self.memory_cache:
-                    del self.memory_cache[normalized_key]
-                    return True
-                return False
+                return self.memory_cache.delete(normalized_key)
+                
+            elif self.method == "redis":
+                # Support wildcard deletion like the file method
+                if any(char in normalized_key for char in "*?["):
+                    return await self._redis_delete_pattern(normalized_key) > 0
+                return await self._redis_delete([normalized_key]) > 0
                 
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
             return False
     
+    async def delete_many(self, keys: Iterable[str], raise_errors: bool = False) -> int:
+        """
+        Delete a batch of exact cache keys
+        
+        Args:
+            keys: Cache keys to delete, wildcards are not expanded
+            raise_errors: Raise a failed delete instead of logging it and returning 0
+            
+        Returns:
+            int: Number of entries deleted
+        """
+        try:
+            normalized_keys = {self._normalize_key(key) for key in keys}
+            deleted_count = 0
+            
+            if self.method == "file":
+                deleted_count = await self._run_file(self._file_delete_many, normalized_keys)
+                for normalized_key in normalized_keys:
+                    self.index.discard(normalized_key)
+                
+            elif self.method == "memory":
+                for normalized_key in normalized_keys:
+                    if self.memory_cache.delete(normalized_key):
+                        deleted_count += 1
+                
+            elif self.method == "redis":
+                deleted_count = await self._redis_delete(list(normalized_keys))
+            
+            self._log_debug(f"deleted {deleted_count} of {len(normalized_keys)} keys")
+            return deleted_count
+                
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Cache delete many error: {e}")
+            return 0
+    
+    async def delete_domain(self, domain_name: str, known_keys: Iterable[str] = (), raise_errors: bool = False) -> int:
+        """
+        Delete every entry cached for a domain through the domain index, touching
+        only that domain's keys instead of scanning the whole cache
+        
+        Args:
+            domain_name: Domain name
+            known_keys: Extra keys of the domain to delete, for writers the index
+                does not see (see index_complete)
+            raise_errors: Raise a failed delete instead of logging it and returning 0,
+                the domain's indexed keys are kept for a retry
+            
+        Returns:
+            int: Number of entries deleted
+        """
+        try:
+            normalized_keys = {self._normalize_key(key) for key in known_keys}
+            deleted_count = 0
+            
+            # Keys leave the index only once they are deleted
+            if self.method == "file":
+                normalized_keys |= self.index.domain_keys(domain_name)
+                deleted_count = await self._run_file(self._file_delete_many, normalized_keys)
+                for normalized_key in normalized_keys:
+                    self.index.discard(normalized_key)
+                
+            elif self.method == "memory":
+                normalized_keys |= self.index.domain_keys(domain_name)
+                for normalized_key in normalized_keys:
+                    if self.memory_cache.delete(normalized_key):
+                        deleted_count += 1
+                    self.index.discard(normalized_key)
+                
+            elif self.method == "redis":
+                index_key = REDIS_DOMAIN_INDEX + domain_name
+                normalized_keys |= set(await self.redis.smembers(index_key))
+                deleted_count = await self._redis_delete(list(normalized_keys))
+                await self.redis.delete(index_key)
+            
+            self._log_debug(f"deleted {deleted_count} of {len(normalized_keys)} keys of domain {domain_name}")
+            return deleted_count
+                
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.error(f"Cache delete domain error: {e}")
+            return 0
+    
     async def flush(self) -> bool:
         """
         Flush entire cache
@@ -167,27 +644,29 @@ class Cache:
             self._log_debug("flush all cache")
             
             if self.method == "file":
-                # Remove all files in cache directory
-                for file_path in self.location.rglob("*"):
-                    if file_path.is_file():
-                        os.unlink(file_path)
-                
+                await self._run_file(self._file_flush)
+                self.index.clear()
                 return True
                 
             elif self.method == "memory":
                 self.memory_cache.clear()
                 return True
                 
+            elif self.method == "redis":
+                await self.redis.flushdb()
+                return True
+                
         except Exception as e:
             logger.error(f"Cache flush error: {e}")
             return False
     
-    async def delete_pattern(self, pattern: str) -> bool:
+    async def delete_pattern(self, pattern: str, raise_errors: bool = False) -> bool:
         """
         Delete cache entries matching pattern
         
         Args:
             pattern: Pattern to match (supports wildcards)
+            raise_errors: Raise a failed delete instead of logging it and returning False
             
         Returns:
             bool: Success status
@@ -196,31 +675,27 @@ class Cache:
             normalized_pattern = self._normalize_key(pattern)
             
             if self.method == "file":
-                cache_pattern = str(self.location / normalized_pattern)
-                deleted_count = 0
-                
-                for file_path in glob.glob(cache_pattern):
-                    if os.path.exists(file_path):
-                        os.unlink(file_path)
-                        deleted_count += 1
+                deleted_files = await self._run_file(self._file_delete_glob, normalized_pattern, False)
+                deleted_count = len(deleted_files)
                 
                 self._log_debug(f"deleted {deleted_count} files matching pattern: {normalized_pattern}")
                 return deleted_count > 0
                 
             elif self.method == "memory":
-                import fnmatch
-                keys_to_delete = [
-                    key for key in self.memory_cache.keys() 
-                    if fnmatch.fnmatch(key, normalized_pattern)
-                ]
+                deleted_count = self.memory_cache.delete_pattern(normalized_pattern)
                 
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
+                self._log_debug(f"deleted {deleted_count} memory entries matching pattern: {normalized_pattern}")
+                return deleted_count > 0
                 
-                self._log_debug(f"deleted {len(keys_to_delete)} memory entries matching pattern: {normalized_pattern}")
-                return len(keys_to_delete) > 0
+            elif self.method == "redis":
+                deleted_count = await self._redis_delete_pattern(normalized_pattern)
+                
+                self._log_debug(f"deleted {deleted_count} redis keys matching pattern: {normalized_pattern}")
+                return deleted_count > 0
                 
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"Cache delete pattern error: {e}")
             return False
 
@@ -238,13 +713,49 @@ def get_cache() -> Cache:
     return cache_instance
 
 
-def init_cache(method: str = "file", location: str = "/var/cache/freeswitch", syslog: bool = False):
-    """Initialize cache with configuration"""
+def init_cache(method: str = "file", location: str = "/var/cache/freeswitch", syslog: bool = False, **options):
+    """Initialize cache with configuration, options are passed to Cache (memory limits, sweep interval)"""
     global cache_instance
-    cache_instance = Cache(method=method, location=location, syslog=syslog)
+    cache_instance = Cache(method=method, location=location, syslog=syslog, **options)
     return cache_instance
 
 
+def _publish_keys(keys: Iterable[str]):
+    """Fan the deleted keys out to the switch nodes when a cache publisher is configured"""
+    publisher = get_publisher()
+    if publisher is not None:
+        publisher.publish(keys)
+
+
+async def _invalidate_keys(keys: Iterable[str]) -> int:
+    """
+    Delete exact cache keys in one batch, the single path for key-based invalidation
+
+    Returns the number of entries deleted, 0 when the keys are left to the invalidation queue
+    """
+    keys = list(keys)
+    _publish_keys(keys)
+    queue = get_invalidation_queue()
+    if queue is not None:
+        queue.add_keys(keys)
+        return 0
+    return await get_cache().delete_many(keys)
+
+
+def extension_cache_keys(extension: str, user_context: str, number_alias: Optional[str] = None) -> List[str]:
+    """Cache keys that need to be cleared for an extension (following FusionPBX patterns)"""
+    cache_keys = [
+        f"directory:{extension}@{user_context}",
+        f"extension:{extension}",
+        f"user_context:{user_context}",
+    ]
+    
+    if number_alias:
+        cache_keys.append(f"directory:{number_alias}@{user_context}")
+    
+    return cache_keys
+
+
 async def invalidate_extension_cache(extension: str, user_context: str, number_alias: Optional[str] = None):
     """
     Invalidate extension-related cache entries
@@ -255,39 +766,106 @@ async def invalidate_extension_cache(extension: str, user_context: str, number_a
         user_context: User context (domain)
         number_alias: Optional number alias
     """
-    cache = get_cache()
+    await _invalidate_keys(extension_cache_keys(extension, user_context, number_alias))
     
-    # Cache keys that need to be cleared (following FusionPBX patterns)
-    cache_keys = [
-        f"directory:{extension}@{user_context}",
-        f"extension:{extension}",
-        f"user_context:{user_context}",
-    ]
+    logger.info(f"Invalidated cache for extension {extension}@{user_context}")
+
+
+async def invalidate_extensions_cache(extensions: Iterable[Tuple[str, str, Optional[str]]]):
+    """
+    Invalidate the cache entries of many extensions in one batch
     
-    if number_alias:
-        cache_keys.append(f"directory:{number_alias}@{user_context}")
+    Args:
+        extensions: (extension, user_context, number_alias) tuples
+    """
+    cache_keys = set()
+    for extension, user_context, number_alias in extensions:
+        cache_keys.update(extension_cache_keys(extension, user_context, number_alias))
     
-    # Clear all related cache entries
-    for key in cache_keys:
-        await cache.delete(key)
+    deleted = await _invalidate_keys(cache_keys)
     
-    logger.info(f"Invalidated cache for extension {extension}@{user_context}")
+    logger.info(f"Invalidated {len(cache_keys)} cache keys for bulk extension change ({deleted} deleted)")
 
 
-async def invalidate_domain_cache(domain_name: str):
+async def invalidate_domain_cache(domain_name: str, known_keys: Iterable[str] = ()):
     """
     Invalidate domain-related cache entries
     
     Args:
         domain_name: Domain name
+        known_keys: Keys of the domain cached by other writers, needed when the
+            cache index is not complete (file method shared with the Lua handlers)
+            and published to the switch nodes when a cache publisher is configured
     """
-    cache = get_cache()
+    known_keys = list(known_keys)
+    _publish_keys(known_keys)
+    queue = get_invalidation_queue()
+    if queue is not None:
+        queue.add_domain(domain_name, known_keys)
+        logger.info(f"Queued cache invalidation for domain {domain_name}")
+        return
+    # Clear the domain's entries through the domain index
+    deleted = await get_cache().delete_domain(domain_name, known_keys)
     
-    # Clear domain-related cache patterns
-    await cache.delete_pattern(f"*@{domain_name}")
-    await cache.delete_pattern(f"domain:{domain_name}*")
+    logger.info(f"Invalidated cache for domain {domain_name} ({deleted} deleted)")
+
+
+async def invalidate_dialplan_cache(keys: Iterable[str], patterns: Iterable[str] = ()):
+    """
+    Invalidate dialplan cache entries
     
-    logger.info(f"Invalidated cache for domain {domain_name}")
+    Args:
+        keys: Exact dialplan:<context>[:<destination>] keys
+        patterns: Wildcard patterns for dialplans shared by every destination, only
+            applied to this cache since the switch nodes only take exact keys
+    """
+    keys = list(keys)
+    await _invalidate_keys(keys)
+    
+    patterns = list(patterns)
+    queue = get_invalidation_queue()
+    for pattern in patterns:
+        if queue is not None:
+            queue.add_pattern(pattern)
+        else:
+            await get_cache().delete_pattern(pattern)
+    
+    logger.info(f"Invalidated {len(keys)} dialplan cache keys and {len(patterns)} patterns")
+
+
+async def invalidate_call_groups_cache(domain_name: str):
+    """
+    Invalidate the call group XML of a domain (scripts/action/group_call.lua)
+    
+    Args:
+        domain_name: Domain name
+    """
+    await _invalidate_keys([f"directory:groups:{domain_name}"])
+    
+    logger.info(f"Invalidated call groups for domain {domain_name}")
+
+
+async def invalidate_settings_cache(keys: Iterable[str], patterns: Iterable[str] = ()):
+    """
+    Invalidate setting cache entries (scripts/functions/lazy_settings.lua)
+    
+    Args:
+        keys: Exact setting:<domain>:<category>:<subcategory>:<name> keys
+        patterns: Wildcard patterns, only applied to this cache since the switch
+            nodes only take exact keys
+    """
+    keys = list(keys)
+    await _invalidate_keys(keys)
+    
+    patterns = list(patterns)
+    queue = get_invalidation_queue()
+    for pattern in patterns:
+        if queue is not None:
+            queue.add_pattern(pattern)
+        else:
+            await get_cache().delete_pattern(pattern)
+    
+    logger.info(f"Invalidated {len(keys)} setting cache keys and {len(patterns)} patterns")
 
 
 async def invalidate_user_cache(username: str, domain_name: str):
@@ -298,15 +876,12 @@ async def invalidate_user_cache(username: str, domain_name: str):
         username: Username
         domain_name: Domain name
     """
-    cache = get_cache()
-    
     cache_keys = [
         f"user:{username}@{domain_name}",
         f"auth:{username}@{domain_name}",
     ]
     
-    for key in cache_keys:
-        await cache.delete(key)
+    await _invalidate_keys(cache_keys)
     
     logger.info(f"Invalidated cache for user {username}@{domain_name}")
 
@@ -0,0 +1,205 @@
+"""
+Call group index
+Python counterpart of scripts/action/group_call.lua. Keeps the call_group -> extensions
+map of each domain in memory, updated as extensions change, and builds the group XML
+group_call.lua caches under directory:groups:<domain> from it.
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from app.database import baseDB
+from app.utils.cache import get_cache, get_expire, invalidate_call_groups_cache
+from app.utils.invalidation_queue import after_invalidation
+from app.utils.xml import Xml, sanitize
+
+logger = logging.getLogger(__name__)
+
+baseDB.register("call_groups.domain", """
+    SELECT extension_uuid, extension, call_group FROM v_extensions
+    WHERE domain_uuid = $1
+    AND call_group IS NOT NULL AND call_group <> ''
+""")
+baseDB.register("call_groups.domain_by_name", """
+    SELECT domain_uuid, domain_name FROM v_domains WHERE domain_name = $1
+""")
+
+
+def call_groups_cache_key(domain_name: str) -> str:
+    return f"directory:groups:{domain_name}"
+
+
+def split_call_group(call_group: Optional[str]) -> Set[str]:
+    """Group names of a comma separated call_group column, like explode(",", call_group)"""
+    if not call_group:
+        return set()
+    return {name.strip() for name in call_group.split(",") if name.strip()}
+
+
+@dataclass
+class DomainCallGroups:
+    """Call groups of one domain: group name -> {extension_uuid: extension}"""
+    domain_name: str
+    groups: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    # extension_uuid -> the groups it is a member of, to update an extension in place
+    members: Dict[str, Set[str]] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def set_extension(self, extension_uuid: str, extension: Optional[str], call_group: Optional[str]):
+        self.remove_extension(extension_uuid)
+        names = split_call_group(call_group)
+        if not extension or not names:
+            return
+        for name in names:
+            self.groups.setdefault(name, {})[extension_uuid] = extension
+        self.members[extension_uuid] = names
+
+    def remove_extension(self, extension_uuid: str):
+        for name in self.members.pop(extension_uuid, ()):
+            group = self.groups.get(name)
+            if group is not None:
+                group.pop(extension_uuid, None)
+                if not group:
+                    del self.groups[name]
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {name: sorted(self.groups[name].values()) for name in sorted(self.groups)}
+
+
+class CallGroupIndex:
+    """
+    Call groups per domain_uuid, loaded with one query on first use and then
+    updated incrementally by the extension writes
+
+    A domain is reloaded once it is older than the directory expire, which bounds
+    how long writes made outside this process (other workers, the Lua side) go unseen.
+    """
+
+    def __init__(self):
+        self.domains: Dict[str, DomainCallGroups] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Domains written to while they were loading
+        self._dirty: Set[str] = set()
+        self.stats_counters = {"loads": 0, "updates": 0, "hits": 0}
+
+    async def get(self, domain_uuid: str, domain_name: str) -> DomainCallGroups:
+        domain = self.domains.get(domain_uuid)
+        if domain is not None and time.monotonic() - domain.loaded_at < get_expire("directory"):
+            self.stats_counters["hits"] += 1
+            return domain
+        lock = self._locks.setdefault(domain_uuid, asyncio.Lock())
+        async with lock:
+            domain = self.domains.get(domain_uuid)
+            if domain is not None and time.monotonic() - domain.loaded_at < get_expire("directory"):
+                return domain
+            while True:
+                self._dirty.discard(domain_uuid)
+                domain = DomainCallGroups(domain_name)
+                for row in await baseDB.fetch_all_prepared("call_groups.domain", domain_uuid):
+                    domain.set_extension(str(row["extension_uuid"]), row["extension"], row["call_group"])
+                # Reload when a write committed during the query, it may not be in the rows
+                if domain_uuid not in self._dirty:
+                    break
+            self.stats_counters["loads"] += 1
+            self.domains[domain_uuid] = domain
+            return domain
+
+    def set_extension(self, domain_uuid: str, extension_uuid: str, extension: Optional[str], call_group: Optional[str]):
+        """Apply a created or updated extension to a loaded domain"""
+        self.stats_counters["updates"] += 1
+        self._dirty.add(domain_uuid)
+        domain = self.domains.get(domain_uuid)
+        if domain is not None:
+            domain.set_extension(extension_uuid, extension, call_group)
+
+    def remove_extension(self, domain_uuid: str, extension_uuid: str):
+        """Apply a deleted extension to a loaded domain"""
+        self.stats_counters["updates"] += 1
+        self._dirty.add(domain_uuid)
+        domain = self.domains.get(domain_uuid)
+        if domain is not None:
+            domain.remove_extension(extension_uuid)
+
+    def reset(self, domain_uuid: str):
+        """Forget a domain, it is loaded again on next use (bulk writes, domain changes)"""
+        self._dirty.add(domain_uuid)
+        self.domains.pop(domain_uuid, None)
+
+    def stats(self) -> dict:
+        return {"domains": len(self.domains), **self.stats_counters}
+
+
+# Global call group index
+call_group_index = CallGroupIndex()
+
+
+def render_call_groups(domain_name: str, domain: DomainCallGroups) -> str:
+    """Build the group XML of a domain like group_call.lua"""
+    xml = Xml()
+    xml.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
+    xml.append('<document type="freeswitch/xml">')
+    xml.append('\t<section name="directory">')
+    xml.append(f'\t\t<domain name="{sanitize(domain_name)}">')
+    xml.append('\t\t<groups>')
+    for name, extensions in domain.as_dict().items():
+        xml.append(f'\t\t\t<group name="{sanitize(name)}">')
+        xml.append('\t\t\t\t<users>')
+        for extension in extensions:
+            xml.append(f'\t\t\t\t\t<user id="{sanitize(extension)}" type="pointer"/>')
+        xml.append('\t\t\t\t</users>')
+        xml.append('\t\t\t</group>')
+    xml.append('\t\t</groups>')
+    xml.append('\t\t</domain>')
+    xml.append('\t</section>')
+    xml.append('</document>')
+    return xml.build()
+
+
+async def get_call_groups_xml(domain_name: str) -> Optional[str]:
+    """Answer a group_call directory lookup from the cache or the index"""
+    cache = get_cache()
+    key = call_groups_cache_key(domain_name)
+    xml_string = await cache.get(key)
+    if xml_string:
+        return xml_string
+
+    row = await baseDB.fetch_one_prepared("call_groups.domain_by_name", domain_name)
+    if not row:
+        return None
+    domain = await call_group_index.get(str(row["domain_uuid"]), domain_name)
+    xml_string = render_call_groups(domain_name, domain)
+    await cache.set(key, xml_string, get_expire("directory"))
+    return xml_string
+
+
+async def store_call_groups(domain_uuid: str, domain_name: str):
+    """Render the groups of a domain from the index and store them in the cache"""
+    try:
+        domain = await call_group_index.get(domain_uuid, domain_name)
+        xml_string = render_call_groups(domain_name, domain)
+        await get_cache().set(call_groups_cache_key(domain_name), xml_string, get_expire("directory"))
+    except Exception as e:
+        logger.error(f"Failed to store call groups of {domain_name}: {e}")
+
+
+# Background stores, referenced until they finish
+_store_tasks: Set[asyncio.Task] = set()
+
+
+async def refresh_call_groups(domain_uuid: str, domain_name: str, store: bool = True):
+    """
+    Invalidate the cached groups of a domain, on the switch nodes too, then store
+    the groups rendered from the index once the delete is applied
+    """
+    await invalidate_call_groups_cache(domain_name)
+    if not store:
+        return
+
+    def schedule():
+        task = asyncio.create_task(store_call_groups(domain_uuid, domain_name))
+        _store_tasks.add(task)
+        task.add_done_callback(_store_tasks.discard)
+
+    after_invalidation(schedule)
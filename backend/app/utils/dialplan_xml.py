@@ -0,0 +1,161 @@
+"""
+Dialplan XML cache maintenance
+Cache keys and context XML of scripts/xml_handler/dialplan.lua, used to invalidate
+and optionally re-render the contexts a dialplan write affects.
+"""
+import os
+import socket
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.database import baseDB
+from app.utils.cache import get_cache, get_expire
+from app.utils.invalidation_queue import after_invalidation
+from app.utils.xml import Xml, sanitize
+
+logger = logging.getLogger(__name__)
+
+# Contexts dialplan.lua adds to every non-public context
+SHARED_CONTEXTS = ("global", "${domain_name}")
+
+baseDB.register("dialplans.destination_numbers", """
+    SELECT destination_number FROM v_destination_numbers WHERE dialplan_uuid = $1
+""")
+baseDB.register("destinations.cache_numbers", """
+    SELECT n.destination_number, p.dialplan_context
+    FROM v_destination_numbers AS n
+    JOIN v_dialplans AS p ON p.dialplan_uuid = n.dialplan_uuid
+    WHERE n.destination_uuid = $1
+""")
+# Every context a shared dialplan can be cached under: the domains and the other named contexts
+baseDB.register("dialplans.contexts", """
+    SELECT domain_name AS context FROM v_domains
+    UNION
+    SELECT DISTINCT dialplan_context FROM v_dialplans
+    WHERE dialplan_context IS NOT NULL
+    AND dialplan_context NOT LIKE '%public%'
+    AND dialplan_context NOT IN ('global', '${domain_name}')
+""")
+baseDB.register("dialplans.context_xml", """
+    SELECT dialplan_xml FROM v_dialplans
+    WHERE dialplan_context = ANY($1::text[])
+    AND dialplan_enabled = 'true'
+    ORDER BY dialplan_order ASC
+""")
+
+
+def get_dialplan_hostname() -> str:
+    """Switch hostname the rendered contexts are built for, like api:execute("hostname")"""
+    return os.getenv("XML_HANDLER_HOSTNAME") or socket.gethostname()
+
+
+def is_public_context(context: str) -> bool:
+    """Mirror the public context check of dialplan.lua"""
+    return context == "public" or context.startswith("public@") or context.endswith(".public")
+
+
+def dialplan_cache_key(context: str, destination_number: Optional[str] = None) -> str:
+    if destination_number is None:
+        return f"dialplan:{context}"
+    return f"dialplan:{context}:{destination_number}"
+
+
+async def dialplan_cache_keys(db, dialplan: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """
+    Cache keys a dialplan row can be part of
+
+    Returns:
+        The exact keys and the wildcard patterns for dialplans every public
+        destination includes (single mode keys cannot be enumerated)
+    """
+    context = dialplan.get("dialplan_context") or ""
+    if not context:
+        return [], []
+
+    if context in SHARED_CONTEXTS:
+        rows = await db.fetch_all_prepared("dialplans.contexts")
+        return [dialplan_cache_key(row["context"]) for row in rows if not is_public_context(row["context"])], []
+
+    keys = [dialplan_cache_key(context)]
+    if "public" not in context:
+        return keys, []
+
+    # Public dialplans without a domain are appended to every single mode destination
+    if dialplan.get("domain_uuid") is None:
+        return keys, [dialplan_cache_key("*public*", "*")]
+
+    rows = await db.fetch_all_prepared("dialplans.destination_numbers", str(dialplan["dialplan_uuid"]))
+    keys += [dialplan_cache_key(context, row["destination_number"]) for row in rows]
+    return keys, []
+
+
+async def destination_cache_keys(db, destination_uuid: str) -> List[str]:
+    """Single mode keys of every number of a destination, read from v_destination_numbers"""
+    rows = await db.fetch_all_prepared("destinations.cache_numbers", destination_uuid)
+    return [dialplan_cache_key(row["dialplan_context"] or "public", row["destination_number"]) for row in rows]
+
+
+async def render_dialplan_context(context: str, hostname: Optional[str] = None) -> Optional[str]:
+    """
+    Build the XML dialplan.lua caches under dialplan:<context>
+
+    Returns:
+        XML string or None when the context has no enabled dialplans
+    """
+    hostname = hostname or get_dialplan_hostname()
+    contexts = [context]
+    if not (is_public_context(context) or "@" in context):
+        contexts += SHARED_CONTEXTS
+    rows = await baseDB.fetch_all_prepared("dialplans.context_xml", contexts)
+    if not rows:
+        return None
+
+    xml = Xml()
+    xml.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
+    xml.append('<document type="freeswitch/xml">')
+    xml.append('\t<section name="dialplan" description="">')
+    xml.append(f'\t\t<context name="{sanitize(context)}" destination_number="" hostname="{sanitize(hostname)}">')
+    for row in rows:
+        xml.append(row["dialplan_xml"])
+    xml.append('\t\t</context>')
+    xml.append('\t</section>')
+    xml.append('</document>')
+    return xml.build()
+
+
+async def store_dialplan_contexts(contexts: Iterable[str]):
+    """Render contexts and store them under their dialplan:<context> keys"""
+    cache = get_cache()
+    hostname = get_dialplan_hostname()
+    for context in contexts:
+        try:
+            xml_string = await render_dialplan_context(context, hostname)
+            if xml_string is not None:
+                await cache.set(dialplan_cache_key(context), xml_string, get_expire("dialplan"))
+        except Exception as e:
+            logger.error(f"Failed to render dialplan context {context}: {e}")
+
+
+# Background renders, referenced until they finish
+_render_tasks: Set[asyncio.Task] = set()
+
+
+def warm_dialplan_contexts(keys: Iterable[str]):
+    """
+    Re-render the whole contexts among invalidated dialplan keys once the deletes
+    are applied, when XML_HANDLER_DIALPLAN_RENDER is enabled. Single mode
+    destination keys are left to dialplan.lua.
+    """
+    if os.getenv("XML_HANDLER_DIALPLAN_RENDER", "false").lower() != "true":
+        return
+    contexts = sorted({key.split(":", 2)[1] for key in keys if key.count(":") == 1})
+    if not contexts:
+        return
+
+    def schedule():
+        task = asyncio.create_task(store_dialplan_contexts(contexts))
+        _render_tasks.add(task)
+        task.add_done_callback(_render_tasks.discard)
+
+    after_invalidation(schedule)
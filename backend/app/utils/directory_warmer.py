@@ -0,0 +1,151 @@
+"""
+Directory cache warm-up
+Renders the directory XML of changed extensions in the background and stores it under
+the directory:<user>@<domain> keys directory.lua reads, so the first REGISTER after an
+invalidation is answered from the cache instead of building the entry inside the switch.
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.db.directory_db import directory_db
+from app.utils.directory_xml import (
+    get_directory_options, load_directory_user, render_directory_user, store_directory_user_xml
+)
+from app.utils.invalidation_queue import after_invalidation
+
+logger = logging.getLogger(__name__)
+
+# A job warms one user of a domain, or the whole domain when the user is None
+Job = Tuple[str, Optional[str]]
+
+
+class DirectoryWarmer:
+    """
+    Background workers rendering queued directory entries into the cache
+
+    Jobs still waiting in the queue are deduplicated. A job queued while the same
+    job is running waits for it, so the last render of a user always reads the
+    last committed state.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._queued: set = set()
+        self._running: Dict[Job, asyncio.Event] = {}
+        self._tasks = []
+        self.stats_counters = {"jobs": 0, "warmed": 0, "skipped": 0, "failed": 0}
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    def _enqueue(self, job: Job) -> bool:
+        if job in self._queued:
+            return False
+        self._queued.add(job)
+        self.queue.put_nowait(job)
+        return True
+
+    def warm_users(self, domain_name: str, users: Iterable[Optional[str]]):
+        """Queue the directory entries of users (extensions or number aliases) of a domain"""
+        for user in users:
+            if user:
+                self._enqueue((domain_name, user))
+
+    def warm_domain(self, domain_name: str) -> bool:
+        """Queue the directory entries of every extension of a domain"""
+        return self._enqueue((domain_name, None))
+
+    async def join(self):
+        """Wait until every queued job is done"""
+        await self.queue.join()
+
+    async def _run(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                self._queued.discard(job)
+                while job in self._running:
+                    await self._running[job].wait()
+                done = self._running[job] = asyncio.Event()
+                try:
+                    await self._warm(*job)
+                finally:
+                    del self._running[job]
+                    done.set()
+            except Exception as e:
+                self.stats_counters["failed"] += 1
+                logger.error(f"Failed to warm directory cache for {job[1] or '*'}@{job[0]}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _warm(self, domain_name: str, user: Optional[str]):
+        self.stats_counters["jobs"] += 1
+        options = get_directory_options()
+        if user is None:
+            count = 0
+            async for data in directory_db.resolve_domain(domain_name):
+                count += await self._store(domain_name, data, options)
+            logger.info(f"Warmed directory cache for {count} users of {domain_name}")
+        else:
+            data = await load_directory_user(domain_name, user)
+            if data:
+                await self._store(domain_name, data, options)
+            else:
+                self.stats_counters["skipped"] += 1
+
+    async def _store(self, domain_name: str, data, options) -> int:
+        # Rendered like a cache miss of get_directory_user_xml, without a registration hostname
+        xml_string = render_directory_user(domain_name, data, options)
+        if xml_string is None:
+            self.stats_counters["skipped"] += 1
+            return 0
+        await store_directory_user_xml(domain_name, data["extension"], xml_string)
+        self.stats_counters["warmed"] += 1
+        return 1
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "running": len(self._running), **self.stats_counters}
+
+
+# Global warmer instance, None when warm-up is disabled
+warmer_instance: Optional[DirectoryWarmer] = None
+
+
+def get_warmer() -> Optional[DirectoryWarmer]:
+    """Get global directory warmer instance"""
+    return warmer_instance
+
+
+def init_warmer(enabled: bool = True, workers: int = 2) -> Optional[DirectoryWarmer]:
+    """Initialize the directory warmer"""
+    global warmer_instance
+    warmer_instance = DirectoryWarmer(workers) if enabled else None
+    return warmer_instance
+
+
+def warm_directory_users(domain_name: str, users: Iterable[Optional[str]]):
+    """Queue the directory entries of users for warm-up, a no-op when warm-up is disabled"""
+    warmer = get_warmer()
+    if warmer is not None:
+        users = list(users)
+        after_invalidation(lambda: warmer.warm_users(domain_name, users))
+
+
+def warm_directory_domain(domain_name: str):
+    """Queue the directory entries of a domain for warm-up, a no-op when warm-up is disabled"""
+    warmer = get_warmer()
+    if warmer is not None:
+        after_invalidation(lambda: warmer.warm_domain(domain_name))
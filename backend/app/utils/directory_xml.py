@@ -0,0 +1,338 @@
+"""
+Directory XML builder
+Python port of scripts/xml_handler/directory.lua for the sip_auth and user_call actions.
+The XML and the cache keys match the Lua handler so both can share one cache.
+"""
+import os
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.db.directory_db import directory_db
+from app.utils.cache import get_cache, get_expire
+from app.utils.registration_locator import get_locator
+from app.utils.xml import Xml, sanitize
+
+logger = logging.getLogger(__name__)
+
+ITEM = "\t" * 8
+
+
+@dataclass
+class DirectoryOptions:
+    """xml_handler settings from config.conf (xml_handler.* keys)"""
+    fs_path: bool = False
+    reg_as_number_alias: bool = False
+    number_as_presence_id: bool = False
+    fs_path_profile: str = "internal"
+
+
+def get_directory_options() -> DirectoryOptions:
+    """Read the xml_handler options from the environment"""
+    return DirectoryOptions(
+        fs_path=os.getenv("XML_HANDLER_FS_PATH", "false").lower() == "true",
+        reg_as_number_alias=os.getenv("XML_HANDLER_REG_AS_NUMBER_ALIAS", "false").lower() == "true",
+        number_as_presence_id=os.getenv("XML_HANDLER_NUMBER_AS_PRESENCE_ID", "false").lower() == "true",
+        fs_path_profile=os.getenv("XML_HANDLER_FS_PATH_PROFILE", "internal"),
+    )
+
+
+def _text(value: Any) -> str:
+    """Lua treats missing columns as empty strings when checking string.len"""
+    return "" if value is None else str(value)
+
+
+def directory_cache_key(user: str, domain_name: str) -> str:
+    return f"directory:{user}@{domain_name}"
+
+
+async def load_directory_user(domain_name: str, user: str) -> Optional[Dict[str, Any]]:
+    """
+    Load everything needed to build the directory entry of a user
+
+    Returns:
+        dict with the extension row, user_uuid, contact_uuid, settings, voicemail
+        and the domain dial_string setting, or None if the user does not exist
+    """
+    return await directory_db.resolve_user(domain_name, user)
+
+
+def render_directory_user(
+    domain_name: str,
+    data: Dict[str, Any],
+    options: DirectoryOptions,
+    local_hostname: Optional[str] = None,
+    database_hostname: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Build the directory XML for one user
+
+    Args:
+        domain_name: Domain name
+        data: Result of load_directory_user
+        options: xml_handler options
+        local_hostname: Switch name of the requesting switch (fs_path only)
+        database_hostname: Switch the user is registered on (fs_path only)
+
+    Returns:
+        XML string or None if the extension has no password
+    """
+    row = data["extension"]
+    domain_uuid = data["domain_uuid"]
+    settings: List[Dict[str, Any]] = data["settings"] or []
+    voicemail = data["voicemail"]
+
+    password = row.get('password')
+    if password is None:
+        return None
+
+    extension = _text(row.get('extension'))
+    cidr = _text(row.get('cidr'))
+    number_alias = _text(row.get('number_alias'))
+    sip_from_user = extension
+    sip_from_number = number_alias if number_alias else extension
+    do_not_disturb = _text(row.get('do_not_disturb'))
+    forward_all_enabled = _text(row.get('forward_all_enabled'))
+
+    #if the extension is virtual set register to false
+    auth_acl = _text(row.get('auth_acl'))
+    if row.get('extension_type') == 'virtual':
+        auth_acl = f"virtual.{row.get('random')}"
+
+    #get the follow me information
+    follow_me_enabled = ""
+    if _text(row.get('follow_me_uuid')):
+        if do_not_disturb == "true" or forward_all_enabled == "true":
+            follow_me_enabled = "false"
+        else:
+            follow_me_enabled = _text(row.get('follow_me_enabled'))
+
+    #set the presence_id
+    presence_id = f"{sip_from_number if options.number_as_presence_id else sip_from_user}@{domain_name}"
+
+    #set the dial_string
+    dial_string = data.get("dial_string")
+    if do_not_disturb == "true":
+        dial_string = "error/user_busy"
+    elif _text(row.get('dial_string')):
+        dial_string = row['dial_string']
+    else:
+        destination = f"{sip_from_number if options.reg_as_number_alias else sip_from_user}@{domain_name}"
+        if dial_string is None:
+            dial_string = (
+                f"{{sip_invite_domain={domain_name},presence_id={presence_id}}}"
+                f"${{sofia_contact(*/{destination})}}"
+            )
+        if options.fs_path and database_hostname and local_hostname != database_hostname:
+            dial_string = (
+                f"{{sip_invite_domain={domain_name},presence_id={presence_id}}}"
+                f"sofia/{options.fs_path_profile}/{destination};fs_path=sip:{database_hostname}"
+            )
+
+    #get the voicemail settings
+    vm_enabled = "true"
+    vm_password = vm_attach_file = vm_keep_local_after_email = None
+    vm_mailto = ""
+    if voicemail:
+        if _text(voicemail.get('voicemail_enabled')):
+            vm_enabled = voicemail['voicemail_enabled']
+        vm_password = voicemail.get('voicemail_password')
+        vm_attach_file = _text(voicemail.get('voicemail_attach_file')) or "true"
+        vm_keep_local_after_email = _text(voicemail.get('voicemail_local_after_email')) or "true"
+        vm_mailto = _text(voicemail.get('voicemail_mail_to'))
+
+    #set the directory full name
+    directory_first_name = _text(row.get('directory_first_name'))
+    directory_last_name = _text(row.get('directory_last_name'))
+    directory_full_name = ""
+    if directory_first_name:
+        directory_full_name = directory_first_name
+        if directory_last_name:
+            directory_full_name = f"{directory_first_name} {directory_last_name}"
+
+    xml = Xml()
+    xml.append('<?xml version="1.0" encoding="UTF-8" standalone="no"?>')
+    xml.append('<document type="freeswitch/xml">')
+    xml.append('\t<section name="directory">')
+    xml.append(f'\t\t<domain name="{sanitize(domain_name)}" alias="true">')
+    xml.append('\t\t\t<params>')
+    xml.append('\t\t\t\t<param name="jsonrpc-allowed-methods" value="verto"/>')
+    xml.append('\t\t\t\t<param name="jsonrpc-allowed-event-channels" value="demo,conference,presence"/>')
+    xml.append('\t\t\t</params>')
+    xml.append('\t\t\t<groups>')
+    xml.append('\t\t\t\t<group name="default">')
+    xml.append('\t\t\t\t\t<users>')
+    xml.append(
+        f'\t\t\t\t\t\t<user id="{sanitize(extension)}" cidr="{sanitize(cidr)}" '
+        f'number-alias="{sanitize(number_alias)}" type="">'
+    )
+    xml.append('\t\t\t\t\t\t\t<params>')
+    xml.append(f'{ITEM}<param name="password" value="{password}"/>')
+    xml.append(f'{ITEM}<param name="vm-enabled" value="{sanitize(vm_enabled)}"/>')
+    if vm_mailto:
+        xml.append(f'{ITEM}<param name="vm-password" value="{sanitize(vm_password)}"/>')
+        xml.append(f'{ITEM}<param name="vm-email-all-messages" value="{sanitize(vm_enabled)}"/>')
+        xml.append(f'{ITEM}<param name="vm-attach-file" value="{sanitize(vm_attach_file)}"/>')
+        xml.append(f'{ITEM}<param name="vm-keep-local-after-email" value="{sanitize(vm_keep_local_after_email)}"/>')
+        xml.append(f'{ITEM}<param name="vm-mailto" value="{sanitize(vm_mailto)}"/>')
+    if _text(row.get('mwi_account')):
+        xml.append(f'\t\t\t\t\t\t\t<param name="MWI-Account" value="{sanitize(row["mwi_account"])}"/>')
+    if auth_acl:
+        xml.append(f'{ITEM}<param name="auth-acl" value="{sanitize(auth_acl)}"/>')
+    xml.append(f'{ITEM}<param name="dial-string" value="{dial_string}"/>')
+    xml.append(f'{ITEM}<param name="verto-context" value="{sanitize(row.get("user_context"))}"/>')
+    xml.append(f'{ITEM}<param name="verto-dialplan" value="XML"/>')
+    xml.append(f'{ITEM}<param name="jsonrpc-allowed-methods" value="verto"/>')
+    xml.append(f'{ITEM}<param name="jsonrpc-allowed-event-channels" value="demo,conference,presence"/>')
+    xml.append(f'{ITEM}<param name="max-registrations-per-extension" value="{sanitize(row.get("max_registrations"))}"/>')
+    for setting in settings:
+        if setting['extension_setting_type'] == 'param':
+            xml.append(
+                f'{ITEM}<param name="{sanitize(setting["extension_setting_name"])}" '
+                f'value="{sanitize(setting["extension_setting_value"])}"/>'
+            )
+    xml.append('\t\t\t\t\t\t\t</params>')
+    xml.append('\t\t\t\t\t\t\t<variables>')
+
+    def variable(name: str, value: Any):
+        xml.append(f'{ITEM}<variable name="{name}" value="{sanitize(value)}"/>')
+
+    def optional_variable(name: str, value: Any):
+        if _text(value):
+            variable(name, value)
+
+    variable("domain_uuid", domain_uuid)
+    variable("domain_name", domain_name)
+    variable("extension_uuid", row.get('extension_uuid'))
+    optional_variable("user_uuid", data.get("user_uuid"))
+    optional_variable("contact_uuid", data.get("contact_uuid"))
+    variable("call_timeout", row.get('call_timeout'))
+    variable("caller_id_name", sip_from_user)
+    variable("caller_id_number", sip_from_number)
+    variable("presence_id", presence_id)
+    for name in ("call_group", "call_screen_enabled", "user_record", "hold_music", "toll_allow", "accountcode"):
+        optional_variable(name, row.get(name))
+    variable("user_context", row.get('user_context'))
+    for name in (
+        "effective_caller_id_name", "effective_caller_id_number",
+        "outbound_caller_id_name", "outbound_caller_id_number",
+        "emergency_caller_id_name", "emergency_caller_id_number",
+        "missed_call_app", "missed_call_data",
+    ):
+        optional_variable(name, row.get(name))
+    optional_variable("directory_full_name", directory_full_name)
+    optional_variable("directory-visible", row.get('directory_visible'))
+    optional_variable("directory-exten-visible", row.get('directory_exten_visible'))
+    if _text(row.get('limit_max')):
+        variable("limit_max", row['limit_max'])
+    else:
+        xml.append(f'{ITEM}<variable name="limit_max" value="5"/>')
+    optional_variable("limit_destination", row.get('limit_destination'))
+    optional_variable("sip-force-contact", row.get('sip_force_contact'))
+    optional_variable("sip-force-expires", row.get('sip_force_expires'))
+    optional_variable("nibble_account", row.get('nibble_account'))
+    optional_variable("absolute_codec_string", row.get('absolute_codec_string'))
+    optional_variable("force_ping", row.get('force_ping'))
+    sip_bypass_media = row.get('sip_bypass_media')
+    if sip_bypass_media == "bypass-media":
+        xml.append(f'{ITEM}<variable name="bypass_media" value="true"/>')
+    if sip_bypass_media == "bypass-media-after-bridge":
+        xml.append(f'{ITEM}<variable name="bypass_media_after_bridge" value="true"/>')
+    if sip_bypass_media == "proxy-media":
+        xml.append(f'{ITEM}<variable name="proxy_media" value="true"/>')
+    for name in (
+        "forward_all_enabled", "forward_all_destination",
+        "forward_busy_enabled", "forward_busy_destination",
+        "forward_no_answer_enabled", "forward_no_answer_destination",
+        "forward_user_not_registered_enabled", "forward_user_not_registered_destination",
+    ):
+        optional_variable(name, row.get(name))
+    optional_variable("follow_me_enabled", follow_me_enabled)
+    optional_variable("do_not_disturb", do_not_disturb)
+    optional_variable("default_language", row.get('extension_language'))
+    optional_variable("default_dialect", row.get('extension_dialect'))
+    optional_variable("default_voice", row.get('extension_voice'))
+    xml.append(f'{ITEM}<variable name="record_stereo" value="true"/>')
+    xml.append(f'{ITEM}<variable name="transfer_fallback_extension" value="operator"/>')
+    xml.append(f'{ITEM}<variable name="export_vars" value="domain_name,domain_uuid"/>')
+    for setting in settings:
+        if setting['extension_setting_type'] == 'variable':
+            variable(sanitize(setting["extension_setting_name"]), setting["extension_setting_value"])
+    xml.append('\t\t\t\t\t\t\t</variables>')
+    xml.append('\t\t\t\t\t\t</user>')
+    xml.append('\t\t\t\t\t</users>')
+    xml.append('\t\t\t\t</group>')
+    xml.append('\t\t\t</groups>')
+    xml.append('\t\t</domain>')
+    xml.append('\t</section>')
+    xml.append('</document>')
+    return xml.build()
+
+
+def directory_user_cache_keys(domain_name: str, extension_row: Dict[str, Any]) -> List[str]:
+    """Cache keys the Lua handler stores a user under: number alias (or extension) and extension"""
+    extension = _text(extension_row.get('extension'))
+    sip_from_number = _text(extension_row.get('number_alias')) or extension
+    keys = [directory_cache_key(sip_from_number, domain_name)]
+    if sip_from_number != extension:
+        keys.append(directory_cache_key(extension, domain_name))
+    return keys
+
+
+async def get_directory_user_xml(
+    domain_name: str,
+    user: str,
+    from_user: Optional[str] = None,
+    sip_auth_method: Optional[str] = None,
+    dialed_extension: Optional[str] = None,
+    local_hostname: Optional[str] = None,
+    options: Optional[DirectoryOptions] = None,
+) -> Optional[str]:
+    """
+    Answer a sip_auth / user_call directory lookup
+
+    The cache is used unless fs_path is enabled and a dial-string is requested,
+    in that case the registration hostname has to be read from the database.
+    """
+    options = options or get_directory_options()
+    cache = get_cache()
+
+    #in load balancing mode a proxied INVITE carries the caller as from user
+    if options.fs_path and sip_auth_method and sip_auth_method.upper() == 'INVITE':
+        from_user = user
+
+    use_fs_path = options.fs_path and dialed_extension is not None
+
+    if not use_fs_path:
+        xml_string = await cache.get(directory_cache_key(from_user or user, domain_name))
+        if xml_string:
+            return xml_string
+
+    data = await load_directory_user(domain_name, user)
+    if not data:
+        return None
+
+    database_hostname = None
+    if use_fs_path:
+        reg_user = dialed_extension if options.reg_as_number_alias else data["extension"]["extension"]
+        locator = get_locator()
+        if locator is not None:
+            registration = await locator.locate(reg_user, domain_name)
+            database_hostname = registration.hostname if registration else None
+        else:
+            database_hostname = await directory_db.get_registration_hostname(reg_user, domain_name)
+
+    xml_string = render_directory_user(domain_name, data, options, local_hostname, database_hostname)
+    if xml_string is None:
+        return None
+
+    await store_directory_user_xml(domain_name, data["extension"], xml_string)
+
+    return xml_string
+
+
+async def store_directory_user_xml(domain_name: str, extension_row: Dict[str, Any], xml_string: str):
+    """Cache the directory XML of a user under every key the Lua handler reads"""
+    cache = get_cache()
+    for key in directory_user_cache_keys(domain_name, extension_row):
+        await cache.set(key, xml_string, get_expire("directory"))
@@ -0,0 +1,71 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Iterable, List, Sequence
+
+from fastapi.responses import StreamingResponse
+
+# Rows serialized per chunk written to the response
+CHUNK_ROWS = 500
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    return "" if value is None else value
+
+
+async def _chunks(rows: AsyncIterator, serialize) -> AsyncIterator[str]:
+    batch: List[Any] = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_ROWS:
+            yield serialize(batch)
+            batch = []
+    if batch:
+        yield serialize(batch)
+
+
+async def ndjson_lines(rows: AsyncIterator, columns: Sequence[str]) -> AsyncIterator[str]:
+    """Serialize rows as one JSON object per line"""
+    def serialize(batch: Iterable) -> str:
+        return "".join(
+            json.dumps({column: row[column] for column in columns}, default=str) + "\n"
+            for row in batch
+        )
+
+    async for chunk in _chunks(rows, serialize):
+        yield chunk
+
+
+async def csv_lines(rows: AsyncIterator, columns: Sequence[str]) -> AsyncIterator[str]:
+    """Serialize rows as CSV with a header line"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def serialize(batch: Iterable) -> str:
+        writer.writerows([[_csv_value(row[column]) for column in columns] for row in batch])
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    yield serialize([dict(zip(columns, columns))])
+    async for chunk in _chunks(rows, serialize):
+        yield chunk
+
+
+def export_response(rows: AsyncIterator, columns: Sequence[str], format: str, filename: str) -> StreamingResponse:
+    """Stream rows from Database.stream() as an NDJSON or CSV download"""
+    if format == "csv":
+        body = csv_lines(rows, columns)
+    else:
+        body = ndjson_lines(rows, columns)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
@@ -0,0 +1,202 @@
+"""
+Debounced cache invalidation
+Collects the keys and domains invalidated by a burst of writes, deduplicates them
+within a short window and deletes them from the cache in batches.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationQueue:
+    """
+    Pending cache deletes, flushed window seconds after the first one arrives
+
+    A flush starts early once max_pending keys are waiting. Callbacks registered
+    with after_flush run once the deletes queued before them are done, so work
+    that refills the cache (the directory warmer) cannot race the deletes.
+
+    Deletes that fail are queued again and retried with a doubling delay, up to
+    max_retries times in a row, since file cache entries never expire on their own.
+    """
+
+    def __init__(
+        self, cache, window: float = 0.05, batch_size: int = 500, max_pending: int = 10000,
+        max_retries: int = 5, retry_delay: float = 0.5,
+    ):
+        self.cache = cache
+        self.window = window
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._retries = 0
+        self._keys: Dict[str, None] = {}
+        self._domains: Dict[str, Set[str]] = {}
+        self._patterns: Dict[str, None] = {}
+        self._callbacks: List[Callable[[], None]] = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+        self.stats_counters = {"queued": 0, "deduplicated": 0, "flushes": 0, "deleted": 0, "failed": 0, "retried": 0, "dropped": 0}
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Flush what is still pending, then stop"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush_now()
+        if self.depth:
+            logger.error(f"Closed with {self.depth} cache invalidations still pending")
+
+    @property
+    def depth(self) -> int:
+        """Keys, domains and patterns waiting for the next flush"""
+        return len(self._keys) + len(self._domains) + len(self._patterns)
+
+    def add_keys(self, keys: Iterable[str]):
+        """Queue exact cache keys for deletion"""
+        for key in keys:
+            self.stats_counters["queued"] += 1
+            if key in self._keys:
+                self.stats_counters["deduplicated"] += 1
+            self._keys[key] = None
+        self._notify()
+
+    def add_domain(self, domain_name: str, known_keys: Iterable[str] = ()):
+        """Queue the deletion of every entry of a domain, see Cache.delete_domain()"""
+        self.stats_counters["queued"] += 1
+        if domain_name in self._domains:
+            self.stats_counters["deduplicated"] += 1
+        self._domains.setdefault(domain_name, set()).update(known_keys)
+        self._notify()
+
+    def add_pattern(self, pattern: str):
+        """Queue the deletion of every entry matching a wildcard pattern, see Cache.delete_pattern()"""
+        self.stats_counters["queued"] += 1
+        if pattern in self._patterns:
+            self.stats_counters["deduplicated"] += 1
+        self._patterns[pattern] = None
+        self._notify()
+
+    def after_flush(self, callback: Callable[[], None]):
+        """Run callback once the pending deletes are flushed, right away when nothing is pending"""
+        if self.depth:
+            self._callbacks.append(callback)
+        else:
+            callback()
+
+    def _notify(self):
+        if self.depth:
+            self._wakeup.set()
+        if len(self._keys) >= self.max_pending:
+            self._full.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let the rest of the burst arrive before flushing
+            try:
+                await asyncio.wait_for(self._full.wait(), self.window)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush_now()
+            if self._retries:
+                await asyncio.sleep(self.retry_delay * 2 ** (self._retries - 1))
+
+    async def flush_now(self):
+        """Delete every pending key, domain and pattern now"""
+        async with self._lock:
+            self._wakeup.clear()
+            self._full.clear()
+            keys, self._keys = list(self._keys), {}
+            domains, self._domains = self._domains, {}
+            patterns, self._patterns = list(self._patterns), {}
+            callbacks, self._callbacks = self._callbacks, []
+            if keys or domains or patterns:
+                self.stats_counters["flushes"] += 1
+            done_keys, done_domains, done_patterns = 0, 0, 0
+            try:
+                for i in range(0, len(keys), self.batch_size):
+                    self.stats_counters["deleted"] += await self.cache.delete_many(
+                        keys[i:i + self.batch_size], raise_errors=True
+                    )
+                    done_keys = i + self.batch_size
+                for domain_name, known_keys in domains.items():
+                    self.stats_counters["deleted"] += await self.cache.delete_domain(
+                        domain_name, known_keys, raise_errors=True
+                    )
+                    done_domains += 1
+                for pattern in patterns:
+                    await self.cache.delete_pattern(pattern, raise_errors=True)
+                    done_patterns += 1
+                self._retries = 0
+            except Exception as e:
+                self.stats_counters["failed"] += 1
+                keys, patterns = keys[done_keys:], patterns[done_patterns:]
+                domains = dict(list(domains.items())[done_domains:])
+                summary = f"{len(keys)} cache keys, {len(domains)} domains and {len(patterns)} patterns"
+                if self._retries < self.max_retries:
+                    self._retries += 1
+                    self.stats_counters["retried"] += 1
+                    logger.warning(f"Failed to flush {summary}, retry {self._retries} of {self.max_retries}: {e}")
+                    self._requeue(keys, domains, patterns, callbacks)
+                    return
+                self._retries = 0
+                self.stats_counters["dropped"] += len(keys) + len(domains) + len(patterns)
+                logger.error(f"Dropped {summary} after {self.max_retries} failed retries: {e}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Invalidation flush callback failed: {e}")
+
+    def _requeue(
+        self, keys: List[str], domains: Dict[str, Set[str]], patterns: List[str], callbacks: List[Callable[[], None]]
+    ):
+        """Put a failed flush back ahead of what arrived meanwhile, its callbacks wait for the retry"""
+        self._keys = {**dict.fromkeys(keys), **self._keys}
+        for domain_name, known_keys in domains.items():
+            self._domains.setdefault(domain_name, set()).update(known_keys)
+        self._patterns = {**dict.fromkeys(patterns), **self._patterns}
+        self._callbacks = callbacks + self._callbacks
+        self._notify()
+
+    def stats(self) -> dict:
+        return {"depth": self.depth, "window": self.window, "retries": self._retries, **self.stats_counters}
+
+
+# Global queue instance, None when invalidations are applied synchronously
+queue_instance: Optional[InvalidationQueue] = None
+
+
+def get_invalidation_queue() -> Optional[InvalidationQueue]:
+    """Get global invalidation queue instance"""
+    return queue_instance
+
+
+def init_invalidation_queue(cache, window: float = 0.05, **options) -> Optional[InvalidationQueue]:
+    """Initialize the invalidation queue, a window of 0 keeps invalidations synchronous"""
+    global queue_instance
+    queue_instance = InvalidationQueue(cache, window, **options) if window > 0 else None
+    return queue_instance
+
+
+def after_invalidation(callback: Callable[[], None]):
+    """Run callback once the queued cache deletes are applied, or now when they are synchronous"""
+    queue = get_invalidation_queue()
+    if queue is not None:
+        queue.after_flush(callback)
+    else:
+        callback()
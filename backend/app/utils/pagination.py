@@ -0,0 +1,151 @@
+import base64
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from app.database import baseDB
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Response header carrying the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the keyset values of the last row of a page as an opaque cursor"""
+    raw = json.dumps([None if value is None else str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """Decode a cursor produced by encode_cursor, raising a 400 when it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+@dataclass
+class PageParams:
+    limit: int
+    after: Optional[str]
+
+
+def page_params(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Maximum rows per page"),
+    after: Optional[str] = Query(None, description="Cursor returned in the X-Next-Cursor header"),
+) -> PageParams:
+    """Dependency parsing the limit/after query parameters of a list endpoint"""
+    return PageParams(limit=limit, after=after)
+
+
+@dataclass
+class Keyset:
+    """
+    Keyset ordering of a list endpoint
+
+    columns are (sql expression, row key) pairs, the expressions must match an index
+    and end with a unique column so the ordering is total. Nullable columns are wrapped
+    in COALESCE since a row comparison with NULL never matches.
+    """
+    name: str
+    table: str
+    columns: Tuple[Tuple[str, str], ...]
+    filters: Tuple[str, ...] = ()
+
+    def select(self, columns: Optional[Sequence[str]]) -> str:
+        """Select list of a projection, always with the keys the next cursor is built from"""
+        if not columns:
+            return "*"
+        keys = [key for _, key in self.columns if key not in columns]
+        return ", ".join([*columns, *keys])
+
+    def query(self, filters: Sequence[str], after: bool, columns: Optional[Sequence[str]] = None) -> str:
+        """Build the page query for the given active filters and projected columns"""
+        conditions = []
+        for i, column in enumerate(filters):
+            conditions.append(f"{column} = ${i + 1}")
+        if after:
+            expressions = ", ".join(expression for expression, _ in self.columns)
+            start = len(filters) + 1
+            placeholders = ", ".join(f"${start + i}" for i in range(len(self.columns)))
+            conditions.append(f"({expressions}) > ({placeholders})")
+        query = f"SELECT {self.select(columns)} FROM {self.table}"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        order_by = ", ".join(expression for expression, _ in self.columns)
+        limit = len(filters) + (len(self.columns) if after else 0) + 1
+        return f"{query} ORDER BY {order_by} LIMIT ${limit}"
+
+    def statement(self, filters: Sequence[str], after: bool) -> str:
+        """Get the named statement of a filter combination, registering it on first use"""
+        name = ".".join([self.name, "page", *filters] + (["after"] if after else []))
+        if name not in baseDB.statements:
+            baseDB.register(name, self.query(filters, after))
+        return name
+
+    def cursor(self, row: Dict[str, Any]) -> str:
+        values = []
+        for expression, key in self.columns:
+            value = row[key]
+            # Mirror the COALESCE of the ordering so the cursor compares the same way
+            if value is None and expression.startswith("COALESCE"):
+                value = ""
+            values.append(value)
+        return encode_cursor(values)
+
+
+async def fetch_page(
+    keyset: Keyset,
+    params: PageParams,
+    filters: Optional[Dict[str, Any]] = None,
+    records: bool = False,
+    columns: Optional[Sequence[str]] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of a keyset ordered list
+
+    Args:
+        records: Return the asyncpg Records as fetched instead of dicts, for
+            responses encoded straight from the rows (see app.utils.serialization)
+        columns: Whitelisted columns to select instead of every column
+
+    Returns:
+        The rows and the cursor of the next page, None on the last page
+    """
+    active = {column: value for column, value in (filters or {}).items() if value is not None}
+    for column in active:
+        if column not in keyset.filters:
+            raise ValueError(f"{keyset.table} cannot be filtered by {column}")
+
+    args = [str(value) for value in active.values()]
+    if params.after:
+        args += decode_cursor(params.after, len(keyset.columns))
+    # Fetch one extra row to know whether there is a next page
+    args.append(params.limit + 1)
+
+    if columns:
+        # Projections run as ad-hoc SQL, there are too many column sets to register
+        query = keyset.query(list(active.keys()), bool(params.after), columns)
+        if records:
+            rows = await baseDB.fetch_records(query, *args)
+        else:
+            rows = await baseDB.fetch_all(query, *args)
+    else:
+        name = keyset.statement(list(active.keys()), bool(params.after))
+        if records:
+            rows = await baseDB.fetch_records_prepared(name, *args)
+        else:
+            rows = await baseDB.fetch_all_prepared(name, *args)
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        next_cursor = keyset.cursor(rows[-1])
+    return rows, next_cursor
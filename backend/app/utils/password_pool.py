@@ -0,0 +1,106 @@
+"""
+Password hashing pool
+Runs the bcrypt hashing of the auth routes on a small thread pool so a burst of logins
+does not block the event loop serving the CRUD API and the XML handler endpoints.
+bcrypt releases the GIL while hashing, so threads run the hashes in parallel.
+"""
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordPool:
+    """
+    Bounded executor for password hashes
+
+    At most workers hashes run at once, up to max_queue more wait for a worker and
+    any further request is rejected with a 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 100):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._semaphore = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.stats_counters = {"calls": 0, "rejected": 0}
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Run a hashing function on the pool once a worker is free"""
+        if self.waiting >= self.max_queue:
+            self.stats_counters["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password checks, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        queued_at = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            started_at = time.monotonic()
+            queue_time = started_at - queued_at
+            self.queue_time_total += queue_time
+            self.queue_time_max = max(self.queue_time_max, queue_time)
+            self.running += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+            finally:
+                self.running -= 1
+                run_time = time.monotonic() - started_at
+                self.run_time_total += run_time
+                self.run_time_max = max(self.run_time_max, run_time)
+                self.stats_counters["calls"] += 1
+        finally:
+            self._semaphore.release()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        calls = self.stats_counters["calls"]
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            **self.stats_counters,
+            "queue_time_avg": self.queue_time_total / calls if calls else 0.0,
+            "queue_time_max": self.queue_time_max,
+            "run_time_avg": self.run_time_total / calls if calls else 0.0,
+            "run_time_max": self.run_time_max,
+        }
+
+
+# Global pool instance
+pool_instance: Optional[PasswordPool] = None
+
+
+def get_password_pool() -> PasswordPool:
+    """Get global password pool instance"""
+    global pool_instance
+    if pool_instance is None:
+        # Default configuration - can be overridden
+        pool_instance = PasswordPool()
+    return pool_instance
+
+
+def init_password_pool(workers: int = 2, max_queue: int = 100) -> PasswordPool:
+    """Initialize the password pool"""
+    global pool_instance
+    pool_instance = PasswordPool(workers, max_queue)
+    return pool_instance
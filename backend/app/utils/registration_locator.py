@@ -0,0 +1,157 @@
+"""
+Registration locator
+In-memory (reg_user, realm) -> hostname map of the unexpired registrations, used by the
+fs_path load balancing of the directory to find the switch a dialed user is registered
+on without a registrations query per lookup (see scripts/xml_handler/directory.lua).
+"""
+import time
+import heapq
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.database import baseDB
+
+logger = logging.getLogger(__name__)
+
+# expires is compared as epoch seconds so the (reg_user, realm, expires) index applies
+baseDB.register("registrations.unexpired", """
+    SELECT reg_user, realm, hostname, expires FROM registrations
+    WHERE expires > $1 AND hostname IS NOT NULL
+""")
+baseDB.register("registrations.locate", """
+    SELECT hostname, expires FROM registrations
+    WHERE reg_user = $1 AND realm = $2 AND expires > $3 AND hostname IS NOT NULL
+    ORDER BY expires DESC
+    LIMIT 1
+""")
+
+RegistrationKey = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class RegistrationEntry:
+    hostname: str
+    # Epoch seconds, like the expires column
+    expires: int
+
+
+class RegistrationLocator:
+    """
+    Unexpired registrations by (reg_user, realm), reloaded every interval seconds
+
+    Entries leave the map through an expiry heap as their registration expires, so a
+    lookup is one dict access. A user missing from the map is looked up in the
+    database once and remembered, which covers registrations made since the last load.
+    When a user is registered on several switches the latest expiring one is used.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        self.interval = interval
+        self.entries: Dict[RegistrationKey, RegistrationEntry] = {}
+        self._heap: List[Tuple[int, str, str]] = []
+        self._worker: Optional[asyncio.Task] = None
+        self.stats_counters = {"loads": 0, "hits": 0, "misses": 0, "fallbacks": 0, "expired": 0, "failed": 0}
+
+    async def start(self):
+        if self._worker is None:
+            await self.load()
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.load()
+            except Exception as e:
+                # Keep serving the last load, expired entries still leave through the heap
+                self.stats_counters["failed"] += 1
+                logger.error(f"Failed to reload registrations: {e}")
+
+    async def load(self):
+        """Replace the map with the unexpired registrations of the registrations table"""
+        now = int(time.time())
+        entries: Dict[RegistrationKey, RegistrationEntry] = {}
+        for row in await baseDB.fetch_all_prepared("registrations.unexpired", now):
+            key = (row["reg_user"], row["realm"])
+            entry = entries.get(key)
+            if entry is None or row["expires"] > entry.expires:
+                entries[key] = RegistrationEntry(row["hostname"], row["expires"])
+        heap = [(entry.expires, reg_user, realm) for (reg_user, realm), entry in entries.items()]
+        heapq.heapify(heap)
+        self.entries, self._heap = entries, heap
+        self.stats_counters["loads"] += 1
+
+    def add(self, reg_user: str, realm: str, hostname: str, expires: int):
+        """Record a registration, kept when it expires after the one already known"""
+        key = (reg_user, realm)
+        entry = self.entries.get(key)
+        if entry is None or expires > entry.expires:
+            self.entries[key] = RegistrationEntry(hostname, expires)
+            heapq.heappush(self._heap, (expires, reg_user, realm))
+
+    def expire(self, now: Optional[int] = None) -> int:
+        """Drop the entries whose registration has expired"""
+        now = int(time.time()) if now is None else now
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires, reg_user, realm = heapq.heappop(self._heap)
+            entry = self.entries.get((reg_user, realm))
+            # Skip heap items superseded by a later registration of the same user
+            if entry is not None and entry.expires == expires:
+                del self.entries[(reg_user, realm)]
+                expired += 1
+        self.stats_counters["expired"] += expired
+        return expired
+
+    def get(self, reg_user: str, realm: str) -> Optional[RegistrationEntry]:
+        """Unexpired registration of a user from memory only"""
+        now = int(time.time())
+        self.expire(now)
+        entry = self.entries.get((reg_user, realm))
+        if entry is not None and entry.expires > now:
+            self.stats_counters["hits"] += 1
+            return entry
+        self.stats_counters["misses"] += 1
+        return None
+
+    async def locate(self, reg_user: str, realm: str) -> Optional[RegistrationEntry]:
+        """Unexpired registration of a user, read from the database on a miss"""
+        entry = self.get(reg_user, realm)
+        if entry is not None:
+            return entry
+        self.stats_counters["fallbacks"] += 1
+        row = await baseDB.fetch_one_prepared("registrations.locate", reg_user, realm, int(time.time()))
+        if not row:
+            return None
+        self.add(reg_user, realm, row["hostname"], row["expires"])
+        return RegistrationEntry(row["hostname"], row["expires"])
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "heap": len(self._heap), "interval": self.interval, **self.stats_counters}
+
+
+# Global locator instance, None when registrations are looked up in the database
+locator_instance: Optional[RegistrationLocator] = None
+
+
+def get_locator() -> Optional[RegistrationLocator]:
+    """Get global registration locator instance"""
+    return locator_instance
+
+
+def init_locator(enabled: bool = True, interval: float = 5.0) -> Optional[RegistrationLocator]:
+    """Initialize the registration locator"""
+    global locator_instance
+    locator_instance = RegistrationLocator(interval) if enabled else None
+    return locator_instance
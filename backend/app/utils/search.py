@@ -0,0 +1,126 @@
+"""
+Indexed search
+Typeahead search of extensions, users and contacts, served by the trigram indexes of
+database_search.sql. Each table is searched on one lowercased expression joining its
+searched columns, which has to match the indexed expression exactly.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.database import baseDB
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+MAX_QUERY_LENGTH = 100
+# Shorter queries have no trigram to look up and are matched on word prefixes instead
+MIN_TRIGRAM_LENGTH = 3
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass(frozen=True)
+class SearchTarget:
+    """
+    Searchable table
+
+    columns are joined into the search expression with a leading space, so a word
+    prefix is matched with LIKE '% prefix%'. exact columns rank a row first when they
+    equal the query, order must match an index and end with a unique column.
+    domain is the condition scoping the table to the domain in ${param}.
+    """
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+    exact: Tuple[str, ...]
+    order: Tuple[str, ...]
+    domain: str
+
+    @property
+    def expression(self) -> str:
+        joined = " || ' ' || ".join(f"COALESCE(t.{column}, '')" for column in self.columns)
+        return f"(' ' || lower({joined}))"
+
+    def query(self, substring: bool, scoped: bool) -> str:
+        """
+        Search query, $1 is the LIKE pattern and $2 the limit
+
+        Substring queries are ranked by exact match ($3), then word prefix match ($4),
+        then order. Word prefix queries keep the index order so the scan stops at the limit.
+        """
+        conditions = [f"{self.expression} LIKE $1"]
+        order = list(self.order)
+        if substring:
+            exact = " OR ".join(f"lower(COALESCE(t.{column}, '')) = $3" for column in self.exact)
+            order = [f"({exact}) DESC", f"({self.expression} LIKE $4) DESC"] + order
+        if scoped:
+            conditions.append(self.domain.format(param=f"${5 if substring else 3}"))
+        return (
+            f"SELECT t.* FROM {self.table} AS t WHERE {' AND '.join(conditions)} "
+            f"ORDER BY {', '.join(order)} LIMIT $2"
+        )
+
+    def statement(self, substring: bool, scoped: bool) -> str:
+        """Get the named statement of a search mode, registering it on first use"""
+        name = ".".join([self.name, "search", "substring" if substring else "prefix"] + (["domain"] if scoped else []))
+        if name not in baseDB.statements:
+            baseDB.register(name, self.query(substring, scoped))
+        return name
+
+    async def search(self, q: str, domain_uuid: Optional[str], limit: int) -> List[Any]:
+        """Rows matching a lowercased, non-empty query"""
+        word_prefix = f"% {escape_like(q)}%"
+        substring = len(q) >= MIN_TRIGRAM_LENGTH
+        if substring:
+            args = [f"%{escape_like(q)}%", limit, q, word_prefix]
+        else:
+            args = [word_prefix, limit]
+        if domain_uuid:
+            args.append(domain_uuid)
+        return await baseDB.fetch_records_prepared(self.statement(substring, bool(domain_uuid)), *args)
+
+
+# Searched tables, backed by the indexes in database_search.sql
+SEARCH_TARGETS = {
+    target.name: target
+    for target in (
+        SearchTarget(
+            "extensions", "v_extensions",
+            columns=(
+                "extension", "number_alias", "directory_first_name", "directory_last_name",
+                "effective_caller_id_name", "effective_caller_id_number",
+            ),
+            exact=("extension", "number_alias"),
+            order=("t.domain_uuid", "t.extension", "t.extension_uuid"),
+            domain="t.domain_uuid = {param}",
+        ),
+        SearchTarget(
+            "users", "v_users",
+            columns=("username",),
+            exact=("username",),
+            order=("t.domain_uuid", "COALESCE(t.username, '')", "t.user_uuid"),
+            domain="t.domain_uuid = {param}",
+        ),
+        # Contacts have no domain, they belong to the domain of the users linked to them
+        SearchTarget(
+            "contacts", "v_contacts",
+            columns=("contact_name", "contact_email"),
+            exact=("contact_name", "contact_email"),
+            order=("COALESCE(t.contact_name, '')", "t.contact_uuid"),
+            domain="EXISTS (SELECT 1 FROM v_users AS u WHERE u.contact_uuid = t.contact_uuid AND u.domain_uuid = {param})",
+        ),
+    )
+}
+
+
+async def search(
+    q: str, targets: Sequence[SearchTarget], domain_uuid: Optional[str] = None, limit: int = DEFAULT_SEARCH_LIMIT
+) -> Dict[str, List[Any]]:
+    """Search the targets concurrently, each on its own pooled connection"""
+    q = q.strip().lower()[:MAX_QUERY_LENGTH]
+    if not q:
+        return {target.name: [] for target in targets}
+    results = await asyncio.gather(*(target.search(q, domain_uuid, limit) for target in targets))
+    return {target.name: rows for target, rows in zip(targets, results)}
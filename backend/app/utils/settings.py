@@ -0,0 +1,292 @@
+"""
+Layered settings
+Python counterpart of scripts/functions/lazy_settings.lua. Loads the user, domain and
+default settings in bulk into a versioned snapshot, resolves user > domain > default
+precedence in memory and pre-populates the setting:<domain>:<cat>:<sub>:<name> cache
+entries lazy_settings.lua would otherwise build with one query per layer and key.
+"""
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.database import baseDB
+from app.utils.cache import get_cache, get_expire, invalidate_settings_cache
+from app.utils.invalidation_queue import after_invalidation
+
+logger = logging.getLogger(__name__)
+
+# Value lazy_settings.lua caches for settings no layer defines
+NONE = "15783958-912c-4893-8866-4ccd1ca73c6e"
+# Separator of the cached values of 'array' settings
+ARRAY_SEPARATOR = "/+/"
+
+# (category, subcategory, name)
+SettingKey = Tuple[str, str, str]
+Layer = Dict[SettingKey, Any]
+
+baseDB.register("settings.defaults", """
+    SELECT default_setting_category AS category, default_setting_subcategory AS subcategory,
+        default_setting_name AS name, default_setting_value AS value
+    FROM v_default_settings
+    WHERE default_setting_enabled = 'true' AND default_setting_value IS NOT NULL
+    ORDER BY default_setting_category, default_setting_subcategory
+""")
+baseDB.register("settings.default_keys", """
+    SELECT default_setting_category AS category, default_setting_subcategory AS subcategory,
+        default_setting_name AS name, default_setting_value AS value
+    FROM v_default_settings
+    WHERE default_setting_enabled = 'true' AND default_setting_value IS NOT NULL
+    AND (default_setting_category, default_setting_subcategory, default_setting_name)
+        IN (SELECT * FROM unnest($1::text[], $2::text[], $3::text[]))
+    ORDER BY default_setting_category, default_setting_subcategory
+""")
+baseDB.register("settings.domains", """
+    SELECT domain_uuid AS owner, domain_setting_category AS category,
+        domain_setting_subcategory AS subcategory, domain_setting_name AS name,
+        domain_setting_value AS value
+    FROM v_domain_settings
+    WHERE domain_setting_enabled = 'true' AND domain_setting_value IS NOT NULL
+    ORDER BY domain_setting_category, domain_setting_subcategory
+""")
+baseDB.register("settings.users", """
+    SELECT user_uuid AS owner, user_setting_category AS category,
+        user_setting_subcategory AS subcategory, user_setting_name AS name,
+        user_setting_value AS value
+    FROM v_user_settings
+    WHERE user_setting_enabled = 'true' AND user_setting_value IS NOT NULL
+    ORDER BY user_setting_category, user_setting_subcategory
+""")
+baseDB.register("settings.domain_names", "SELECT domain_uuid, domain_name FROM v_domains")
+
+
+def setting_cache_key(domain_name: Optional[str], category: str, subcategory: str, name: str) -> str:
+    """Cache key of Settings:_cache_key, an empty domain for Settings.new('system')"""
+    return f"setting:{domain_name or ''}:{category}:{subcategory}:{name}"
+
+
+def encode_setting(key: SettingKey, value: Any) -> str:
+    """Cached form of a resolved value, arrays joined like lazy_settings.lua"""
+    if value is None:
+        return NONE
+    if key[2] == "array":
+        return ARRAY_SEPARATOR.join(value)
+    return value
+
+
+def _add_setting(layer: Layer, row):
+    """append_setting() of lazy_settings.lua: 'array' names accumulate, other names keep the last row"""
+    key = (row["category"], row["subcategory"], row["name"])
+    if row["name"] == "array":
+        layer.setdefault(key, []).append(row["value"])
+    else:
+        layer[key] = row["value"]
+
+
+def _load_owned(rows) -> Dict[str, Layer]:
+    layers: Dict[str, Layer] = {}
+    for row in rows:
+        _add_setting(layers.setdefault(str(row["owner"]), {}), row)
+    return layers
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """The three settings layers at one point in time, replaced as a whole on change"""
+    version: int
+    defaults: Layer = field(default_factory=dict)
+    # domain_uuid -> layer
+    domains: Dict[str, Layer] = field(default_factory=dict)
+    # user_uuid -> layer
+    users: Dict[str, Layer] = field(default_factory=dict)
+    # domain_uuid -> domain_name, the domains whose setting keys are pre-populated
+    domain_names: Dict[str, str] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def resolve(
+        self, key: SettingKey, domain_uuid: Optional[str] = None, user_uuid: Optional[str] = None
+    ) -> Optional[Any]:
+        """Value of the first layer defining key: user, then domain, then default"""
+        for layer in (self.users.get(user_uuid or ""), self.domains.get(domain_uuid or "")):
+            if layer and key in layer:
+                return layer[key]
+        return self.defaults.get(key)
+
+    def domain_keys(self, domain_uuid: Optional[str] = None) -> Set[SettingKey]:
+        """Keys defined for a domain by the domain or the default layer"""
+        return set(self.defaults) | set(self.domains.get(domain_uuid or "", ()))
+
+
+class SettingsEngine:
+    """
+    Settings snapshot, loaded with three bulk queries on first use
+
+    Default setting writes patch the snapshot per key (copy on write, so readers
+    keep a consistent version). The whole snapshot is reloaded once it is older
+    than the settings expire, which bounds how long domain and user setting
+    writes made outside the API go unseen, like the cached keys themselves.
+    """
+
+    def __init__(self):
+        self.snapshot: Optional[SettingsSnapshot] = None
+        self._lock = asyncio.Lock()
+        self.stats_counters = {"loads": 0, "updates": 0, "resolved": 0, "populated": 0}
+
+    async def get(self) -> SettingsSnapshot:
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < get_expire("settings"):
+            return snapshot
+        return await self.load()
+
+    async def load(self) -> SettingsSnapshot:
+        """Load every layer and swap in a new snapshot version"""
+        async with self._lock:
+            defaults: Layer = {}
+            for row in await baseDB.fetch_all_prepared("settings.defaults"):
+                _add_setting(defaults, row)
+            domains = _load_owned(await baseDB.fetch_all_prepared("settings.domains"))
+            users = _load_owned(await baseDB.fetch_all_prepared("settings.users"))
+            domain_names = {
+                str(row["domain_uuid"]): row["domain_name"]
+                for row in await baseDB.fetch_all_prepared("settings.domain_names")
+            }
+            version = self.snapshot.version + 1 if self.snapshot is not None else 1
+            self.snapshot = SettingsSnapshot(version, defaults, domains, users, domain_names)
+            self.stats_counters["loads"] += 1
+            logger.info(
+                f"Loaded settings version {version}: {len(defaults)} default, "
+                f"{len(domains)} domain and {len(users)} user layers"
+            )
+            return self.snapshot
+
+    async def update_defaults(self, keys: Iterable[SettingKey]) -> Optional[SettingsSnapshot]:
+        """
+        Re-read the default settings of keys after a write and patch them into a new
+        snapshot version, a no-op until the snapshot is loaded
+        """
+        keys = set(keys)
+        if self.snapshot is None or not keys:
+            return self.snapshot
+        async with self._lock:
+            categories, subcategories, names = (list(column) for column in zip(*keys))
+            rows = await baseDB.fetch_all_prepared("settings.default_keys", categories, subcategories, names)
+            changed: Layer = {}
+            for row in rows:
+                _add_setting(changed, row)
+            defaults = {key: value for key, value in self.snapshot.defaults.items() if key not in keys}
+            defaults.update(changed)
+            self.snapshot = replace(self.snapshot, version=self.snapshot.version + 1, defaults=defaults)
+            self.stats_counters["updates"] += 1
+            return self.snapshot
+
+    async def resolve(
+        self, key: SettingKey, domain_uuid: Optional[str] = None, user_uuid: Optional[str] = None
+    ) -> Tuple[Optional[Any], int]:
+        """Resolved value of a setting and the snapshot version it was read from"""
+        snapshot = await self.get()
+        self.stats_counters["resolved"] += 1
+        return snapshot.resolve(key, domain_uuid, user_uuid), snapshot.version
+
+    async def populate(
+        self, keys: Optional[Iterable[SettingKey]] = None, domain_uuids: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        Store the resolved domain level values under the keys lazy_settings.lua reads
+
+        Args:
+            keys: Settings to store, every key of each domain when None. Keys no
+                layer defines are stored as the NONE marker, like a lookup miss.
+            domain_uuids: Domains to store, every domain and the system ('') keys when None
+
+        Returns:
+            Number of entries stored
+        """
+        snapshot = await self.get()
+        cache = get_cache()
+        expire = get_expire("settings")
+        if domain_uuids is None:
+            domains: List[Tuple[Optional[str], str]] = [(None, "")] + list(snapshot.domain_names.items())
+        else:
+            domains = [(uuid, snapshot.domain_names[uuid]) for uuid in domain_uuids if uuid in snapshot.domain_names]
+        keys = set(keys) if keys is not None else None
+
+        stored = 0
+        for domain_uuid, domain_name in domains:
+            for key in keys if keys is not None else snapshot.domain_keys(domain_uuid):
+                value = snapshot.resolve(key, domain_uuid)
+                if await cache.set(setting_cache_key(domain_name, *key), encode_setting(key, value), expire):
+                    stored += 1
+        self.stats_counters["populated"] += stored
+        return stored
+
+    def stats(self) -> dict:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "defaults": len(snapshot.defaults) if snapshot else 0,
+            "domains": len(snapshot.domains) if snapshot else 0,
+            "users": len(snapshot.users) if snapshot else 0,
+            "age": time.monotonic() - snapshot.loaded_at if snapshot else None,
+            **self.stats_counters,
+        }
+
+
+# Global settings engine
+settings_engine = SettingsEngine()
+
+# Whether resolved settings are written to the cache, see init_settings()
+_prepopulate = False
+
+# Background populates, referenced until they finish
+_populate_tasks: Set[asyncio.Task] = set()
+
+
+def init_settings(prepopulate: bool = False) -> SettingsEngine:
+    """Configure whether changed and loaded settings are stored in the cache"""
+    global _prepopulate
+    _prepopulate = prepopulate
+    return settings_engine
+
+
+async def _populate(keys: Optional[Iterable[SettingKey]]):
+    try:
+        stored = await settings_engine.populate(keys)
+        logger.info(f"Pre-populated {stored} setting cache entries")
+    except Exception as e:
+        logger.error(f"Failed to pre-populate settings: {e}")
+
+
+def schedule_populate(keys: Optional[Iterable[SettingKey]] = None):
+    """Store resolved settings once the queued cache deletes are applied, when pre-population is enabled"""
+    if not _prepopulate:
+        return
+    keys = list(keys) if keys is not None else None
+
+    def schedule():
+        task = asyncio.create_task(_populate(keys))
+        _populate_tasks.add(task)
+        task.add_done_callback(_populate_tasks.discard)
+
+    after_invalidation(schedule)
+
+
+async def refresh_default_settings(keys: Iterable[SettingKey]):
+    """
+    Apply default setting writes: patch the snapshot, invalidate the cached value
+    of every domain, on the switch nodes too, and store the new values when enabled
+    """
+    # lazy_settings.lua only looks settings up by a full key
+    keys = {key for key in keys if all(key)}
+    if not keys:
+        return
+    snapshot = await settings_engine.update_defaults(keys)
+    if snapshot is not None:
+        domain_names = [""] + list(snapshot.domain_names.values())
+        await invalidate_settings_cache(
+            [setting_cache_key(domain_name, *key) for domain_name in domain_names for key in keys]
+        )
+    else:
+        # Nothing loaded to enumerate the domains from
+        await invalidate_settings_cache([], [setting_cache_key("*", *key) for key in keys])
+    schedule_populate(keys)
@@ -0,0 +1,175 @@
+"""
+Table change versions
+Triggers append a row to v_table_changes on every write to the tables the dashboard
+lists, one per domain the write touched (see database_setup.sql). List endpoints derive
+their ETag from the number of changes logged, so a poll carrying If-None-Match is
+answered with a 304 after one index-only scan instead of the page query.
+"""
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request, Response
+
+from app.database import baseDB
+
+logger = logging.getLogger(__name__)
+
+# Browsers keep the response but revalidate it with If-None-Match on every poll
+CACHE_CONTROL = "private, no-cache"
+
+baseDB.register("table_versions.table", """
+    SELECT COALESCE(sum(changes), 0)::bigint AS changes, COALESCE(max(id), 0) AS last_id
+    FROM v_table_changes WHERE table_name = $1
+""")
+baseDB.register("table_versions.domain", """
+    SELECT COALESCE(sum(changes), 0)::bigint AS changes, COALESCE(max(id), 0) AS last_id
+    FROM v_table_changes WHERE table_name = $1 AND domain_uuid = $2
+""")
+baseDB.register("table_versions.list", """
+    SELECT table_name, domain_uuid, sum(changes)::bigint AS changes FROM v_table_changes
+    GROUP BY table_name, domain_uuid ORDER BY table_name, domain_uuid
+""")
+# Merges the rows of each table and domain into one. Rows of writers still in flight are
+# not visible to the delete, they are merged by a later run.
+baseDB.register("table_versions.compact", """
+    WITH merged AS (
+        DELETE FROM v_table_changes AS c
+        WHERE EXISTS (
+            SELECT 1 FROM v_table_changes AS o
+            WHERE o.table_name = c.table_name AND o.domain_uuid IS NOT DISTINCT FROM c.domain_uuid AND o.id <> c.id
+        )
+        RETURNING c.id, c.table_name, c.domain_uuid, c.changes
+    )
+    INSERT INTO v_table_changes (id, table_name, domain_uuid, changes)
+    SELECT max(id), table_name, domain_uuid, sum(changes) FROM merged GROUP BY table_name, domain_uuid
+""")
+
+
+def validator_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+class TableVersions:
+    """
+    Change versions of the tracked tables and the conditional GETs answered from them
+
+    A version is the number of committed changes to the table or domain, with the last
+    change id appended. Writers only append, and the count grows with every commit
+    whatever order the writers commit in, so the version changes on every committed
+    write, including the ones made outside the API. A table or domain never written
+    since the triggers were created has version 0.0.
+    """
+
+    def __init__(self, compact_interval: float = 60.0):
+        self.compact_interval = compact_interval
+        self._worker: Optional[asyncio.Task] = None
+        self.stats_counters = {"checks": 0, "not_modified": 0, "compactions": 0}
+
+    async def start(self):
+        if self._worker is None and self.compact_interval > 0:
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.warning(f"Table change log compaction failed: {e}")
+
+    async def compact(self):
+        """Merge the logged changes of each table and domain into one row"""
+        await baseDB.execute_prepared("table_versions.compact")
+        self.stats_counters["compactions"] += 1
+
+    async def get(self, table: str, domain_uuid: Optional[UUID] = None) -> str:
+        if domain_uuid:
+            row = await baseDB.fetch_one_prepared("table_versions.domain", table, str(domain_uuid))
+        else:
+            row = await baseDB.fetch_one_prepared("table_versions.table", table)
+        return f"{row['changes']}.{row['last_id']}"
+
+    @staticmethod
+    def etag(request: Request, table: str, domain_uuid: Optional[UUID], version: str) -> str:
+        """Weak ETag of a version and the query it answers, each page and projection has its own"""
+        query = f"{table}|{domain_uuid or ''}|{request.url.path}?{request.url.query}"
+        digest = hashlib.blake2b(query.encode(), digest_size=8).hexdigest()
+        return f'W/"{version}-{digest}"'
+
+    async def conditional(
+        self, request: Request, table: str, domain_uuid: Optional[UUID] = None
+    ) -> Tuple[str, Optional[Response]]:
+        """
+        ETag of a list request and, when the client already has it, the 304 to return
+
+        The version is read before the rows, so a write committed in between only
+        makes the next poll fetch the list again.
+        """
+        self.stats_counters["checks"] += 1
+        etag = self.etag(request, table, domain_uuid, await self.get(table, domain_uuid))
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.stats_counters["not_modified"] += 1
+            return etag, Response(status_code=304, headers=validator_headers(etag))
+        return etag, None
+
+    async def stats(self) -> dict:
+        rows = await baseDB.fetch_all_prepared("table_versions.list")
+        changes = {}
+        for row in rows:
+            scope = str(row["domain_uuid"]) if row["domain_uuid"] else "none"
+            table = changes.setdefault(row["table_name"], {"all": 0})
+            table[scope] = row["changes"]
+            table["all"] += row["changes"]
+        return {**self.stats_counters, "changes": changes}
+
+
+# Global table versions instance, None when conditional GETs are disabled
+versions_instance: Optional[TableVersions] = None
+
+
+def get_table_versions() -> Optional[TableVersions]:
+    """Get global table versions instance"""
+    return versions_instance
+
+
+def init_table_versions(enabled: bool = True, compact_interval: float = 60.0) -> Optional[TableVersions]:
+    """Initialize the table versions"""
+    global versions_instance
+    versions_instance = TableVersions(compact_interval) if enabled else None
+    return versions_instance
+
+
+async def conditional_get(
+    request: Request, table: str, domain_uuid: Optional[UUID] = None
+) -> Tuple[Optional[str], Optional[Response]]:
+    """(etag, 304 response) of a list request, (None, None) when conditional GETs are disabled"""
+    versions = get_table_versions()
+    if versions is None:
+        return None, None
+    return await versions.conditional(request, table, domain_uuid)
@@ -0,0 +1,40 @@
+"""
+XML builder helpers
+Python counterpart of scripts/functions/xml.lua used to build FreeSWITCH XML documents
+"""
+from typing import Any, List
+
+_SANITIZE_TABLE = str.maketrans({
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&apos;",
+    "$": "",
+})
+
+NOT_FOUND_XML = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<document type="freeswitch/xml">
+	<section name="result">
+		<result status="not found" />
+	</section>
+</document>"""
+
+
+def sanitize(value: Any) -> str:
+    """Escape a value for an XML attribute the same way xml.sanitize does in Lua"""
+    if value is None:
+        return ""
+    return str(value).translate(_SANITIZE_TABLE)
+
+
+class Xml:
+    """Line based XML builder, lines are joined with a newline like xml:build()"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def append(self, data: str):
+        self.lines.append(data)
+
+    def build(self) -> str:
+        return "\n".join(self.lines)
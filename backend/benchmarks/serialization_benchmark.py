@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compare the two ways a page of extensions can be serialized:
+
+- response_model: what FastAPI does for `response_model=List[Extension]`, validate
+  every row through pydantic, serialize it in JSON mode and encode with json.dumps
+- trusted rows: app.utils.serialization.encode_rows, the rows encoded as they are
+
+Run from the backend directory:
+
+    python benchmarks/serialization_benchmark.py --rows 10000 --repeat 5
+
+The rows are dicts shaped like the v_extensions rows asyncpg returns.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, get_args
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from app.models.freeswitch_models import Extension  # noqa: E402
+from app.utils.serialization import encode_rows, orjson  # noqa: E402
+
+
+def make_rows(count: int) -> List[dict]:
+    domain_uuid = uuid.uuid4()
+    created_at = datetime.now(timezone.utc)
+    rows = []
+    for i in range(count):
+        row = {}
+        for name, field in Extension.model_fields.items():
+            types = get_args(field.annotation) or (field.annotation,)
+            if uuid.UUID in types:
+                row[name] = domain_uuid if name == "domain_uuid" else uuid.uuid4()
+            elif datetime in types:
+                row[name] = created_at
+            else:
+                row[name] = f"{name}-{i}"
+        row["extension"] = str(1000 + i)
+        row["enabled"] = "true"
+        rows.append(row)
+    return rows
+
+
+async def response_model_path(field, rows) -> bytes:
+    content = await serialize_response(field=field, response_content=rows)
+    return JSONResponse(content).body
+
+
+def trusted_rows_path(rows) -> bytes:
+    return encode_rows(rows, Extension)
+
+
+def timed(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    field = create_response_field(name="Response_get_extensions", type_=List[Extension], mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    # Both paths have to produce the same document
+    expected = json.loads(loop.run_until_complete(response_model_path(field, rows)))
+    assert json.loads(trusted_rows_path(rows)) == expected, "the trusted path changed the response"
+
+    baseline = timed(lambda: loop.run_until_complete(response_model_path(field, rows)), args.repeat)
+    trusted = timed(lambda: trusted_rows_path(rows), args.repeat)
+    loop.close()
+
+    encoder = "orjson" if orjson is not None else "json (orjson not installed)"
+    print(f"{args.rows} extensions, best of {args.repeat}")
+    print(f"  response_model  {baseline * 1000:9.1f} ms")
+    print(f"  trusted rows    {trusted * 1000:9.1f} ms  [{encoder}]")
+    print(f"  speedup         {baseline / trusted:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
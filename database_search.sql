@@ -0,0 +1,37 @@
+-- Search indexes for /api/freeswitch/search (backend/app/utils/search.py)
+-- Run after database_setup.sql, and again whenever it recreated the tables:
+--   psql -U postgres -d freeswitch_db -f database_search.sql
+--
+-- Each table is searched on one lowercased expression joining its searched columns with
+-- a leading space. The expressions below must stay identical to SearchTarget.expression,
+-- otherwise the planner cannot use the indexes.
+
+-- Trigram operator classes, and btree_gin for the domain_uuid column of the GIN indexes
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- Extensions: extension, number alias, directory name and effective caller ID
+CREATE INDEX IF NOT EXISTS idx_v_extensions_search ON v_extensions USING gin (
+  domain_uuid,
+  (' ' || lower(
+    COALESCE(extension, '') || ' ' || COALESCE(number_alias, '') || ' ' ||
+    COALESCE(directory_first_name, '') || ' ' || COALESCE(directory_last_name, '') || ' ' ||
+    COALESCE(effective_caller_id_name, '') || ' ' || COALESCE(effective_caller_id_number, '')
+  )) gin_trgm_ops
+);
+
+-- Users: username
+CREATE INDEX IF NOT EXISTS idx_v_users_search ON v_users USING gin (
+  domain_uuid,
+  (' ' || lower(COALESCE(username, ''))) gin_trgm_ops
+);
+
+-- Contacts: name and email, scoped to a domain through the users linked to them
+CREATE INDEX IF NOT EXISTS idx_v_contacts_search ON v_contacts USING gin (
+  (' ' || lower(COALESCE(contact_name, '') || ' ' || COALESCE(contact_email, ''))) gin_trgm_ops
+);
+CREATE INDEX IF NOT EXISTS idx_v_users_contact_domain ON v_users(contact_uuid, domain_uuid);
+
+ANALYZE v_extensions;
+ANALYZE v_users;
+ANALYZE v_contacts;
@@ -5,9 +5,14 @@
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
 -- Drop tables if they exist (for clean setup)
+DROP TABLE IF EXISTS v_table_changes CASCADE;
+DROP TABLE IF EXISTS v_revoked_tokens CASCADE;
 DROP TABLE IF EXISTS registrations CASCADE;
+DROP TABLE IF EXISTS v_destination_numbers CASCADE;
 DROP TABLE IF EXISTS v_destinations CASCADE;
 DROP TABLE IF EXISTS v_dialplans CASCADE;
+DROP TABLE IF EXISTS v_user_settings CASCADE;
+DROP TABLE IF EXISTS v_domain_settings CASCADE;
 DROP TABLE IF EXISTS v_default_settings CASCADE;
 DROP TABLE IF EXISTS v_voicemails CASCADE;
 DROP TABLE IF EXISTS v_extension_settings CASCADE;
@@ -105,6 +110,7 @@ CREATE TABLE v_users (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
 CREATE INDEX idx_v_users_domain_user ON v_users(domain_uuid, user_uuid);
+CREATE INDEX idx_v_users_domain_username ON v_users(domain_uuid, (COALESCE(username, '')), user_uuid);
 
 -- Contacts (basic)
 CREATE TABLE v_contacts (
@@ -114,6 +120,7 @@ CREATE TABLE v_contacts (
   contact_description TEXT,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
+CREATE INDEX idx_v_contacts_name ON v_contacts((COALESCE(contact_name, '')), contact_uuid);
 
 -- Per-extension settings (params / variables)
 CREATE TABLE v_extension_settings (
@@ -126,6 +133,7 @@ CREATE TABLE v_extension_settings (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
 CREATE INDEX idx_ext_settings_extension ON v_extension_settings(extension_uuid);
+CREATE INDEX idx_ext_settings_extension_name ON v_extension_settings(extension_uuid, extension_setting_name);
 
 -- Voicemails
 CREATE TABLE v_voicemails (
@@ -141,16 +149,46 @@ CREATE TABLE v_voicemails (
 );
 CREATE INDEX idx_voicemails_domain_id ON v_voicemails(domain_uuid, voicemail_id);
 
--- Default settings (lazy_settings / v_default_settings)
+-- Default settings (lazy_settings / v_default_settings). The directory lookup reads the
+-- enabled domain/dial_string setting from these and the domain settings below.
 CREATE TABLE v_default_settings (
   default_setting_uuid UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
   default_setting_category TEXT NOT NULL,
   default_setting_subcategory TEXT NOT NULL,
   default_setting_name TEXT,
   default_setting_value TEXT,
+  default_setting_enabled TEXT DEFAULT 'true',
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
 CREATE INDEX idx_default_settings_cat_sub ON v_default_settings(default_setting_category, default_setting_subcategory);
+CREATE INDEX idx_default_settings_page ON v_default_settings(default_setting_category, default_setting_subcategory, default_setting_uuid);
+
+-- Domain settings, override the default settings for one domain (directory dial_string included)
+CREATE TABLE v_domain_settings (
+  domain_setting_uuid UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  domain_uuid UUID NOT NULL REFERENCES v_domains(domain_uuid) ON DELETE CASCADE,
+  domain_setting_category TEXT NOT NULL,
+  domain_setting_subcategory TEXT NOT NULL,
+  domain_setting_name TEXT,
+  domain_setting_value TEXT,
+  domain_setting_enabled TEXT DEFAULT 'true',
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX idx_domain_settings_domain_cat_sub ON v_domain_settings(domain_uuid, domain_setting_category, domain_setting_subcategory);
+
+-- User settings, override the domain and default settings for one user
+CREATE TABLE v_user_settings (
+  user_setting_uuid UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  user_uuid UUID NOT NULL REFERENCES v_users(user_uuid) ON DELETE CASCADE,
+  domain_uuid UUID REFERENCES v_domains(domain_uuid) ON DELETE CASCADE,
+  user_setting_category TEXT NOT NULL,
+  user_setting_subcategory TEXT NOT NULL,
+  user_setting_name TEXT,
+  user_setting_value TEXT,
+  user_setting_enabled TEXT DEFAULT 'true',
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+CREATE INDEX idx_user_settings_user_cat_sub ON v_user_settings(user_uuid, user_setting_category, user_setting_subcategory);
 
 -- Dialplans (basic)
 CREATE TABLE v_dialplans (
@@ -170,12 +208,26 @@ CREATE TABLE v_destinations (
   destination_uuid UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
   domain_uuid UUID REFERENCES v_domains(domain_uuid),
   destination_prefix TEXT,
+  destination_trunk_prefix TEXT,
   destination_area_code TEXT,
   destination_number TEXT,
   dialplan_uuid UUID REFERENCES v_dialplans(dialplan_uuid),
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
-CREATE INDEX idx_destinations_number ON v_destinations(domain_uuid, destination_number);
+CREATE INDEX idx_destinations_number ON v_destinations(domain_uuid, (COALESCE(destination_number, '')), destination_uuid);
+CREATE INDEX idx_destinations_number_page ON v_destinations((COALESCE(destination_number, '')), destination_uuid);
+
+-- Every number a destination answers to, one row per prefix / area code combination
+-- dialplan.lua matches in single mode. Maintained by the backend on destination writes.
+CREATE TABLE v_destination_numbers (
+  destination_number TEXT NOT NULL,
+  destination_uuid UUID NOT NULL REFERENCES v_destinations(destination_uuid) ON DELETE CASCADE,
+  dialplan_uuid UUID,
+  domain_uuid UUID,
+  PRIMARY KEY (destination_number, destination_uuid)
+);
+CREATE INDEX idx_destination_numbers_destination ON v_destination_numbers(destination_uuid);
+CREATE INDEX idx_destination_numbers_dialplan ON v_destination_numbers(dialplan_uuid);
 
 -- FreeSWITCH registrations (switch DB)
 CREATE TABLE registrations (
@@ -186,7 +238,74 @@ CREATE TABLE registrations (
   expires INTEGER,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
-CREATE INDEX idx_reg_user_realm ON registrations(reg_user, realm);
+CREATE INDEX idx_reg_user_realm_expires ON registrations(reg_user, realm, expires) INCLUDE (hostname);
+CREATE INDEX idx_reg_expires ON registrations(expires);
+
+-- Access tokens revoked by /auth/logout, kept until the token expires (epoch seconds)
+CREATE TABLE v_revoked_tokens (
+  jti TEXT PRIMARY KEY,
+  user_uuid UUID,
+  expires INTEGER NOT NULL
+);
+CREATE INDEX idx_revoked_tokens_expires ON v_revoked_tokens(expires);
+
+-- Change log of the tables the dashboard lists, behind the ETags of the list endpoints.
+-- Statement-level triggers append one row per domain a write touched (NULL domain_uuid
+-- for rows without a domain, and for the tables that have none). Writers only insert, so
+-- they never wait on each other. A version is the number of changes the rows stand for,
+-- which grows with every commit whatever order the writers commit in. The backend
+-- compacts the rows of each table and domain into one, keeping their sum of changes.
+-- Registrations are not tracked, the switches write them at registration rate.
+CREATE TABLE v_table_changes (
+  id BIGSERIAL NOT NULL,
+  table_name TEXT NOT NULL,
+  domain_uuid UUID,
+  changes BIGINT NOT NULL DEFAULT 1
+);
+CREATE INDEX idx_table_changes ON v_table_changes(table_name, domain_uuid) INCLUDE (changes, id);
+
+CREATE OR REPLACE FUNCTION log_table_change() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO v_table_changes (table_name) VALUES (TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION log_domain_table_change() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO v_table_changes (table_name, domain_uuid)
+    SELECT DISTINCT TG_TABLE_NAME, domain_uuid FROM new_rows;
+  ELSIF TG_OP = 'UPDATE' THEN
+    INSERT INTO v_table_changes (table_name, domain_uuid)
+    SELECT TG_TABLE_NAME, domain_uuid FROM new_rows
+    UNION SELECT TG_TABLE_NAME, domain_uuid FROM old_rows;
+  ELSE
+    INSERT INTO v_table_changes (table_name, domain_uuid)
+    SELECT DISTINCT TG_TABLE_NAME, domain_uuid FROM old_rows;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables need one trigger per event
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY['v_domains', 'v_users', 'v_extensions', 'v_voicemails', 'v_dialplans', 'v_destinations'] LOOP
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE PROCEDURE log_domain_table_change()', t || '_version_insert', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+      FOR EACH STATEMENT EXECUTE PROCEDURE log_domain_table_change()', t || '_version_update', t);
+    EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+      FOR EACH STATEMENT EXECUTE PROCEDURE log_domain_table_change()', t || '_version_delete', t);
+  END LOOP;
+  FOREACH t IN ARRAY ARRAY['v_contacts', 'v_extension_settings', 'v_default_settings'] LOOP
+    EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+      FOR EACH STATEMENT EXECUTE PROCEDURE log_table_change()', t || '_version', t);
+  END LOOP;
+END $$;
 
 -- Insert sample test data
 BEGIN;
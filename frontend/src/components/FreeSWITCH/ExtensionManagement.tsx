@@ -28,20 +28,27 @@ const ExtensionManagement: React.FC = () => {
   const [extensions, setExtensions] = useState<Extension[]>([]);
   const [domains, setDomains] = useState<Domain[]>([]);
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | undefined>();
   const [modalVisible, setModalVisible] = useState(false);
   const [editingExtension, setEditingExtension] = useState<Extension | null>(null);
   const [form] = Form.useForm();
 
-  const fetchExtensions = async () => {
+  // Without a cursor the list restarts from the first page, with one the next page is appended
+  const fetchExtensions = async (after?: string) => {
     setLoading(true);
     try {
-      const data = await extensionApi.getAll();
+      const page = await extensionApi.getPage({ after });
       // Ensure data is always an array to prevent .map errors
-      setExtensions(Array.isArray(data) ? data : []);
+      const data = Array.isArray(page.items) ? page.items : [];
+      setExtensions(previous => (after ? [...previous, ...data] : data));
+      setNextCursor(page.nextCursor);
     } catch (error) {
       message.error('Failed to fetch extensions');
       // Set empty array on error to prevent .map errors
-      setExtensions([]);
+      if (!after) {
+        setExtensions([]);
+      }
+      setNextCursor(undefined);
     } finally {
       setLoading(false);
     }
@@ -209,6 +216,13 @@ const ExtensionManagement: React.FC = () => {
         }}
         scroll={{ x: 1200 }}
       />
+      {nextCursor && (
+        <div style={{ marginTop: 16, textAlign: 'center' }}>
+          <Button onClick={() => fetchExtensions(nextCursor)} loading={loading}>
+            Load more
+          </Button>
+        </div>
+      )}
 
       <Modal
         title={editingExtension ? 'Edit Extension' : 'Create Extension'}
@@ -6,10 +6,30 @@ import type {
   Extension, ExtensionCreate, ExtensionSetting, ExtensionSettingCreate, ExtensionSettingUpdate,
   Voicemail, VoicemailCreate, VoicemailUpdate,
   Dialplan, DialplanCreate, DialplanUpdate,
-  Registration
+  Registration, Page, PageParams,
+  SearchParams, SearchResults
 } from '../types/freeswitch';
 
 const BASE_URL = '/api/freeswitch';
+const NEXT_CURSOR_HEADER = 'x-next-cursor';
+
+// Fetch one page of a paginated list endpoint
+const getPage = async <T>(path: string, params: PageParams = {}): Promise<Page<T>> => {
+  const response = await api.get(`${BASE_URL}/${path}`, { params });
+  return { items: response.data, nextCursor: response.headers[NEXT_CURSOR_HEADER] };
+};
+
+// Follow the cursors of a paginated list endpoint until the last page
+const getAllPages = async <T>(path: string, params: PageParams = {}): Promise<T[]> => {
+  const items: T[] = [];
+  let after: string | undefined;
+  do {
+    const page = await getPage<T>(path, { ...params, after });
+    items.push(...page.items);
+    after = page.nextCursor;
+  } while (after);
+  return items;
+};
 
 // Domain API
 export const domainApi = {
@@ -40,10 +60,9 @@ export const domainApi = {
 
 // Contact API
 export const contactApi = {
-  getAll: async (): Promise<Contact[]> => {
-    const response = await api.get(`${BASE_URL}/contacts`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<Contact[]> => getAllPages<Contact>('contacts', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<Contact>> => getPage<Contact>('contacts', params),
   
   getById: async (id: string): Promise<Contact> => {
     const response = await api.get(`${BASE_URL}/contacts/${id}`);
@@ -67,10 +86,9 @@ export const contactApi = {
 
 // User API
 export const userApi = {
-  getAll: async (): Promise<User[]> => {
-    const response = await api.get(`${BASE_URL}/users`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<User[]> => getAllPages<User>('users', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<User>> => getPage<User>('users', params),
   
   getById: async (id: string): Promise<User> => {
     const response = await api.get(`${BASE_URL}/users/${id}`);
@@ -94,10 +112,9 @@ export const userApi = {
 
 // Extension API
 export const extensionApi = {
-  getAll: async (): Promise<Extension[]> => {
-    const response = await api.get(`${BASE_URL}/extensions`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<Extension[]> => getAllPages<Extension>('extensions', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<Extension>> => getPage<Extension>('extensions', params),
   
   getById: async (id: string): Promise<Extension> => {
     const response = await api.get(`${BASE_URL}/extensions/${id}`);
@@ -121,10 +138,9 @@ export const extensionApi = {
 
 // Extension Settings API
 export const extensionSettingApi = {
-  getAll: async (): Promise<ExtensionSetting[]> => {
-    const response = await api.get(`${BASE_URL}/extension-settings`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<ExtensionSetting[]> => getAllPages<ExtensionSetting>('extension-settings', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<ExtensionSetting>> => getPage<ExtensionSetting>('extension-settings', params),
   
   getByExtension: async (extensionId: string): Promise<ExtensionSetting[]> => {
     const response = await api.get(`${BASE_URL}/extension-settings/extension/${extensionId}`);
@@ -148,10 +164,9 @@ export const extensionSettingApi = {
 
 // Voicemail API
 export const voicemailApi = {
-  getAll: async (): Promise<Voicemail[]> => {
-    const response = await api.get(`${BASE_URL}/voicemails`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<Voicemail[]> => getAllPages<Voicemail>('voicemails', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<Voicemail>> => getPage<Voicemail>('voicemails', params),
   
   getById: async (id: string): Promise<Voicemail> => {
     const response = await api.get(`${BASE_URL}/voicemails/${id}`);
@@ -202,13 +217,22 @@ export const dialplanApi = {
 
 // Registration API (read-only)
 export const registrationApi = {
-  getAll: async (): Promise<Registration[]> => {
-    const response = await api.get(`${BASE_URL}/registrations`);
-    return response.data;
-  },
+  getAll: async (params: PageParams = {}): Promise<Registration[]> => getAllPages<Registration>('registrations', params),
+
+  getPage: async (params: PageParams = {}): Promise<Page<Registration>> => getPage<Registration>('registrations', params),
   
   getById: async (id: string): Promise<Registration> => {
     const response = await api.get(`${BASE_URL}/registrations/${id}`);
     return response.data;
   }
-};
\ No newline at end of file
+};
+
+// Search API, for typeahead lookups
+export const searchApi = {
+  search: async (q: string, { types, ...params }: SearchParams = {}): Promise<SearchResults> => {
+    const response = await api.get(`${BASE_URL}/search`, {
+      params: { q, ...params, types: types?.join(',') }
+    });
+    return response.data;
+  }
+};
@@ -260,4 +260,32 @@ export interface Registration {
   hostname?: string;
   expires?: number;
   created_at?: string;
-}
\ No newline at end of file
+}
+// Keyset pagination of the list endpoints
+export interface PageParams {
+  limit?: number;
+  after?: string;
+  domain_uuid?: string;
+  extension_uuid?: string;
+  realm?: string;
+}
+
+export interface Page<T> {
+  items: T[];
+  nextCursor?: string;
+}
+
+// Indexed search of extensions, users and contacts
+export type SearchType = 'extensions' | 'users' | 'contacts';
+
+export interface SearchParams {
+  domain_uuid?: string;
+  types?: SearchType[];
+  limit?: number;
+}
+
+export interface SearchResults {
+  extensions: Extension[];
+  users: User[];
+  contacts: Contact[];
+}
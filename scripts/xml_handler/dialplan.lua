@@ -178,17 +178,10 @@
 				sql = sql .. "(SELECT domain_enabled FROM v_domains WHERE domain_uuid = p.domain_uuid) as domain_enabled, p.dialplan_xml ";
 				sql = sql .. "FROM v_dialplans AS p ";
 				sql = sql .. "WHERE ( ";
+				--v_destination_numbers holds every prefix / area code combination of the destinations
 				sql = sql .. "	p.dialplan_uuid IN ( ";
-				sql = sql .. "		SELECT dialplan_uuid FROM v_destinations ";
-				sql = sql .. "		WHERE ( ";
-				sql = sql .. "			CONCAT(destination_prefix, destination_area_code, destination_number) = :destination_number ";
-				sql = sql .. "			OR CONCAT(destination_trunk_prefix, destination_area_code, destination_number) = :destination_number ";
-				sql = sql .. "			OR CONCAT(destination_prefix, destination_number) = :destination_number ";
-				sql = sql .. "			OR CONCAT('+', destination_prefix, destination_number) = :destination_number ";
-				sql = sql .. "			OR CONCAT('+', destination_prefix, destination_area_code, destination_number) = :destination_number ";
-				sql = sql .. "			OR CONCAT(destination_area_code, destination_number) = :destination_number ";
-				sql = sql .. "			OR destination_number = :destination_number ";
-				sql = sql .. "		) ";
+				sql = sql .. "		SELECT dialplan_uuid FROM v_destination_numbers ";
+				sql = sql .. "		WHERE destination_number = :destination_number ";
 				sql = sql .. "	) ";
 				sql = sql .. "	or (p.dialplan_context like '%public%' and p.domain_uuid IS NULL) ";
 				sql = sql .. ") ";
@@ -210,32 +210,10 @@
 
 						--exits the script if we didn't connect properly
 							assert(dbh:connected());
-
-						--get the domain_uuid
-							if (domain_uuid == nil) then
-								--get the domain_uuid
-									if (domain_name ~= nil) then
-										local sql = "SELECT domain_uuid FROM v_domains "
-											.. "WHERE domain_name = :domain_name ";
-										local params = {domain_name = domain_name};
-										if (debug["sql"]) then
-											freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
-										end
-										dbh:query(sql, params, function(rows)
-											domain_uuid = rows["domain_uuid"];
-										end);
-									end
-									freeswitch.consoleLog("notice", "[xml_handler][directory] domain_uuid is " .. tostring(domain_uuid) .. "\n");
-							end
 					end
 
-				--get the dial_string from default settings
-					local Settings = require "functions.lazy_settings"
-					local settings = Settings.new(dbh, domain_name, domain_uuid);
-					dial_string = settings:get('domain', 'dial_string', 'text');
- 
 				--prevent processing for invalid domains
-					if (domain_uuid == nil) then
+					if (domain_name == nil) then
 						continue = false;
 					end
 
@@ -243,19 +221,6 @@
 					if (continue) then
 						if (USE_FS_PATH) then
 
-							--get the domain_name from domains
-								if (domain_name == nil) then
-									local sql = "SELECT domain_name FROM v_domains "
-										.. "WHERE domain_uuid = :domain_uuid ";
-									local params = {domain_uuid = domain_uuid};
-									if (debug["sql"]) then
-										freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
-									end
-									dbh:query(sql, params, function(row)
-										domain_name = row["domain_name"];
-									end);
-								end
-
 							--get the caller hostname
 								local_hostname = trim(api:execute("switchname", ""));
 								--freeswitch.consoleLog("notice", "[xml_handler][directory] local_hostname is " .. local_hostname .. "\n");
@@ -281,7 +246,7 @@
 									params.now = os.time();
 									sql = sql .. "AND expires > :now ";
 								elseif (database["type"] == "pgsql") then
-									sql = sql .. "AND to_timestamp(expires) > NOW()";
+									sql = sql .. "AND expires > extract(epoch FROM now())::integer";
 								end
 								if (debug["sql"]) then
 									freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
@@ -302,20 +267,67 @@
 						end
 					end
 
-				--get the extension from the database
+				--get the extension, its user and contact, the domain dial_string setting, its voicemail
+				--and its enabled settings in one statement. There is one row per enabled setting.
+				--keep in sync with DirectoryDB.resolve_user in backend/app/db/directory_db.py
 					if (continue) then
-						local sql = "SELECT e.*, random() FROM v_extensions as e, v_domains as d "
-							.. "WHERE e.domain_uuid = :domain_uuid "
-							.. "AND d.domain_uuid = :domain_uuid "
+						local sql = "SELECT e.*, random() AS random, "
+							.. "eu.user_uuid, u.contact_uuid, ds.value AS domain_dial_string, "
+							.. "v.voicemail_uuid, v.voicemail_enabled, v.voicemail_password, v.voicemail_attach_file, "
+							.. "v.voicemail_local_after_email, v.voicemail_mail_to, "
+							.. "s.extension_setting_type, s.extension_setting_name, s.extension_setting_value "
+							.. "FROM v_domains AS d "
+							.. "JOIN v_extensions AS e ON e.domain_uuid = d.domain_uuid "
+							.. "LEFT JOIN LATERAL ( "
+							.. "	SELECT user_uuid FROM v_extension_users "
+							.. "	WHERE domain_uuid = e.domain_uuid AND extension_uuid = e.extension_uuid "
+							.. "	LIMIT 1 "
+							.. ") AS eu ON true "
+							.. "LEFT JOIN v_users AS u ON u.domain_uuid = e.domain_uuid AND u.user_uuid = eu.user_uuid "
+							.. "LEFT JOIN LATERAL ( "
+							.. "	SELECT value FROM ( "
+							.. "		SELECT 1 AS layer, domain_setting_value AS value FROM v_domain_settings "
+							.. "		WHERE domain_uuid = d.domain_uuid AND domain_setting_enabled = 'true' "
+							.. "		AND domain_setting_category = 'domain' AND domain_setting_subcategory = 'dial_string' "
+							.. "		AND domain_setting_name = 'text' AND domain_setting_value IS NOT NULL "
+							.. "		UNION ALL "
+							.. "		SELECT 2 AS layer, default_setting_value AS value FROM v_default_settings "
+							.. "		WHERE default_setting_enabled = 'true' "
+							.. "		AND default_setting_category = 'domain' AND default_setting_subcategory = 'dial_string' "
+							.. "		AND default_setting_name = 'text' AND default_setting_value IS NOT NULL "
+							.. "	) AS layers ORDER BY layer LIMIT 1 "
+							.. ") AS ds ON true "
+							.. "LEFT JOIN LATERAL ( "
+							.. "	SELECT * FROM v_voicemails "
+							.. "	WHERE domain_uuid = e.domain_uuid "
+							.. "	AND voicemail_id = COALESCE(NULLIF(e.number_alias, ''), e.extension) "
+							.. "	LIMIT 1 "
+							.. ") AS v ON true "
+							.. "LEFT JOIN v_extension_settings AS s "
+							.. "ON s.extension_uuid = e.extension_uuid AND s.extension_setting_enabled = 'true' "
+							.. "WHERE d.domain_name = :domain_name "
 							.. "AND d.domain_enabled = 'true' "
 							.. "AND (e.extension = :user or e.number_alias = :user) "
 							.. "AND e.enabled = 'true' ";
-						local params = {domain_uuid=domain_uuid, user=user};
+						local params = {domain_name=domain_name, user=user};
 						if (debug["sql"]) then
 							freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
 						end
 						continue = false;
+						extension_settings = {}
 						dbh:query(sql, params, function(row)
+							--one row per setting, the extension columns repeat on every row
+								if (extension_uuid ~= nil) then
+									if (row.extension_uuid == extension_uuid and row.extension_setting_type ~= nil and string.len(row.extension_setting_type) > 0) then
+										table.insert(extension_settings, {
+											extension_setting_type = row.extension_setting_type,
+											extension_setting_name = row.extension_setting_name,
+											extension_setting_value = row.extension_setting_value
+										});
+									end
+									return;
+								end
+
 							--general
 								continue = true;
 								domain_uuid = row.domain_uuid;
@@ -330,16 +342,14 @@
 									number_alias = row.number_alias;
 								end
 
-							--get the user_uuid
-								local sql = "SELECT user_uuid FROM v_extension_users WHERE domain_uuid = :domain_uuid and extension_uuid = :extension_uuid "
-								local params = {domain_uuid=domain_uuid, extension_uuid=extension_uuid};
-								user_uuid = dbh:first_value(sql, params);
+							--get the user_uuid and the contact_uuid
+								user_uuid = row.user_uuid;
+								contact_uuid = row.contact_uuid;
 
-							--get the contact_uuid
-								if (user_uuid ~= nil) and (string.len(user_uuid) > 0) then
-									local sql = "SELECT contact_uuid FROM v_users WHERE domain_uuid = :domain_uuid and user_uuid = :user_uuid "
-									local params = {domain_uuid=domain_uuid, user_uuid=user_uuid};
-									contact_uuid = dbh:first_value(sql, params);
+							--get the dial_string from the domain or default settings
+								dial_string = nil;
+								if (row.domain_dial_string ~= nil and string.len(row.domain_dial_string) > 0) then
+									dial_string = row.domain_dial_string;
 								end
 
 							--params
@@ -445,61 +455,39 @@
 											freeswitch.consoleLog("notice", "[xml_handler] local_hostname: " .. local_hostname.. " database_hostname: " .. database_hostname .. " dial_string: " .. dial_string .. "\n");
 										end
 								end
-						end);
-					end
 
-				--get the extension settings from the database
-					if (extension_uuid) then
-						local sql = "SELECT * FROM v_extension_settings "
-							.. "WHERE extension_uuid = :extension_uuid "
-							.. "and extension_setting_enabled = 'true' ";
-						local params = {extension_uuid=extension_uuid};
-						if (debug["sql"]) then
-							freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
-						end
-						extension_settings = {}
-						dbh:query(sql, params, function(row)
-							table.insert(extension_settings, {
-								extension_setting_type = row.extension_setting_type,
-								extension_setting_name = row.extension_setting_name,
-								extension_setting_value = row.extension_setting_value
-							});
-						end);
-					end
+							--get the voicemail
+								vm_enabled = "true";
+								if (row.voicemail_uuid ~= nil and string.len(row.voicemail_uuid) > 0) then
+									if (string.len(row.voicemail_enabled) > 0) then
+										vm_enabled = row.voicemail_enabled;
+									end
+									vm_password = row.voicemail_password;
+									vm_attach_file = "true";
+									if (string.len(row.voicemail_attach_file) > 0) then
+										vm_attach_file = row.voicemail_attach_file;
+									end
+									vm_keep_local_after_email = "true";
+									if (string.len(row.voicemail_local_after_email) > 0) then
+										vm_keep_local_after_email = row.voicemail_local_after_email;
+									end
+									if (string.len(row.voicemail_mail_to) > 0) then
+										vm_mailto = row.voicemail_mail_to;
+									else
+										vm_mailto = "";
+									end
+								end
 
-				--get the voicemail from the database
-					if (continue) then
-						vm_enabled = "true";
-						local sql = "SELECT * FROM v_voicemails WHERE domain_uuid = :domain_uuid and voicemail_id = :voicemail_id ";
-						local params = {domain_uuid = domain_uuid};
-						if number_alias and #number_alias > 0 then
-							params.voicemail_id = number_alias;
-						else
-							params.voicemail_id = user;
-						end
-						if (debug["sql"]) then
-							freeswitch.consoleLog("notice", "[xml_handler] SQL: " .. sql .. "; params:" .. json.encode(params) .. "\n");
-						end
-						dbh:query(sql, params, function(row)
-							if (string.len(row.voicemail_enabled) > 0) then
-								vm_enabled = row.voicemail_enabled;
-							end
-							vm_password = row.voicemail_password;
-							vm_attach_file = "true";
-							if (string.len(row.voicemail_attach_file) > 0) then
-								vm_attach_file = row.voicemail_attach_file;
-							end
-							vm_keep_local_after_email = "true";
-							if (string.len(row.voicemail_local_after_email) > 0) then
-								vm_keep_local_after_email = row.voicemail_local_after_email;
-							end
-							if (string.len(row.voicemail_mail_to) > 0) then
-								vm_mailto = row.voicemail_mail_to;
-							else
-								vm_mailto = "";
-							end
+							--get the first setting
+								if (row.extension_setting_type ~= nil and string.len(row.extension_setting_type) > 0) then
+									table.insert(extension_settings, {
+										extension_setting_type = row.extension_setting_type,
+										extension_setting_name = row.extension_setting_name,
+										extension_setting_value = row.extension_setting_value
+									});
+								end
 						end);
-				end
+					end
 
 				--if the extension does not exist set continue to false;
 					if (extension_uuid == nil) then